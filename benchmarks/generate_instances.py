@@ -0,0 +1,141 @@
+# Synthetic instance generator for the timetabling benchmarks.
+# Writes a student list, module list and useful dates workbook in the same layout as the real files,
+# plus instance.json with the fixed modules, core modules and rooms the instance was built around.
+import os
+import sys
+import json
+import math
+import random
+import argparse
+from datetime import datetime
+import pandas as pd
+from openpyxl import Workbook
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from timetable_model import no_exam_dates, rooms as default_rooms
+
+# Same calendar as the 2025-26 useful dates file: bank holidays fall on days 7 and 28
+SUMMER_TERM = "Monday 27 April to Friday 26 June 2026"
+BANK_HOLIDAYS = [("Early May Bank Holiday", datetime(2026, 5, 4)), ("Spring Bank Holiday", datetime(2026, 5, 25))]
+BANK_HOLIDAY_DAYS = [7]
+ARRANGEMENTS = ["25% extra time", "50% extra time", "Rest breaks"]
+
+
+def scaled_rooms(copies):
+    """Return the real room dictionary with every ME room repeated copies times."""
+    room_dict = {}
+    for room, (uses, capacity) in default_rooms.items():
+        if room == "NON ME N/A" or copies == 1:
+            room_dict[room] = [uses, capacity]
+            continue
+        for i in range(copies):
+            room_dict[f"{room} ({i + 1})"] = [uses, capacity]
+    return room_dict
+
+
+def generate(out_dir, students=300, exams=40, exams_per_student=6, aea_share=0.15, fixed=10, core=3,
+             room_copies=None, pc_share=0.1, cohort_size=50, seed=0):
+    """Write one synthetic instance to out_dir and return its description."""
+    rnd = random.Random(seed)
+    os.makedirs(out_dir, exist_ok=True)
+    if room_copies is None:
+        # Enough ME rooms for each exam in a slot to get its own room
+        room_copies = max(1, math.ceil(exams / 80))
+
+    exam_names = [f"MECH{70000 + i} Synthetic Module {i}" for i in range(exams)]
+
+    # Fixed modules each get a day of their own so that no student is forced into a clash
+    blocked = {tuple(d) for d in no_exam_dates} | {(d, s) for d in BANK_HOLIDAY_DAYS for s in (0, 1)}
+    open_times = [(d, s) for d in range(21) for s in (0, 1) if (d, s) not in blocked]
+    open_days = sorted({d for d, _ in open_times})
+    fixed_names = rnd.sample(exam_names, min(fixed, exams, len(open_days)))
+    core_names = fixed_names[:min(core, len(fixed_names))]
+    Fixed_modules = {}
+    for exam, d in zip(fixed_names, rnd.sample(open_days, len(fixed_names))):
+        Fixed_modules[exam] = list(rnd.choice([(day, s) for day, s in open_times if day == d]))
+
+    # Students come in cohorts sharing a programme of exams, plus the odd option module
+    cohorts = max(1, students // cohort_size)
+    per_student = min(exams_per_student, exams)
+    programmes = []
+    for _ in range(cohorts):
+        programme = rnd.sample(exam_names, per_student)
+        # Two core modules in one programme would force two exams onto one day each, keep at most one
+        cores = [exam for exam in programme if exam in core_names]
+        for exam in cores[1:]:
+            programme.remove(exam)
+        programmes.append(programme)
+
+    header = ["CID", "Name", "Programme", "Additional Exam Arrangements AEA", None, None, None, None, None] + exam_names
+    rows = [header, [None] * len(header)]
+    for i in range(students):
+        cohort = i % cohorts
+        taken = set(programmes[cohort])
+        if rnd.random() < 0.3:
+            option = rnd.choice(exam_names)
+            if option not in core_names:
+                taken.add(option)
+        arrangement = rnd.choice(ARRANGEMENTS) if rnd.random() < aea_share else "#N/A"
+        rows.append([f"{i:08d}", f"Student {i}", f"Programme {cohort}", arrangement, None, None, None, None, None]
+                    + ["x" if exam in taken else None for exam in exam_names])
+    pd.DataFrame(rows).to_excel(os.path.join(out_dir, "students.xlsx"), header=False, index=False)
+
+    modules = []
+    for i, exam in enumerate(exam_names):
+        code, name = exam.split(" ", 1)
+        modules.append({
+            "Banner Code (New CR)": code,
+            "Module Name": name,
+            # Fixed modules get their own leaders so the week 3 rule can never be broken by the fixed times alone
+            "Module Leader (lecturer 1)": f"Fixed Leader {i}" if exam in Fixed_modules else f"Leader {i % max(1, exams // 3)}",
+            "(UGO Internal) 2nd Exam Marker": None,
+            "(UGO Internal) Exam Style": "PC" if rnd.random() < pc_share and exam not in Fixed_modules else "Standard",
+        })
+    # The module list is read from the second sheet with its header on the second row
+    with pd.ExcelWriter(os.path.join(out_dir, "modules.xlsx")) as writer:
+        pd.DataFrame([["Synthetic module list"]]).to_excel(writer, sheet_name="Notes", header=False, index=False)
+        pd.DataFrame(modules).to_excel(writer, sheet_name="Modules", startrow=1, index=False)
+
+    wb = Workbook()
+    ws = wb.active
+    ws["F4"] = "Bank Holidays"
+    for row, (name, date) in enumerate(BANK_HOLIDAYS, start=5):
+        ws[f"F{row}"] = name
+        ws[f"G{row}"] = date
+    ws["F8"] = "Term Dates 2025-26"
+    ws["F10"] = "Summer Term"
+    ws["F11"] = SUMMER_TERM
+    ws["F13"] = "End"
+    wb.save(os.path.join(out_dir, "useful_dates.xlsx"))
+
+    instance = {
+        "students": students,
+        "exams": exams,
+        "exams_per_student": exams_per_student,
+        "aea_share": aea_share,
+        "room_copies": room_copies,
+        "seed": seed,
+        "Fixed_modules": Fixed_modules,
+        "Core_modules": core_names,
+        "rooms": scaled_rooms(room_copies),
+    }
+    with open(os.path.join(out_dir, "instance.json"), "w") as f:
+        json.dump(instance, f, indent=2)
+    return instance
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic exam timetabling instance.")
+    parser.add_argument("out_dir")
+    parser.add_argument("--students", type=int, default=300)
+    parser.add_argument("--exams", type=int, default=40)
+    parser.add_argument("--exams-per-student", type=int, default=6)
+    parser.add_argument("--aea-share", type=float, default=0.15)
+    parser.add_argument("--fixed", type=int, default=10)
+    parser.add_argument("--core", type=int, default=3)
+    parser.add_argument("--room-copies", type=int, default=None)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    instance = generate(args.out_dir, args.students, args.exams, args.exams_per_student, args.aea_share,
+                        args.fixed, args.core, args.room_copies, seed=args.seed)
+    print(f"Wrote {args.students} students and {args.exams} exams to {args.out_dir}")
@@ -0,0 +1,191 @@
+# Scaling benchmark for the timetabling model.
+# Each size in the sweep is generated, then built and solved in a fresh process so peak RSS is per size.
+# With --cli each size is instead run end to end through timetable_cli.run, with the instance's own fixed modules,
+# core modules and rooms, as a batch user would run it.
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+import resource
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd
+from openpyxl import load_workbook
+from ortools.sat.python import cp_model
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARK_DIR))
+import timetable_model
+import timetable_cli
+from generate_instances import generate
+
+# (students, exams) pairs for the default sweep, roughly doubling each step
+DEFAULT_SIZES = [(150, 20), (300, 40), (600, 80), (1200, 160), (2400, 320)]
+
+FIELDS = ["students", "exams", "rooms", "room_mode", "formulation", "profiles", "conflict_edges", "build_time", "num_variables",
+          "num_constraints", "presolve_time", "first_solution_time", "first_objective", "solve_time", "status",
+          "objective", "best_bound", "peak_rss_mb"]
+
+
+class FirstSolutionTimer(cp_model.CpSolverSolutionCallback):
+    """Record when the first solution arrives and its objective."""
+
+    def __init__(self):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.first_time = None
+        self.first_objective = None
+
+    def on_solution_callback(self):
+        if self.first_time is None:
+            self.first_time = self.WallTime()
+            self.first_objective = self.ObjectiveValue()
+
+
+def benchmark_instance(instance_dir, room_mode, solver_settings, formulation="one-hot"):
+    """Build and solve one generated instance, returning a row of measurements."""
+    with open(os.path.join(instance_dir, "instance.json")) as f:
+        instance = json.load(f)
+    students, errors = timetable_model.validate_student_list(pd.read_excel(os.path.join(instance_dir, "students.xlsx"), header=None))
+    if errors:
+        raise ValueError(f"Generated student list is invalid: {errors[:3]}")
+    leaders_df = pd.read_excel(os.path.join(instance_dir, "modules.xlsx"), sheet_name=1, header=1)
+    wb = load_workbook(os.path.join(instance_dir, "useful_dates.xlsx"))
+
+    build_start = time.time()
+    days, bank_holiday_days = timetable_model.read_exam_calendar(wb)
+    no_exam_dates = timetable_model.no_exam_dates + [[d, s] for d in bank_holiday_days for s in (0, 1)]
+    leader_courses, exam_types = timetable_model.match_modules(leaders_df, students.exams)
+    tm = timetable_model.build_model(
+        students, leader_courses, exam_types, days, no_exam_dates, 3, 4, room_mode=room_mode,
+        Fixed_modules=instance["Fixed_modules"], Core_modules=instance["Core_modules"], rooms=instance["rooms"],
+        formulation=formulation,
+    )
+    build_time = time.time() - build_start
+    proto = tm["model"].Proto()
+
+    # Presolve on its own, then the full solve
+    presolver = cp_model.CpSolver()
+    timetable_model.apply_solver_settings(presolver, solver_settings)
+    presolver.parameters.stop_after_presolve = True
+    presolver.Solve(tm["model"])
+
+    solver = cp_model.CpSolver()
+    timetable_model.apply_solver_settings(solver, solver_settings)
+    timer = FirstSolutionTimer()
+    status = solver.Solve(tm["model"], timer)
+    found = status in (cp_model.OPTIMAL, cp_model.FEASIBLE)
+
+    return {
+        "students": len(students.cids),
+        "exams": len(students.exams),
+        "rooms": len(instance["rooms"]),
+        "room_mode": room_mode,
+        "formulation": formulation,
+        "profiles": len(tm["profiles"]),
+        "conflict_edges": len(tm["conflict_graph"]),
+        "build_time": round(build_time, 3),
+        "num_variables": len(proto.variables),
+        "num_constraints": len(proto.constraints),
+        "presolve_time": round(presolver.WallTime(), 3),
+        "first_solution_time": round(timer.first_time, 3) if timer.first_time is not None else None,
+        "first_objective": timer.first_objective,
+        "solve_time": round(solver.WallTime(), 3),
+        "status": solver.StatusName(status),
+        "objective": solver.ObjectiveValue() if found else None,
+        "best_bound": solver.BestObjectiveBound() if found else None,
+        # ru_maxrss is in kilobytes on Linux
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1),
+    }
+
+
+def cli_instance(instance_dir, room_mode, solver_settings, formulation="one-hot"):
+    """Run one generated instance through the command line entry point, returning a row of measurements.
+
+    Presolve, first solution and conflict graph timings are not reported by the command line, so are left blank.
+    """
+    instance_path = os.path.join(instance_dir, "instance.json")
+    with open(instance_path) as f:
+        generated = json.load(f)
+    instance = timetable_cli.load_instance(instance_path)
+    run_config = timetable_cli.load_run_config()
+    run_config["solver"].update(solver_settings or {})
+    run_config.update({"room_mode": room_mode, "formulation": formulation})
+    row = {"students": generated["students"], "exams": generated["exams"], "rooms": len(instance["rooms"]),
+           "room_mode": room_mode, "formulation": formulation}
+    try:
+        summary = timetable_cli.run(
+            os.path.join(instance_dir, "students.xlsx"), os.path.join(instance_dir, "modules.xlsx"),
+            os.path.join(instance_dir, "useful_dates.xlsx"), os.path.join(instance_dir, "timetable.xlsx"), run_config,
+            instance=instance,
+        )
+    except timetable_model.TimetablingError as e:
+        summary = {"status": "FAILED", "error": str(e)}
+    if "model" in summary:
+        row.update({
+            "profiles": summary["model"]["profiles"],
+            "build_time": round(summary["timings"]["build"], 3),
+            "num_variables": summary["model"]["variables"],
+            "num_constraints": summary["model"]["constraints"],
+            "solve_time": round(summary["timings"]["solve"], 3),
+            "objective": summary["objective"],
+            "best_bound": summary["best_bound"],
+        })
+    row["status"] = summary["status"]
+    row["peak_rss_mb"] = round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1)
+    return row
+
+
+def run_sweep(sizes, out_csv, instances_dir, room_mode="monolithic", solver_settings=None, exams_per_student=6, seed=0,
+              formulation="one-hot", through_cli=False):
+    """Generate and benchmark every size, writing one CSV row per size as it finishes.
+
+    With through_cli, each size is solved end to end by cli_instance rather than timed model-only by benchmark_instance.
+    """
+    benchmark = cli_instance if through_cli else benchmark_instance
+    rows = []
+    with open(out_csv, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=FIELDS)
+        writer.writeheader()
+        for students, exams in sizes:
+            instance_dir = os.path.join(instances_dir, f"{students}_students_{exams}_exams")
+            generate(instance_dir, students=students, exams=exams, exams_per_student=exams_per_student, seed=seed)
+            # A new spawned process per size, so memory from one size never counts towards the next
+            with ProcessPoolExecutor(max_workers=1, mp_context=multiprocessing.get_context("spawn")) as pool:
+                row = pool.submit(benchmark, instance_dir, room_mode, solver_settings, formulation).result()
+            writer.writerow(row)
+            f.flush()
+            print(f"{students} students, {exams} exams: {row.get('num_variables')} variables, {row.get('num_constraints')} constraints, "
+                  f"built in {row.get('build_time')}s, {row['status']} objective {row.get('objective')} in {row.get('solve_time')}s, "
+                  f"peak RSS {row['peak_rss_mb']} MB")
+            rows.append(row)
+    return rows
+
+
+def parse_size(text):
+    students, exams = text.split("x")
+    return int(students), int(exams)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure how the timetabling model scales with instance size.")
+    parser.add_argument("--sizes", nargs="+", type=parse_size, default=DEFAULT_SIZES,
+                        help="students x exams pairs, e.g. 300x40 600x80")
+    parser.add_argument("--room-mode", choices=["monolithic", "decomposed"], default="monolithic")
+    parser.add_argument("--formulation", choices=timetable_model.FORMULATIONS, default="one-hot")
+    parser.add_argument("--time-limit", type=float, default=60, help="solver time limit per size in seconds")
+    parser.add_argument("--workers", type=int, default=None, help="CP-SAT search workers (default: all cores)")
+    parser.add_argument("--exams-per-student", type=int, default=6)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", default=os.path.join(BENCHMARK_DIR, "results.csv"))
+    parser.add_argument("--instances-dir", default=os.path.join(BENCHMARK_DIR, "instances"))
+    parser.add_argument("--cli", action="store_true",
+                        help="run each instance end to end through timetable_cli.py with its instance.json")
+    args = parser.parse_args()
+    solver_settings = {"max_time_in_seconds": args.time_limit}
+    if args.workers:
+        solver_settings["num_workers"] = args.workers
+    run_sweep(args.sizes, args.out, args.instances_dir, args.room_mode, solver_settings, args.exams_per_student, args.seed,
+              args.formulation, args.cli)
+    print(f"Results written to {args.out}")
@@ -0,0 +1,215 @@
+# Screening of the inputs for infeasibility before any CP-SAT model is built. Each check is a cheap bound on the enrollment
+# matrix that the model's hard rules can never beat, so a failure here means the solve is doomed; every failure is
+# reported at once, as violation records in the same format as the timetable checker.
+import numpy as np
+from room_allocation import NON_ME_ROOM
+from timetable_checker import HARD, violation
+
+# Days of week 3, where a module leader can have at most one exam (as posted by the model)
+LEADER_WEEK3_DAYS = range(13, 21)
+SLOT_NAMES = ["Morning", "Afternoon"]
+
+
+def open_slots(num_days, no_exam_dates):
+    """days x slots, True where exams may be held."""
+    usable = np.ones((num_days, len(SLOT_NAMES)), dtype=bool)
+    for d, s in no_exam_dates:
+        if d < num_days:
+            usable[d, s] = False
+    return usable
+
+
+def most_exams(day_capacity, required, max_exams_2days, max_exams_5days):
+    """Most exams one student can sit with at most day_capacity[d] (and at least required[d], their fixed exams) on day d
+    and within the 2-day and 5-day window limits.
+
+    Dynamic programme over the days keeping the last four days' counts, so the bound is exact for these rules alone.
+    """
+    best = {(): 0}
+    for capacity, needed in zip(day_capacity, required):
+        following = {}
+        for recent, total in best.items():
+            for count in range(min(needed, capacity), capacity + 1):
+                if len(day_capacity) >= 2 and sum(recent[-1:]) + count > max_exams_2days:
+                    continue
+                if len(day_capacity) >= 5 and sum(recent) + count > max_exams_5days:
+                    continue
+                key = (recent + (count,))[-4:]
+                following[key] = max(following.get(key, 0), total + count)
+        best = following
+    return max(best.values(), default=0)
+
+
+def greedy_cliques(adjacent):
+    """Grow one clique of the exam conflict graph from every exam, adding the best connected exam each step."""
+    degree = adjacent.sum(axis=1)
+    cliques = set()
+    for start in np.argsort(-degree):
+        clique = [start]
+        candidates = adjacent[start].copy()
+        while candidates.any():
+            inner = adjacent[:, candidates].sum(axis=1)
+            inner[~candidates] = -1
+            best = int(np.argmax(inner))
+            clique.append(best)
+            candidates &= adjacent[best]
+        cliques.add(frozenset(int(i) for i in clique))
+    return cliques
+
+
+def describe(cids, limit=5):
+    """"00000001, 00000002 and 3 more" for a list of CIDs."""
+    cids = [str(cid) for cid in cids]
+    return ", ".join(cids[:limit]) + (f" and {len(cids) - limit} more" if len(cids) > limit else "")
+
+
+def screen_feasibility(students, leader_courses, exam_types, days, no_exam_dates, max_exams_2days, max_exams_5days,
+                       Fixed_modules, Core_modules, rooms):
+    """Return a violation record for every way the inputs are certain to make the model infeasible, [] if none is found.
+
+    no_exam_dates should include the bank holidays, as passed to build_model.
+    """
+    failures = []
+    exams = students.exams
+    exam_index = {exam: i for i, exam in enumerate(exams)}
+    enrolled = students.enrolled
+    num_days = len(days)
+    usable = open_slots(num_days, no_exam_dates)
+
+    def when(d, s):
+        return f"{days[d] if d < num_days else f'day {d}'} {SLOT_NAMES[s]}"
+
+    # Students with more exams than the period can hold, given the window limits, their fixed exams and for 50% extra
+    # time one exam a day; students with the same fixed exam days share one bound
+    fixed = [(exam, d, s) for exam, (d, s) in Fixed_modules.items() if exam in exam_index and d < num_days]
+    fixed_days = np.zeros((len(exams), num_days), dtype=np.int32)
+    for exam, d, _ in fixed:
+        fixed_days[exam_index[exam], d] = 1
+    required = enrolled.astype(np.int32) @ fixed_days
+    exam_count = enrolled.sum(axis=1)
+    capacities = {False: usable.sum(axis=1), True: usable.any(axis=1).astype(int)}
+    bounds = {}
+    for row in range(len(students.cids)):
+        is_50 = bool(students.extra_time_50[row])
+        key = (is_50, required[row].tobytes())
+        if key not in bounds:
+            bounds[key] = most_exams(capacities[is_50], required[row], max_exams_2days, max_exams_5days)
+        if exam_count[row] > bounds[key]:
+            cid = students.cids[row]
+            reason = (f"{int(capacities[is_50].sum())} usable {'days' if is_50 else 'slots'}, at most {max_exams_2days} exams "
+                      f"in any 2 consecutive days and {max_exams_5days} in any 5")
+            if required[row].any():
+                reason += ", with their fixed exams"
+            failures.append(violation(
+                "Too many exams", HARD,
+                f"Student {cid} takes {exam_count[row]} exams but at most {bounds[key]} fit in the exam period ({reason})",
+                student=str(cid), exams=[exams[i] for i in np.flatnonzero(enrolled[row])],
+            ))
+
+    # Groups of exams that pairwise share students need one usable slot each
+    shared = enrolled.T.astype(np.int32) @ enrolled.astype(np.int32)
+    adjacent = shared > 0
+    np.fill_diagonal(adjacent, False)
+    num_usable = int(usable.sum())
+    for clique in sorted(greedy_cliques(adjacent), key=sorted):
+        columns = sorted(clique)
+        # A clique inside one student's exams is already reported above
+        if len(columns) > num_usable and not enrolled[:, columns].all(axis=1).any():
+            failures.append(violation(
+                "Conflict clique", HARD,
+                f"{len(columns)} exams all share students with each other but only {num_usable} slots are usable",
+                exams=[exams[i] for i in columns],
+            ))
+
+    # Fixed modules on forbidden slots, or clashing with each other for a shared student
+    for exam, (d, s) in Fixed_modules.items():
+        if exam in exam_index and (d >= num_days or not usable[d, s]):
+            failures.append(violation(
+                "Fixed module date", HARD, f"Fixed module {exam} is fixed to {when(d, s)}, when no exams are allowed",
+                exams=[exam], day=d, slot=s,
+            ))
+    extra_time_50 = students.extra_time_50
+    for n, (exam1, d1, s1) in enumerate(fixed):
+        for exam2, d2, s2 in fixed[n + 1:]:
+            if d1 != d2:
+                continue
+            both = enrolled[:, exam_index[exam1]] & enrolled[:, exam_index[exam2]]
+            if not both.any():
+                continue
+            cids = students.cids[both]
+            if s1 == s2:
+                rule, reason = "Fixed module clash", f"are fixed to the same slot but share students {describe(cids)}"
+            elif exam1 in Core_modules or exam2 in Core_modules:
+                rule, reason = "Core module day", f"are fixed to the same day, one is a core module and they share students {describe(cids)}"
+            elif (both & extra_time_50).any():
+                cids = students.cids[both & extra_time_50]
+                rule, reason = "50% extra time", f"are fixed to the same day but share 50% extra time students {describe(cids)}"
+            else:
+                continue
+            failures.append(violation(rule, HARD, f"Fixed modules {exam1} and {exam2} {reason}",
+                                      student=str(cids[0]), exams=[exam1, exam2], day=d1, slot=s1 if s1 == s2 else None))
+
+    # Module leaders with more than one exam fixed in week 3
+    for leader, leader_exams in leader_courses.items():
+        fixed_week3 = [exam for exam, d, _ in fixed if exam in leader_exams and d in LEADER_WEEK3_DAYS]
+        if len(fixed_week3) > 1:
+            failures.append(violation(
+                "Leader week 3", HARD, f"Module leader {leader} has {len(fixed_week3)} exams fixed in week 3",
+                leader=leader, exams=fixed_week3,
+            ))
+
+    # Room capacity: Mech Eng exams (all but the fixed non core modules) share the Mech Eng rooms
+    exam_counts = students.exam_counts()
+    me_rooms = [room for room in rooms if room != NON_ME_ROOM]
+    computer_rooms = [room for room in me_rooms if "Computer" in rooms[room][0]]
+
+    def seats(room_list, use):
+        return sum(rooms[room][1] for room in room_list if use in rooms[room][0])
+
+    def is_me(exam):
+        return exam not in Fixed_modules or exam in Core_modules
+
+    for exam in exams:
+        if not is_me(exam):
+            continue
+        room_list, kind = (computer_rooms, "computer rooms") if exam_types.get(exam) == "PC" else (me_rooms, "rooms")
+        for count, use in zip(exam_counts[exam], ("AEA", "SEQ")):
+            if count > seats(room_list, use):
+                failures.append(violation(
+                    "Room capacity", HARD,
+                    f"{exam} has {count} {use} students but all {kind} together seat {seats(room_list, use)}",
+                    exams=[exam],
+                ))
+
+    fixed_slots = {}
+    for exam, d, s in fixed:
+        if is_me(exam):
+            fixed_slots.setdefault((d, s), []).append(exam)
+    for (d, s), slot_exams in sorted(fixed_slots.items()):
+        where = when(d, s)
+        if len(slot_exams) > len(me_rooms):
+            failures.append(violation(
+                "Slot capacity", HARD, f"{len(slot_exams)} exams are fixed to {where} but there are only {len(me_rooms)} rooms",
+                exams=slot_exams, day=d, slot=s,
+            ))
+        pc_exams = [exam for exam in slot_exams if exam_types.get(exam) == "PC"]
+        for group, room_list, kind in ((slot_exams, me_rooms, "rooms"), (pc_exams, computer_rooms, "computer rooms")):
+            if len(group) < 2:
+                continue
+            for i, use in enumerate(("AEA", "SEQ")):
+                total = sum(exam_counts[exam][i] for exam in group)
+                if total > seats(room_list, use):
+                    failures.append(violation(
+                        "Slot capacity", HARD,
+                        f"Exams fixed to {where} have {total} {use} students but all {kind} together seat {seats(room_list, use)}",
+                        exams=group, day=d, slot=s,
+                    ))
+    return failures
+
+
+def screen_message(failures, limit=10):
+    """One error message listing the first limit failures."""
+    lines = [f"- {failure['message']}" for failure in failures[:limit]]
+    if len(failures) > limit:
+        lines.append(f"- and {len(failures) - limit} more")
+    return "Infeasible inputs, found before solving:\n" + "\n".join(lines)
@@ -0,0 +1,115 @@
+# Cache of parsed and validated input workbooks, keyed by a hash of the uploaded bytes.
+# Streamlit reruns the page on every interaction, so regenerating with new weights should not re-read the spreadsheets.
+import io
+import os
+import json
+import pickle
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import pandas as pd
+from openpyxl import load_workbook
+from timetable_model import (
+    ALIAS_FILE, TimetablingError, validate_student_list, validate_module_list, validate_useful_dates, read_exam_calendar,
+    match_module_list, modules_from_matches,
+)
+
+logger = logging.getLogger(__name__)
+
+# Parsed inputs kept per server process before the least recently used are dropped
+MAX_CACHE_BYTES = 512 * 1024 * 1024
+
+
+class ParsedInputCache:
+    """Least recently used cache of parsed uploads with a cap on their total (pickled) size."""
+
+    def __init__(self, max_bytes=MAX_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()  # key -> (value, size in bytes)
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def get_or_parse(self, kind, contents, parse):
+        """Return parse(), reusing the cached result if the same uploaded bytes were parsed before."""
+        key = (kind,) + tuple(hashlib.sha256(data).hexdigest() for data in contents)
+        with self.lock:
+            if key in self.entries:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return self.entries[key][0]
+            self.misses += 1
+        value = parse()
+        size = len(pickle.dumps(value))
+        with self.lock:
+            if key not in self.entries and size <= self.max_bytes:
+                self.entries[key] = (value, size)
+                self.total_bytes += size
+                while self.total_bytes > self.max_bytes:
+                    evicted, (_, evicted_size) = self.entries.popitem(last=False)
+                    self.total_bytes -= evicted_size
+                    logger.info(f"Evicted parsed {evicted[0]} ({evicted_size / 1e6:.1f} MB) from the input cache")
+        return value
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+            self.total_bytes = 0
+
+
+def parse_students(student_bytes):
+    """Read and validate the student list, returning (students, errors)."""
+    return validate_student_list(pd.read_excel(io.BytesIO(student_bytes), header=None))
+
+
+def parse_modules(module_bytes, exams, aliases=None):
+    """Read and validate the module list and match it to the exams, using the known aliases.
+
+    Returns (errors, leader_courses, exam_types, match_report). New matches are saved by save_matches when the user asks.
+    """
+    module_df = pd.read_excel(io.BytesIO(module_bytes), sheet_name=1, header=1)
+    errors = validate_module_list(module_df)
+    if errors:
+        return errors, None, None, None
+    report = match_module_list(module_df, exams, aliases)
+    leader_courses, exam_types = modules_from_matches(report, exams)
+    return [], leader_courses, exam_types, report
+
+
+def parse_calendar(dates_bytes):
+    """Read and validate the useful dates workbook, returning (errors, days, bank_holiday_days)."""
+    wb = load_workbook(io.BytesIO(dates_bytes))
+    errors = validate_useful_dates(wb)
+    if errors:
+        return errors, None, None
+    try:
+        days, bank_holiday_days = read_exam_calendar(wb)
+    except TimetablingError as e:
+        return [str(e)], None, None
+    return [], days, bank_holiday_days
+
+
+def parse_uploads(cache, student_bytes, module_bytes, dates_bytes, alias_path=ALIAS_FILE):
+    """Parse the three input workbooks through the cache, returning a dictionary of everything the model needs and any errors."""
+    students, student_errors = cache.get_or_parse("students", (student_bytes,), lambda: parse_students(student_bytes))
+    module_errors, leader_courses, exam_types, match_report = [], None, None, None
+    if students is not None:
+        # The match depends on the exams and the alias table, so both are part of the key. The aliases are parsed from the
+        # same bytes that were hashed, so a save in between cannot give a cached match the wrong key
+        alias_bytes = open(alias_path, "rb").read() if os.path.exists(alias_path) else b""
+        aliases = json.loads(alias_bytes) if alias_bytes else {}
+        module_errors, leader_courses, exam_types, match_report = cache.get_or_parse(
+            "modules", (module_bytes, student_bytes, alias_bytes), lambda: parse_modules(module_bytes, students.exams, aliases)
+        )
+    dates_errors, days, bank_holiday_days = cache.get_or_parse("calendar", (dates_bytes,), lambda: parse_calendar(dates_bytes))
+    return {
+        "students": students,
+        "leader_courses": leader_courses,
+        "exam_types": exam_types,
+        "match_report": match_report,
+        "days": days,
+        "bank_holiday_days": bank_holiday_days,
+        "errors": {"Student list": student_errors, "Module list": module_errors, "Useful dates": dates_errors},
+    }
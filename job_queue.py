@@ -0,0 +1,123 @@
+# Bounded queue of solver jobs shared by every Streamlit session on the server.
+# Only max_running solves run at once, each given an equal share of the CPU cores as CP-SAT workers, and the rest wait
+# in submission order, so several people generating drafts at the same time get predictable turnaround.
+import os
+import time
+import heapq
+import uuid
+import logging
+import threading
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+# Server-wide limits, overridable from the environment
+MAX_RUNNING_SOLVES = int(os.environ.get("TIMETABLE_MAX_SOLVES", 2))
+SOLVER_CORES = int(os.environ.get("TIMETABLE_SOLVER_CORES", os.cpu_count() or 1))
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+CANCELLED = "cancelled"
+
+
+def expected_duration(solver_settings, num_solutions=1, alternative_time=None):
+    """Worst-case solve time of a job in seconds: the time limit plus the time allowed for alternatives."""
+    time_limit = solver_settings.get("max_time_in_seconds", 0)
+    return time_limit + (num_solutions - 1) * (alternative_time or time_limit)
+
+
+class SolverJobQueue:
+    """Runs submitted jobs on at most max_running threads, sharing cores between them.
+
+    A job is a dictionary owned by one session. The queue adds "id", "state", "submitted", "started",
+    "finished" and "num_workers" to it and caps job["solver_settings"]["num_workers"] at the job's share of cores.
+    """
+
+    def __init__(self, max_running=MAX_RUNNING_SOLVES, cores=SOLVER_CORES):
+        self.max_running = max(1, max_running)
+        self.cores = max(1, cores)
+        self.waiting = deque()
+        self.running = []
+        self.lock = threading.Lock()
+        self.completed = 0
+
+    @property
+    def workers_per_job(self):
+        return max(1, self.cores // self.max_running)
+
+    def submit(self, job, target):
+        """Queue target(job) to run once a slot is free, and return the job."""
+        job.update({"id": uuid.uuid4().hex[:8], "state": QUEUED, "submitted": time.time(), "started": None, "finished": None})
+        with self.lock:
+            self.waiting.append((job, target))
+            logger.info(f"Queued solver job {job['id']} behind {len(self.waiting) - 1} waiting and {len(self.running)} running")
+            self.start_waiting()
+        return job
+
+    def start_waiting(self):
+        # Called with the lock held
+        while self.waiting and len(self.running) < self.max_running:
+            job, target = self.waiting.popleft()
+            settings = job["solver_settings"]
+            job["num_workers"] = min(settings.get("num_workers") or self.workers_per_job, self.workers_per_job)
+            settings["num_workers"] = job["num_workers"]
+            job["state"] = RUNNING
+            job["started"] = time.time()
+            self.running.append(job)
+            threading.Thread(target=self.run, args=(job, target), daemon=True).start()
+
+    def run(self, job, target):
+        try:
+            target(job)
+        except Exception as e:
+            logger.error(f"Solver job {job['id']} failed: {e}", exc_info=True)
+            job["error"] = str(e)
+        finally:
+            with self.lock:
+                job["finished"] = time.time()
+                job["state"] = DONE
+                self.running.remove(job)
+                self.completed += 1
+                self.start_waiting()
+
+    def cancel(self, job):
+        """Drop a waiting job, or stop a running one early keeping its best timetable."""
+        with self.lock:
+            for entry in self.waiting:
+                if entry[0] is job:
+                    self.waiting.remove(entry)
+                    job["state"] = CANCELLED
+                    job["finished"] = time.time()
+                    return
+        job["stop"].set()
+
+    def position(self, job):
+        """1-based place of a waiting job in the queue, or 0 once it has started."""
+        with self.lock:
+            for i, (waiting_job, _) in enumerate(self.waiting, start=1):
+                if waiting_job is job:
+                    return i
+        return 0
+
+    def eta(self, job):
+        """Estimated seconds until a waiting job starts, assuming every job ahead of it uses its full time limit."""
+        now = time.time()
+        with self.lock:
+            # Time at which each running slot frees up
+            free_at = [max(now, running["started"] + running["expected_duration"]) for running in self.running]
+            free_at += [now] * (self.max_running - len(free_at))
+            heapq.heapify(free_at)
+            for waiting_job, _ in self.waiting:
+                start = heapq.heappop(free_at)
+                if waiting_job is job:
+                    return start - now
+                heapq.heappush(free_at, start + waiting_job["expected_duration"])
+        return 0.0
+
+    def status(self):
+        """Counts of running, waiting and completed jobs for display."""
+        with self.lock:
+            return {"running": len(self.running), "waiting": len(self.waiting), "completed": self.completed,
+                    "max_running": self.max_running, "workers_per_job": self.workers_per_job}
@@ -1,21 +1,25 @@
 # This file contains the timetable generation logic from app_multiple_sols.py
 import streamlit as st
 import pandas as pd
-import numpy as np
-from ortools.sat.python import cp_model
-from rapidfuzz import process, fuzz
 from collections import defaultdict
-from openpyxl import load_workbook
-from datetime import datetime, timedelta
-import re
-from dateutil.parser import parse
 import time
 import logging
-from openpyxl.styles import PatternFill, Alignment
 import threading
+import queue
 import streamlit.components.v1 as components
 import sys
-import pickle
+import os
+import json
+from timetable_io import file_reading, export_timetable
+from run_store import list_runs, load_timetable, save_run
+from job_queue import QUEUED, RUNNING, CANCELLED, SolverJobQueue, expected_duration
+from weight_sweep import PARETO_FAMILIES, run_sweep, sweep_grid
+from input_cache import ParsedInputCache, parse_uploads
+from timetable_model import (
+    ALIAS_FILE, DIAGNOSIS_TIME, Core_modules, Fixed_modules, TimetablingError, densest_conflicts, conflict_degrees,
+    STAGE_ORDER, default_solver_settings, create_timetable, stage_plan, no_exam_dates, rooms, save_matches,
+)
+from feasibility_screen import screen_feasibility
 
 
 # Set up logging
@@ -24,195 +28,71 @@ logger = logging.getLogger(__name__)
 
 st.set_page_config(page_title="Exam Timetabling System", layout="wide")
 
-# Core modules list
-Core_modules = ["MECH70001 Nuclear Thermal Hydraulics",
-                "MECH60004/MECH70042 Introduction to Nuclear Energy A/B",
-                "MECH70002 Nuclear Reactor Physics",
-                "MECH70008 Mechanical Transmissions Technology",
-                "MECH70006 Metal Processing Technology",
-                "MECH70021Aircraft Engine Technology",
-                "MECH70003 Future Clean Transport Technology",
-                "MECH60015/70030 PEN3/AME"]
-
-# Fixed modules dictionary , name and date
-Fixed_modules = {"BUSI60039 Business Strategy" :[1,1],
-                 "BUSI60046 Project Management":[2,1],
-                 "ME-ELEC70098 Optimisation":[3,0],
-                 "MECH70001 Nuclear Thermal Hydraulics":[3,0],
-                 "BUSI60040/BUSI60043 Corporate Finance Online/Finance & Financial Management":[3,1],
-                 "MECH60004/MECH70042 Introduction to Nuclear Energy A/B":[4,0],
-                 "ME-ELEC70022 Modelling and Control of Multi-body Mechanical Systems":[4,0],
-                 "MATE97022 Nuclear Materials 1":[4,0],
-                 "ME-MATE70029 Nuclear Fusion":[9,0],
-                 "MECH70002 Nuclear Reactor Physics":[10,0],
-                 "ME-ELEC70076 Sustainable Electrical Systems":[10,0],
-                 "ME ELEC70066 Applied Advanced Optimisation":[10,0],
-                 "MECH70020 Combustion, Safety and Fire Dynamics":[11,0],
-                 "BIOE70016 Human Neuromechanical Control and Learning":[11,0],
-                 "CENG60013 Nuclear Chemical Engineering":[11,0],
-                 "MECH70008 Mechanical Transmissions Technology":[17,1],
-                 "MECH70006 Metal Processing Technology":[17,1],
-                 "MECH70021Aircraft Engine Technology":[17,1],
-                 "MECH70003 Future Clean Transport Technology":[17,1],
-                 "MECH60015/70030 PEN3/AME":[18,1]}
-
-# Room dictionary with capacities and functions
-rooms = {
-    'CAGB 203': [["Computer", "SEQ"], 65],
-    'CAGB 309': [["SEQ"], 54],
-    'CAGB 649-652': [["SEQ"], 75],
-    'CAGB 747-748': [["SEQ","AEA"], 36],
-    'CAGB 749-752': [["SEQ"], 75],
-    'CAGB 761': [["Computer", "SEQ","AEA"], 25],
-    'CAGB 762': [["Computer", "SEQ","AEA"], 25],
-    'CAGB 765': [["AEA","Computer"], 10],
-    'CAGB 527': [["AEA"], 2],
-    'NON ME N/A':[["SEQ","AEA"],1000], #For business and non Mech Eng modules
-}
+@st.cache_resource
+def get_input_cache():
+    """One parsed input cache shared by every session on this server."""
+    return ParsedInputCache()
+
+@st.cache_resource
+def get_job_queue():
+    """One solver job queue shared by every session on this server."""
+    return SolverJobQueue()
+
+def conflict_table(conflicts):
+    """Rules found to conflict, by the screen before solving or the diagnosis after, as a table."""
+    return pd.DataFrame(
+        [(conflict["rule"], conflict["message"], conflict["exams"] if isinstance(conflict["exams"], str) else ", ".join(conflict["exams"]))
+         for conflict in conflicts],
+        columns=["Rule", "Conflict", "Exams"],
+    )
 
-# No exam dates (weekends and last Friday morning)
-no_exam_dates = [
-    [5,0], [5,1], [6,0], [6,1],  # First weekend
-    [12,0], [12,1], [13,0], [13,1],  # Second weekend
-    [18,0], [19,0], [19,1], [20,0], [20,1]  # Last Friday morning and weekend
-]
-
-#Days it is preferable to not have an exam on but can if needed
-no_exam_dates_soft = [
-    [15,0],# Week 3 tuesday morning
-    [16,0], #Week 3 Wednesday morning
-]
-
-def ordinal(n):
-    # Returns ordinal string for an integer n, e.g. 1 -> 1st, 2 -> 2nd
-    if 11 <= (n % 100) <= 13:
-        return f"{n}th"
-    else:
-        return f"{n}{['th','st','nd','rd','th','th','th','th','th','th'][n % 10]}"
+def process_files(max_exams_2days, max_exams_5days):
+    """Process uploaded files and return the parsed inputs, reusing earlier parses of the same files.
 
-def validate_student_list(df):
-    """Validate the student list Excel file format and content."""
-    errors = []
-    
-    if len(df) < 3:
-        errors.append("Student list must have at least 3 rows (header + students)")
-        return errors
-    
-    if df.iloc[0, 0] != "CID" or df.iloc[0, 3] != "Additional Exam Arrangements AEA":
-        errors.append(f"Student list must have 'CID' instead of {df.iloc[0, 0]} in column A and 'AEA' instead of {df.iloc[0, 3]}")
-        return errors
-    
-    exam_columns = df.iloc[0, 9:].dropna()
-    if len(exam_columns) == 0:
-        errors.append("No exam columns found starting from column J")
-        return errors
-    
-    student_rows = df.iloc[2:, :]
-    for idx, row in student_rows.iterrows():
-        cid = row[0]
-        if pd.isna(cid):
-            errors.append(f"Missing CID in row {idx + 3}")
-            continue
-        for col_idx, exam_name in enumerate(exam_columns, start=9):
-            value = str(row[col_idx]).strip().lower()
-            if value not in ['x', 'a', 'b', 'nan']:
-                errors.append(f"Invalid exam indicator '{value}' for student {cid} in exam {exam_name}")
-
-    return errors
-
-def validate_module_list(df):
-    """Validate the module list Excel file format and content."""
-    errors = []
-
-    if len(df) < 2:
-        errors.append("Module list must have at least 2 rows")
-        return errors
-    
-    required_cols = ['Banner Code (New CR)', 'Module Name', 'Module Leader (lecturer 1)']
-    for col in required_cols:
-        if col not in df.columns:
-            errors.append(f"Missing required column: {col}")
-
-    return errors
-
-def validate_useful_dates(wb):
-    """Validate the useful dates Excel file format and content."""
-    errors = []
-    if not wb:
-        errors.append("Could not open useful dates file")
-        return errors
-    ws = wb.active
-    found_bank_holidays = False
-    row = 5
-    while True:
-        name = ws[f"F{row}"].value
-        if name is None or "Term Dates" in str(name):
-            break
-        if "Bank Holiday" in str(name):
-            found_bank_holidays = True
-            break
-        row += 1
-    if not found_bank_holidays:
-        errors.append("Could not find bank holidays section in useful dates file")
-    found_summer_term = False
-    row = 5
-    while row < ws.max_row:
-        cell_value = ws[f"F{row}"].value
-        if cell_value and "Summer Term" in str(cell_value):
-            found_summer_term = True
-            break
-        row += 1
-    if not found_summer_term:
-        errors.append("Could not find Summer Term section in useful dates file")
-    return errors
-
-def process_files():
-    """Process uploaded files and return processed data."""
+    Inputs that the screen shows can never be timetabled within the given limits are reported and None is returned.
+    """
     if not all([student_file, module_file, dates_file]):
         st.error("Please upload all required files")
-        return None, None, None
+        return None
     try:
-        student_df = pd.read_excel(student_file, header=None)
-        module_df = pd.read_excel(module_file, sheet_name=1, header=1)
-        dates_wb = load_workbook(dates_file)
-        student_errors = validate_student_list(student_df)
-        if student_errors:
-            st.error("Student list errors:\n" + "\n".join(student_errors))
-            return None, None, None
-        module_errors = validate_module_list(module_df)
-        if module_errors:
-            st.error("Module list errors:\n" + "\n".join(module_errors))
-            return None, None, None
-        dates_errors = validate_useful_dates(dates_wb)
-        if dates_errors:
-            st.error("Useful dates errors:\n" + "\n".join(dates_errors))
-            return None, None, None
-        
-        #Read exams
-        exams = student_df.iloc[0, 9:].dropna().tolist()
-        student_rows = student_df.iloc[2:, :]
-    
-        #Form dictionary of each students exams
-        student_exams = {}
-        for _, row in student_rows.iterrows():
-            cid = row[0]
-            exams_taken = []
-            for col_idx, exam_name in enumerate(exams, start=9):
-                if str(row[col_idx]).strip().lower() in ['x', 'a', 'b']:
-                    exams_taken.append(exam_name)
-            student_exams[cid] = exams_taken
-        for student in student_exams:
-            for exam in student_exams[student]:
-                if exam in Core_modules:
-                    for other_exam in Fixed_modules:
-                        if other_exam in student_exams[student]:
-                            if exam != other_exam and Fixed_modules[exam][0] == Fixed_modules[other_exam][0]:
-                                st.error(f"Core module {exam} conflicts with fixed module {other_exam} on the same day for student {student} so model will be infeasible")
-        return student_df, module_df, dates_wb
+        inputs = parse_uploads(get_input_cache(), student_file.getvalue(), module_file.getvalue(), dates_file.getvalue())
+        for name, errors in inputs["errors"].items():
+            if errors:
+                st.error(f"{name} errors:\n" + "\n".join(errors))
+                return None
+        report = inputs["match_report"]
+        if report["ambiguous"] or report["unmatched"]:
+            st.warning(f"{len(report['ambiguous'])} modules matched ambiguously and {len(report['unmatched'])} could not be matched to an exam. "
+                       f"See Module matching below the timetable, and add the right exam for each module code (\"CODE Name\" where rows share a code) to {ALIAS_FILE}.")
+
+        #Check for infeasible inputs before queueing a solve
+        failures = screen_feasibility(
+            inputs["students"], inputs["leader_courses"], inputs["exam_types"], inputs["days"],
+            no_exam_dates + [[day, slot] for day in inputs["bank_holiday_days"] for slot in (0, 1)],
+            max_exams_2days, max_exams_5days, Fixed_modules, Core_modules, rooms,
+        )
+        if failures:
+            st.error(f"❌ These inputs can never be timetabled ({len(failures)} problems found before solving):")
+            st.dataframe(conflict_table(failures), hide_index=True, width="stretch")
+            return None
+        return inputs
     
     except Exception as e:
         st.error(f"Error processing files: {str(e)}")
-        return None, None, None
+        return None
+
+def load_hint(source, hint_file, days, hint_run=None):
+    """Return the warm start timetable (exam -> (day, slot, rooms)) for the chosen source, or None."""
+    if source == "Last generated timetable":
+        return st.session_state.get("last_timetable")
+    if source == "Saved run" and hint_run is not None:
+        try:
+            return load_timetable(hint_run)
+        except FileNotFoundError:
+            return None
+    if source == "Uploaded timetable" and hint_file is not None:
+        return file_reading(hint_file, days, [0, 1])
+    return None
 
 def to_dict(obj):
     # Recursively convert defaultdicts to dicts
@@ -225,656 +105,6 @@ def to_dict(obj):
     else:
         return obj
 
-def create_timetable(students_df, leaders_df, wb,max_exams_2days, max_exams_5days):
-    # Extract exam names from row 0, starting from column J (index 9)
-    exams = students_df.iloc[0, 9:].dropna().tolist()
-    # Get the range of rows containing student data (from row 3 onward)
-    student_rows = students_df.iloc[2:, :]  # row index 3 and onward
-
-    # Process bank holidays and create no_exam_dates
-    ws = wb.active
-    bank_holidays = []
-    row = 5
-
-    while True:
-        name = ws[f"F{row}"].value
-        date_cell = ws[f"G{row}"].value
-        if name is None or "Term Dates" in str(name):
-            break
-        if isinstance(date_cell, datetime):
-            bank_holidays.append((str(name).strip(), date_cell.date()))
-        row += 1
-
-    # Find Summer Term start date
-    summer_start = None
-    while row < ws.max_row:
-        cell_value = ws[f"F{row}"].value
-        if cell_value and "Summer Term" in str(cell_value):
-            term_range = ws[f"F{row + 1}"].value
-            if term_range:
-                try:
-                    start_part = term_range.split("to")[0].strip()
-                    start_str = re.sub(r"^\w+\s+", "", start_part)
-                    year_match = re.search(r"\b\d{4}\b", term_range)
-                    if year_match:
-                        start_str += f" {year_match.group(0)}"
-                    else:
-                        st.error("Year not found in date range.")
-                        return None
-                    summer_start = parse(start_str, dayfirst=True).date()
-                except Exception as e:
-                    st.error(f"Could not parse Summer Term start: {term_range}")
-                    return None
-            break
-        row += 1
-    if not summer_start:
-        st.error("Summer Term start date not found")
-        return None
-    
-    # Find first Monday
-    first_monday = summer_start
-    while first_monday.weekday() != 0:
-        first_monday += timedelta(days=1)
-    for name, bh_date in bank_holidays:
-        delta = (bh_date - first_monday).days
-        if 0 <= delta <= 20:
-            no_exam_dates.append([delta, 0])
-            no_exam_dates.append([delta, 1])
-
-    #Form dictionary of student_exams
-    student_exams = {}
-    for _, row in student_rows.iterrows():
-        cid = row[0]  # Column A = student CID
-        exams_taken = []
-        for col_idx, exam_name in enumerate(exams, start=9):
-            if str(row[col_idx]).strip().lower() == 'x' or str(row[col_idx]).strip().lower() == 'a'  or str(row[col_idx]).strip().lower() == 'b' :  # Check for 'x' or 'a' or 'b' to indicate they take this course (case-insensitive)
-                exams_taken.append(exam_name)
-        student_exams[cid] = exams_taken
-    student_rows = students_df.iloc[2:, :]  # row index 3 and onward
-    
-    #Get the list of days from useful dates
-    days = []
-    for i in range(21):
-        date = first_monday + timedelta(days=i)
-        day_str = date.strftime("%A ") + ordinal(date.day) + date.strftime(" %B")
-        days.append(day_str)
-    valid_aea_mask = (
-        student_rows.iloc[:, 3].notna() &
-        (student_rows.iloc[:, 3].astype(str).str.strip() != "#N/A")
-    )
-
-    AEA = student_rows.loc[valid_aea_mask, student_rows.columns[0]].tolist()
-    
-    standardized_names = exams
-
-    leader_courses = defaultdict(list)
-    exam_types = dict()
-
-    for _, row in leaders_df.iterrows():
-        leaders = []
-        if pd.notna(row['Module Leader (lecturer 1)']):
-            leaders.append(row['Module Leader (lecturer 1)'])
-        if pd.notna(row['(UGO Internal) 2nd Exam Marker']):
-            leaders.append(row['(UGO Internal) 2nd Exam Marker'])
-        name = row['Module Name']
-        code = row['Banner Code (New CR)']
-        if pd.isna(code) or pd.isna(name) :
-            continue
-        if len(leaders) == 0 :
-            continue
-        combined_name = f"{code} {name}"
-        best_match, score, _ = process.extractOne(
-            combined_name, standardized_names, scorer=fuzz.token_sort_ratio
-        )
-        if score >= 70:
-            exam_types[best_match] = row['(UGO Internal) Exam Style'] if pd.notna(row['(UGO Internal) Exam Style']) else None
-            for leader in leaders:
-                if best_match not in leader_courses[leader]:
-                    leader_courses[leader].append(best_match)
-    leader_courses = dict(leader_courses)
-
-
-    for exam in exams:
-        if exam not in exam_types:
-            exam_types[exam] = "Standard"
-
-
-    exam_counts = defaultdict(lambda: [0, 0])
-    for cid, exams_taken in student_exams.items():
-        if cid in AEA:
-            for exam in exams_taken:
-                exam_counts[exam][0] += 1
-        else:
-            for exam in exams_taken:
-                exam_counts[exam][1] += 1
-
-    exam_counts = dict(exam_counts)
-
-    extra_time_students_25 = students_df[students_df.iloc[:, 3].astype(str).str.startswith(("15min/hour", "25% extra time"))].iloc[:, 0].tolist()
-    extra_time_students_50 = students_df[students_df.iloc[:, 3].astype(str).str.startswith(("30min/hour", "50% extra time"))].iloc[:, 0].tolist()
-    
-    #####----- Start running the model----####
-    model = cp_model.CpModel()
-    slots = [0, 1]
-    num_slots = len(slots)
-    num_days = len(days)
-    exam_day = {}
-    exam_slot = {}
-    for exam in exams:
-        exam_day[exam] = model.NewIntVar(0, num_days - 1, f'{exam}_day')
-        exam_slot[exam] = model.NewIntVar(0, num_slots - 1, f'{exam}_slot')
-    exam_room = {}
-
-    for exam in set().union(*student_exams.values()):
-        for room in rooms:
-            exam_room[(exam, room)] = model.NewBoolVar(f'{exam}_in_{room.replace(" ", "_")}')
-
-#####----Adding constraints ------####
-    # 0. Students can't have exams at the same tiem
-    for student, exs in student_exams.items():
-    #Loops through students
-        for i in range(len(exs)):
-            for j in range(i + 1, len(exs)):
-                exam1 = exs[i]
-                exam2 = exs[j]
-                #Boolean variables for day and slot matches
-                same_day = model.NewBoolVar(f'{exam1}_same_day{exam2}')
-                same_slot = model.NewBoolVar(f'{exam1}_same_slot{exam2}')
-                
-                model.Add(exam_day[exam1] == exam_day[exam2]).OnlyEnforceIf(same_day)
-                model.Add(exam_day[exam1] != exam_day[exam2]).OnlyEnforceIf(same_day.Not())
-
-                model.Add(exam_slot[exam1] == exam_slot[exam2]).OnlyEnforceIf(same_slot)
-                model.Add(exam_slot[exam1] != exam_slot[exam2]).OnlyEnforceIf(same_slot.Not())
-
-                
-
-                model.AddBoolOr([same_day.Not(), same_slot.Not()])
-
-
-    # 1. Core modules can not have multiple exams on that day
-    for student, exs in student_exams.items():
-        core_mods = [exam for exam in exs if exam in Core_modules]
-        other_mods = [exam for exam in exs if exam not in Core_modules]
-        for exam in core_mods:
-            for other in other_mods:
-                model.Add(exam_day[exam] != exam_day[other])
-
-    # 2. Fixed modules day and slot assignment
-    for exam, (day_fixed, slot_fixed) in Fixed_modules.items():
-        model.Add(exam_day[exam] == day_fixed)
-        model.Add(exam_slot[exam] == slot_fixed)
-
-    # 3. Forbidden exam day-slot assignments
-    for exam in exams:
-        for day, slot in no_exam_dates:
-            model.AddForbiddenAssignments([exam_day[exam], exam_slot[exam]], [(day, slot)])
-    # 4. Max 3 exams in any 2-day window per student
-    for student, ex in student_exams.items():
-        for d in range(num_days - 1):
-            exams_in_2_days = []
-            for exam in ex:
-                is_on_d = model.NewBoolVar(f'{student}_{exam}_on_day_{d}')
-                is_on_d1 = model.NewBoolVar(f'{student}_{exam}_on_day_{d+1}')
-                is_on_either = model.NewBoolVar(f'{student}_{exam}_on_day_{d}_or_{d+1}')
-
-                model.Add(exam_day[exam] == d).OnlyEnforceIf(is_on_d)
-                model.Add(exam_day[exam] != d).OnlyEnforceIf(is_on_d.Not())
-
-                model.Add(exam_day[exam] == d + 1).OnlyEnforceIf(is_on_d1)
-                model.Add(exam_day[exam] != d + 1).OnlyEnforceIf(is_on_d1.Not())
-
-                model.AddBoolOr([is_on_d, is_on_d1]).OnlyEnforceIf(is_on_either)
-                model.AddBoolAnd([is_on_d.Not(), is_on_d1.Not()]).OnlyEnforceIf(is_on_either.Not())
-
-                exams_in_2_days.append(is_on_either)
-
-            model.Add(sum(exams_in_2_days) <= max_exams_2days)
-
-    # 5. Max 4 exams in any 5-day sliding window per student
-    for student, exs in student_exams.items():
-        for start_day in range(num_days - 4):
-            exams_in_window = []
-            for exam in exs:
-                in_window = model.NewBoolVar(f'{student}_{exam}_in_day_{start_day}_to_{start_day + 4}')
-
-                model.AddLinearConstraint(exam_day[exam], start_day, start_day + 4).OnlyEnforceIf(in_window)
-
-                before_window = model.NewBoolVar(f'{student}_{exam}_before_{start_day}')
-                after_window = model.NewBoolVar(f'{student}_{exam}_after_{start_day + 4}')
-
-                model.Add(exam_day[exam] < start_day).OnlyEnforceIf(before_window)
-                model.Add(exam_day[exam] >= start_day).OnlyEnforceIf(before_window.Not())
-
-                model.Add(exam_day[exam] > start_day + 4).OnlyEnforceIf(after_window)
-                model.Add(exam_day[exam] <= start_day + 4).OnlyEnforceIf(after_window.Not())
-
-                model.AddBoolOr([before_window, after_window]).OnlyEnforceIf(in_window.Not())
-
-                exams_in_window.append(in_window)
-
-            model.Add(sum(exams_in_window) <= max_exams_5days)
-
-    # 6. At most 1 exam in week 3 (days 13 to 20) per module leader
-    for leader, leader_exams in leader_courses.items():
-        exams_in_week3 = []
-        for exam in leader_exams:
-            in_week3 = model.NewBoolVar(f'{exam}_in_week3')
-
-            model.AddLinearConstraint(exam_day[exam], 13, 20).OnlyEnforceIf(in_week3)
-
-            before_week3 = model.NewBoolVar(f'{exam}_before_week3')
-            after_week3 = model.NewBoolVar(f'{exam}_after_week3')
-
-            model.Add(exam_day[exam] < 13).OnlyEnforceIf(before_week3)
-            model.Add(exam_day[exam] >= 13).OnlyEnforceIf(before_week3.Not())
-
-            model.Add(exam_day[exam] > 20).OnlyEnforceIf(after_week3)
-            model.Add(exam_day[exam] <= 20).OnlyEnforceIf(after_week3.Not())
-
-            model.AddBoolOr([before_week3, after_week3]).OnlyEnforceIf(in_week3.Not())
-
-            exams_in_week3.append(in_week3)
-
-        model.Add(sum(exams_in_week3) <= 1)
-
-    # 7. Extra time 50% students: max 1 exam per day
-    for student in extra_time_students_50:
-        for day in range(num_days):
-            exams_on_day = []
-            for exam in student_exams[student]:
-                is_on_day = model.NewBoolVar(f'{student}_{exam}_on_day_{day}')
-                model.Add(exam_day[exam] == day).OnlyEnforceIf(is_on_day)
-                model.Add(exam_day[exam] != day).OnlyEnforceIf(is_on_day.Not())
-                exams_on_day.append(is_on_day)
-            model.Add(sum(exams_on_day) <= 1)
-
-    #Soft constraint that extra time students with<= 25% should only have one a day
-    extra_time_25_penalties= []
-    for student in extra_time_students_25:
-        for day in range(num_days):
-            exams_on_day = []
-            for exam in student_exams[student]:
-                is_on_day = model.NewBoolVar(f'{student}_{exam}_on_day_{day}')
-                model.Add(exam_day[exam] == day).OnlyEnforceIf(is_on_day)
-                model.Add(exam_day[exam] != day).OnlyEnforceIf(is_on_day.Not())
-                exams_on_day.append(is_on_day)
-            num_exams = model.NewIntVar(0, len(exams_on_day), f'{student}_num_exams_day_{day}')
-            model.Add(num_exams == sum(exams_on_day))
-            has_multiple_exams = model.NewBoolVar(f'{student}_more_than_one_exam_day_{day}')
-            model.Add(num_exams >= 2).OnlyEnforceIf(has_multiple_exams)
-            model.Add(num_exams < 2).OnlyEnforceIf(has_multiple_exams.Not())
-            penalty = model.NewIntVar(0, 1, f'{student}_penalty_day_{day}')
-            model.Add(penalty == 1).OnlyEnforceIf(has_multiple_exams)
-            model.Add(penalty == 0).OnlyEnforceIf(has_multiple_exams.Not())
-            extra_time_25_penalties.append(penalty)
-
-    #Soft constraint that course leaders modules should be spread out
-    spread_penalties =[]
-    for leader in leader_courses:
-        mods = leader_courses[leader]
-        for i in range(len(mods)):
-            for j in range(i+1, len(mods)):
-                m1 = mods[i]
-                m2 = mods[j]
-                diff = model.NewIntVar(-21, 21, f'{m1}_{m2}_diff')
-                abs_diff = model.NewIntVar(0, 21, f'{m1}_{m2}_abs_diff')
-                model.Add(diff == exam_day[m1] - exam_day[m2])
-                model.AddAbsEquality(abs_diff, diff)
-                close_penalty = model.NewIntVar(0, 5, f'{m1}_{m2}_penalty')
-                is_gap_3 = model.NewBoolVar(f'{m1}_{m2}_gap3')
-                is_gap_2 = model.NewBoolVar(f'{m1}_{m2}_gap2')
-                is_gap_1 = model.NewBoolVar(f'{m1}_{m2}_gap1')
-                is_gap_0 = model.NewBoolVar(f'{m1}_{m2}_gap0')
-                model.Add(abs_diff == 3).OnlyEnforceIf(is_gap_3)
-                model.Add(abs_diff != 3).OnlyEnforceIf(is_gap_3.Not())
-                model.Add(abs_diff == 2).OnlyEnforceIf(is_gap_2)
-                model.Add(abs_diff != 2).OnlyEnforceIf(is_gap_2.Not())
-                model.Add(abs_diff == 1).OnlyEnforceIf(is_gap_1)
-                model.Add(abs_diff != 1).OnlyEnforceIf(is_gap_1.Not())
-                model.Add(abs_diff == 0).OnlyEnforceIf(is_gap_0)
-                model.Add(abs_diff != 0).OnlyEnforceIf(is_gap_0.Not())
-                model.Add(close_penalty == 1).OnlyEnforceIf(is_gap_3)
-                model.Add(close_penalty == 3).OnlyEnforceIf(is_gap_2)
-                model.Add(close_penalty == 4).OnlyEnforceIf(is_gap_1)
-                model.Add(close_penalty == 5).OnlyEnforceIf(is_gap_0)
-                model.Add(close_penalty == 0).OnlyEnforceIf(
-                    is_gap_3.Not(), is_gap_2.Not(), is_gap_1.Not(), is_gap_0.Not()
-                )
-                spread_penalties.append(close_penalty)
-
-    #Soft constraint to ensure no exams on some days
-    soft_day_penalties = []
-    for exam in exams:
-        for day, slot in no_exam_dates_soft:
-            is_on_soft_day = model.NewBoolVar(f'{exam}_on_soft_day_{day}_{slot}')
-            day_match = model.NewBoolVar(f'{exam}_day_eq_{day}')
-            slot_match = model.NewBoolVar(f'{exam}_slot_eq_{slot}')
-            model.Add(exam_day[exam] == day).OnlyEnforceIf(day_match)
-            model.Add(exam_day[exam] != day).OnlyEnforceIf(day_match.Not())
-            model.Add(exam_slot[exam] == slot).OnlyEnforceIf(slot_match)
-            model.Add(exam_slot[exam] != slot).OnlyEnforceIf(slot_match.Not())
-            model.AddBoolAnd([day_match, slot_match]).OnlyEnforceIf(is_on_soft_day)
-            model.AddBoolOr([day_match.Not(), slot_match.Not()]).OnlyEnforceIf(is_on_soft_day.Not())
-            penalty = model.NewIntVar(0, 10, f'{exam}_penalty_soft_day_{day}_{slot}')
-            model.Add(penalty == 10).OnlyEnforceIf(is_on_soft_day)
-            model.Add(penalty == 0).OnlyEnforceIf(is_on_soft_day.Not())
-            soft_day_penalties.append(penalty)
-
-    #Minimize the amount of exams per slot 
-    soft_slot_penalties = []
-
-    for day in range(15):  #1 First two weeks only
-        for slot in slots:  
-            exams_in_slot = []
-                
-                    # 2 Make a list of all exams in a slot
-            for exam in exams:
-                is_scheduled_day = model.NewBoolVar(f'{exam}_is_on_day{day}')
-                is_scheduled_slot = model.NewBoolVar(f'{exam}_is_on_slot{slot}')
-
-                model.Add(exam_day[exam] == day).OnlyEnforceIf(is_scheduled_day)
-                model.Add(exam_day[exam] != day).OnlyEnforceIf(is_scheduled_day.Not())
-
-                model.Add(exam_slot[exam] == slot).OnlyEnforceIf(is_scheduled_slot)
-                model.Add(exam_slot[exam] != slot).OnlyEnforceIf(is_scheduled_slot.Not())
-                
-                is_scheduled_here = model.NewBoolVar(f'{exam}_on_day{day}_slot{slot}')
-                model.AddBoolAnd([is_scheduled_day, is_scheduled_slot]).OnlyEnforceIf(is_scheduled_here)
-                model.AddBoolOr([is_scheduled_day.Not(), is_scheduled_slot.Not()]).OnlyEnforceIf(is_scheduled_here.Not())
-                exams_in_slot.append(is_scheduled_here)
-
-            # 3 Count number of exams scheduled in this (day, slot)
-            num_exams_here = model.NewIntVar(0, len(exams), f'count_day{day}_slot{slot}')
-            model.Add(num_exams_here == sum(exams_in_slot))
-
-            # 4 Calculate penalties
-            is_three = model.NewBoolVar(f'is_three_day{day}_slot{slot}')
-            is_four_or_more = model.NewBoolVar(f'is_four_plus_day{day}_slot{slot}')
-
-            model.Add(num_exams_here == 3).OnlyEnforceIf(is_three)
-            model.Add(num_exams_here != 3).OnlyEnforceIf(is_three.Not())
-
-            model.Add(num_exams_here >= 4).OnlyEnforceIf(is_four_or_more)
-            model.Add(num_exams_here < 4).OnlyEnforceIf(is_four_or_more.Not())
-
-            #5 Apply penalties
-            penalty_three = model.NewIntVar(0, 5, f'penalty_three_day{day}_slot{slot}')
-            penalty_four = model.NewIntVar(0, 100, f'penalty_four_day{day}_slot{slot}')
-
-            model.Add(penalty_three == 5).OnlyEnforceIf(is_three)
-            model.Add(penalty_three == 0).OnlyEnforceIf(is_three.Not())
-
-            model.Add(penalty_four == 100).OnlyEnforceIf(is_four_or_more)
-            model.Add(penalty_four == 0).OnlyEnforceIf(is_four_or_more.Not())
-
-            soft_slot_penalties.append(penalty_three)
-            soft_slot_penalties.append(penalty_four)
-
-   ####- room constraints - ####
-    # Ensure each non ME exam is assigned room N/A and ME is not assingned this
-    for exam in exams:
-        if exam in Fixed_modules and exam not in Core_modules:
-            model.Add(exam_room[(exam, 'NON ME N/A')] ==1)  # Assign to N/A room if fixed module
-        else:
-            model.Add(exam_room[(exam, 'NON ME N/A')] == 0)  # Do not assign to N/A room if not fixed module
-
-
-    #Must have sufficient room for each exam 
-    for exam in exams:
-
-        AEA_capacity = sum(
-            rooms[room][1] * exam_room[(exam, room)]
-            for room in rooms if "AEA" in rooms[room][0]
-        )
-        SEQ_capacity = sum(
-            rooms[room][1] * exam_room[(exam, room)]
-            for room in rooms if "SEQ" in rooms[room][0]
-        )
-        AEA_students = exam_counts[exam][0]
-        SEQ_students = exam_counts[exam][1]
-        model.Add(AEA_capacity >= AEA_students)
-        model.Add(SEQ_capacity >= SEQ_students)
-
-    #Ensure only one day and slot assigned to each room
-    for d in range(num_days):
-        for s in range(num_slots):
-            for room in rooms:
-                if room == 'NON ME N/A':
-                    continue  # Skip N/A room for this constraint 
-                else:
-                    exams_in_room_time = []
-                    for exam in exams:
-                        exam_at_day = model.NewBoolVar(f'{exam}_on_day_{d}')
-                        model.Add(exam_day[exam] == d).OnlyEnforceIf(exam_at_day)
-                        model.Add(exam_day[exam] != d).OnlyEnforceIf(exam_at_day.Not())
-
-                        exam_at_slot = model.NewBoolVar(f'{exam}_on_slot_{s}')
-                        model.Add(exam_slot[exam] == s).OnlyEnforceIf(exam_at_slot)
-                        model.Add(exam_slot[exam] != s).OnlyEnforceIf(exam_at_slot.Not())
-
-                        exam_at_time = model.NewBoolVar(f'{exam}_on_{d}_{s}')
-                        model.AddBoolAnd([exam_at_day, exam_at_slot]).OnlyEnforceIf(exam_at_time)
-                        model.AddBoolOr([exam_at_day.Not(), exam_at_slot.Not()]).OnlyEnforceIf(exam_at_time.Not())
-
-                        assigned_and_scheduled = model.NewBoolVar(f'{exam}_in_{room}_at_{d}_{s}')
-                        model.AddBoolAnd([exam_room[(exam, room)], exam_at_time]).OnlyEnforceIf(assigned_and_scheduled)
-                        model.AddBoolOr([exam_room[(exam, room)].Not(), exam_at_time.Not()]).OnlyEnforceIf(assigned_and_scheduled.Not())
-
-                        exams_in_room_time.append(assigned_and_scheduled)
-                    model.AddAtMostOne(exams_in_room_time)
-
-    #Ensure non computer rooms not used for computer exams
-    for exam in exams:
-        if exam_types[exam] == "PC":
-            for room in rooms:
-                uses = rooms[room][0]
-                if "Computer" not in uses:
-                    model.Add(exam_room[(exam, room)] == 0)
-
-    # Minimize amount of rooms used
-    room_surplus = []
-    for exam in exams:
-        model.Add(sum(exam_room[(exam, room)] for room in rooms) >= 1)
-        rooms_len = model.NewIntVar(0, 9, f'rooms for {exam}')
-
-        model.Add(rooms_len == sum(exam_room[(exam, room)]for room in rooms))
-        rooms_penalty = model.NewIntVar(0, 15, f'{exam}_room_surplus_penalty')
-
-        is_room_length_greater_6 = model.NewBoolVar(f'{exam}_has_six_or_more_rooms')
-        is_room_length_5 = model.NewBoolVar(f'{exam}_has_five_rooms')
-        is_room_length_4 = model.NewBoolVar(f'{exam}_has_four_rooms')
-        is_room_length_3 = model.NewBoolVar(f'{exam}_has_three_rooms')
-
-        model.Add(rooms_len >= 6).OnlyEnforceIf(is_room_length_greater_6)
-        model.Add(rooms_len <= 5).OnlyEnforceIf(is_room_length_greater_6.Not())
-        model.Add(rooms_len == 5).OnlyEnforceIf(is_room_length_5)
-        model.Add(rooms_len != 5).OnlyEnforceIf(is_room_length_5.Not())
-        model.Add(rooms_len == 4).OnlyEnforceIf(is_room_length_4)
-        model.Add(rooms_len != 4).OnlyEnforceIf(is_room_length_4.Not())
-        model.Add(rooms_len == 3).OnlyEnforceIf(is_room_length_3)
-        model.Add(rooms_len != 3).OnlyEnforceIf(is_room_length_3.Not())
-
-        model.add(rooms_penalty == 15).OnlyEnforceIf(is_room_length_greater_6)
-        model.Add(rooms_penalty == 9).OnlyEnforceIf(is_room_length_5)
-        model.Add(rooms_penalty == 6).OnlyEnforceIf(is_room_length_4)
-        model.Add(rooms_penalty == 4).OnlyEnforceIf(is_room_length_3)
-        model.Add(rooms_penalty == 0).OnlyEnforceIf(
-                    is_room_length_3.Not(), is_room_length_4.Not(), is_room_length_5.Not(), is_room_length_greater_6.Not(),
-                )
-        room_surplus.append(rooms_penalty)
-    
-
-    #Penalise using pc rooms for non pc exams
-
-    non_pc_exam_penalty = []
-
-    #1 Find computer rooms
-    computer_rooms = [room for room in rooms if "Computer" in rooms[room][0]]
-
-    #2 Loop through exams
-    for exam in exams:
-            #3 if not a PC exams
-        if exam_types[exam] != "PC":
-                #4 Check each computer room
-            for room in computer_rooms:
-                #5 Create a Boolean 
-                penalty_var = model.NewBoolVar(f"non_pc_exam_in_pc_room_{exam}_{room}")
-                
-                #6 Assign penalty 
-                model.Add(exam_room[(exam, room)] == 1).OnlyEnforceIf(penalty_var)
-                model.Add(exam_room[(exam, room)] != 1).OnlyEnforceIf(penalty_var.Not())
-
-                #7 Add penality
-                non_pc_exam_penalty.append(5 * penalty_var)
-            
-    model.Minimize(sum(spread_penalties*spread_penalty + soft_day_penalties*soft_day_penalty+   extra_time_25_penalties*extra_time_penalty+room_surplus*room_penalty+ soft_slot_penalties+ non_pc_exam_penalty))
-   
-    #### ----- Solve the model ----- ###
-    solver = cp_model.CpSolver()
-    solver.parameters.max_time_in_seconds = 120 
-    status = solver.Solve(model)
-    if status == cp_model.FEASIBLE or status == cp_model.OPTIMAL:
-        exams_timetabled = {}
-        for exam in exams:
-            d = solver.Value(exam_day[exam])
-            s = solver.Value(exam_slot[exam])
-            assigned_rooms = [room for room in rooms if solver.Value(exam_room[(exam, room)]) == 1]
-            try:
-                leader = [name for name, exams in leader_courses.items() if exam in exams][0]
-            except IndexError:
-                leader = "unknown"
-            exams_timetabled[exam] = (d, s, assigned_rooms)
-
-        #Save data for nexr page
-        with open("exam_data.pkl", "wb") as f:
-            pickle.dump({
-                "days": days,
-                "slots": [0, 1],
-                "exams": exams,
-                "AEA": AEA,
-                "leader_courses": leader_courses,
-                "extra_time_students_25": extra_time_students_25,
-                "extra_time_students_50": extra_time_students_50,
-                "student_exams": student_exams,
-                "exam_counts": exam_counts,
-                "Fixed_modules": Fixed_modules,
-                "Core_modules": Core_modules,
-                "rooms": rooms,
-                "exam_types": exam_types,
-            }, f)
-
-        total_penalty = sum(solver.Value(v) for v in spread_penalties + soft_day_penalties + room_surplus +extra_time_25_penalties)
-        return exams_timetabled, days, exam_counts, exam_types,total_penalty
-    
-    elif status == cp_model.INFEASIBLE:
-        # print infeasible boolean variables index
-        st.error('Infeasible model. Exam schedule could not be created.')
-    else:
-        st.error("No solution found.")
-
-
-def generate_excel(exams_timetabled, days, exam_counts, exam_types):
-    # data[day][slot] = list of (exam_name, rooms)
-    data = {}
-    for exam, (d, s, room) in exams_timetabled.items():
-        day = days[d]
-        slot = s  # keep slot as int 0 or 1
-        data.setdefault(day, {}).setdefault(slot, []).append((exam, room))
-
-    # ------------ BUILD rows and row_meta ------------
-    rows = []
-    row_meta = []  # will store tuples (day_idx, slot_idx) to track rows for merges and coloring
-
-    for d_idx, day_name in enumerate(days):
-        for s_idx, slot_name in enumerate(['Morning', 'Afternoon']):
-            exams_list = data.get(day_name, {}).get(s_idx, [])
-            if not exams_list:
-                rows.append([day_name, slot_name, '', '', ''])
-                row_meta.append((d_idx, s_idx))
-            else:
-                for exam_name, room in exams_list:
-                    room_str = ', '.join(room)
-                    total_students = f'AEA {exam_counts[exam_name][0]}, Non-AEA {exam_counts[exam_name][1]}'
-                    if exam_types[exam_name] == "PC":
-                        type_str = " (Computer)"
-                    elif exam_types[exam_name] == "Standard":
-                        type_str = " (Standard)"
-                    rows.append([day_name, slot_name, exam_name, total_students, room_str, type_str])
-                    row_meta.append((d_idx, s_idx))
-                rows.append([day_name, slot_name, '', '', ''])
-                row_meta.append((d_idx, s_idx))
-
-    # ------------ SAVE to Excel ------------
-    df = pd.DataFrame(rows, columns=['Date', 'Time', 'Exam', 'Total No of Students', 'Room', 'Type'])
-    filename = f'exam_schedule_merged.xlsx'
-    df.to_excel(filename, index=False)
-
-    # ------------ LOAD workbook and worksheet ------------
-    wb = load_workbook(filename)
-    ws = wb.active
-
-    # ------------ FUNCTION to merge vertical cells ------------
-    def merge_vertical(col, key_fn):
-        start = 2
-        last_key = key_fn(start)
-        for r in range(3, ws.max_row + 2):
-            key = key_fn(r) if r <= ws.max_row else None
-            if key != last_key:
-                if r - start > 1:
-                    ws.merge_cells(start_row=start, start_column=col,
-                                end_row=r-1, end_column=col)
-                start = r
-                last_key = key
-
-    # Merge Time cells: merge vertically for consecutive identical (Date, Time) pairs
-    merge_vertical(2, lambda r: (ws.cell(r,1).value, ws.cell(r,2).value))
-    # Merge Date cells: merge vertically across all rows for that day
-    merge_vertical(1, lambda r: ws.cell(r, 1).value)
-
-    # ------------ DEFINE fills ------------
-    yellow = PatternFill('solid', fgColor='FFFF54')  # bright yellow for Fixed modules
-    red = PatternFill('solid', fgColor='EA3323')     # red-orange for Core modules
-    blue = PatternFill('solid', fgColor='E0EAF6')    # light blue for alternating rows
-    green = PatternFill('solid', fgColor='CBE9B8')   # light green for alternating rows
-
-    # ------------ APPLY alternating row fills BY DAY ------------
-    for excel_row, (d_idx, s_idx) in enumerate(row_meta, start=2):  # Excel rows start at 2 (after header)
-        fill = blue if d_idx % 2 == 0 else green
-        for col in range(1, 7):  # columns A(1) to E(5)
-            ws.cell(row=excel_row, column=col).fill = fill
-
-    # ------------ APPLY fixed/core exam coloring (overwrites cols 3-5) ------------
-    for r in range(2, ws.max_row + 1):
-        exam_name = ws.cell(r, 3).value
-        fill = None
-        if exam_name:
-            if any(exam_name.startswith(fm) for fm in Fixed_modules):
-                fill = yellow
-            if any(exam_name.startswith(cm) for cm in Core_modules):
-                fill = red
-        if fill:
-            for c in (3, 4, 5,6):  # Exam, Total No Students, Room columns
-                ws.cell(r, c).fill = fill
-    #Centre text
-    for row in range(2, ws.max_row + 1):
-        for col in [1, 2]:
-            cell = ws.cell(row=row, column=col)
-            cell.alignment = Alignment(vertical='center')
-    for col in ws.columns:
-        max_length = 0
-        col_letter = col[0].column_letter  # Get the column letter (like 'A')
-        for cell in col:
-            try:
-                cell_length = len(str(cell.value))
-                if cell_length > max_length:
-                    max_length = cell_length
-            except:
-                pass
-        ws.column_dimensions[col_letter].width = max_length + 2
-    wb.save(filename)
-    st.write(f"Excel file '{filename}' created with merged cells, colors, and full schedule.")
-
 #Rotating filling animation
 def animation_html():
     return """
@@ -1093,70 +323,452 @@ with col3:
 st.header("Timetabling Parameters")
 st.markdown(""" Adjust the parameters below to customize the exam scheduling process. These parameters will influence how the exams are distributed across the available days and slots.
             The sliders on the right represent the weighting of the soft constraints, which can be adjusted to prioritize certain aspects of the timetable generation process.""")
+
+# A run configuration saved from an earlier generation prefills every parameter below
+config_file = st.file_uploader("Load Run Configuration (optional)", type=['json'])
+run_config = json.load(config_file) if config_file else {}
+saved_solver_settings = default_solver_settings()
+saved_solver_settings.update(run_config.get("solver", {}))
+
 col1, col2 = st.columns(2)
 
 with col1:
     num_days = st.number_input("Number of Days for Exam Period", min_value=1, max_value=30, value=21) -1 # Subtract 1 to match the 0-indexed days in the code
-    max_exams_2days = st.number_input("Maximum Exams in 2-Day Window", min_value=1, max_value=5, value=3)
-    max_exams_5days = st.number_input("Maximum Exams in 5-Day Window", min_value=1, max_value=10, value=4)
+    max_exams_2days = st.number_input("Maximum Exams in 2-Day Window", min_value=1, max_value=5, value=run_config.get("max_exams_2days", 3))
+    max_exams_5days = st.number_input("Maximum Exams in 5-Day Window", min_value=1, max_value=10, value=run_config.get("max_exams_5days", 4))
 
 with col2:
-    spread_penalty = st.slider("Module leaders exams spread out Penalty Weight", min_value=0, max_value=10, value=5)
-    room_penalty = st.slider("More than 2 rooms per exam Penalty Weight", min_value=0, max_value=10, value=5)
-    extra_time_penalty = st.slider(r"25% Extra Time Students having more than one exam a day Penalty Weight", min_value=0, max_value=10, value=5)
-    soft_day_penalty = st.slider("Soft constraint for no exams on certain days (Week 3 Tuesday and Wednesdnay Morning) Penalty Weight", min_value=0, max_value=10, value=5)
+    spread_penalty = st.slider("Module leaders exams spread out Penalty Weight", min_value=0, max_value=10, value=run_config.get("spread_penalty", 5))
+    room_penalty = st.slider("More than 2 rooms per exam Penalty Weight", min_value=0, max_value=10, value=run_config.get("room_penalty", 5))
+    extra_time_penalty = st.slider(r"25% Extra Time Students having more than one exam a day Penalty Weight", min_value=0, max_value=10, value=run_config.get("extra_time_penalty", 5))
+    soft_day_penalty = st.slider("Soft constraint for no exams on certain days (Week 3 Tuesday and Wednesdnay Morning) Penalty Weight", min_value=0, max_value=10, value=run_config.get("soft_day_penalty", 5))
+
+with st.expander("Solver Settings"):
+    st.markdown("""Search parameters for the CP-SAT solver. A relative gap limit above 0 stops the search early once the timetable is provably within that fraction of the best possible penalty, which is useful for quick drafts.""")
+    col1, col2 = st.columns(2)
+    with col1:
+        num_workers = st.number_input("Parallel Search Workers", min_value=1, max_value=max(64, os.cpu_count() or 8), value=int(saved_solver_settings["num_workers"]))
+        max_time_in_seconds = st.number_input("Time Limit (seconds)", min_value=1, max_value=3600, value=int(saved_solver_settings["max_time_in_seconds"]))
+        relative_gap_limit = st.number_input("Relative Gap Limit", min_value=0.0, max_value=1.0, step=0.01, value=float(saved_solver_settings["relative_gap_limit"]))
+    with col2:
+        random_seed = st.number_input("Random Seed", min_value=0, value=int(saved_solver_settings["random_seed"]))
+        linearization_level = st.selectbox("Linearization Level", [0, 1, 2], index=int(saved_solver_settings["linearization_level"]))
+        log_search_progress = st.checkbox("Log Search Progress", value=bool(saved_solver_settings["log_search_progress"]))
+        diagnose_unknown = st.checkbox("Diagnose When Time Runs Out", value=bool(run_config.get("diagnose_unknown", False)),
+                                       help="Infeasible models are always diagnosed. This also looks for conflicting rules when the "
+                                            f"time limit passes with no timetable found, taking up to {DIAGNOSIS_TIME} seconds more.")
+    room_modes = {"Single model": "monolithic", "Two-phase (exam times, then rooms per slot)": "decomposed"}
+    room_mode = room_modes[st.selectbox(
+        "Room Allocation", list(room_modes),
+        index=list(room_modes.values()).index(run_config.get("room_mode", "monolithic")),
+        help="Two-phase mode schedules exams against the total seats per slot, then assigns rooms slot by slot. It falls back to the single model if a slot cannot be roomed."
+    )]
+    formulations = {"Day and slot literals": "one-hot", "Timeslot variables with AllDifferent clashes": "timeslot"}
+    formulation = formulations[st.selectbox(
+        "Formulation", list(formulations),
+        index=list(formulations.values()).index(run_config.get("formulation", "one-hot")),
+        help="The timeslot formulation gives each exam one variable over the usable day and slot pairs and posts each student's clashes as a single AllDifferent, which propagates more strongly than pairwise clashes."
+    )]
+    saved_stages = run_config.get("stages") or []
+    staged = st.selectbox(
+        "Objective", ["Weighted sum of penalties", "Staged (one penalty at a time, in priority order)"], index=int(bool(saved_stages)),
+        help="Staged mode finds any timetable, then minimises each penalty in the priority order below and fixes its value (plus the tolerance) before moving to the next. The weights are not used."
+    ).startswith("Staged")
+    stages = None
+    if staged:
+        stage_order = st.multiselect("Priority Order", STAGE_ORDER, default=[stage["family"] for stage in saved_stages] or STAGE_ORDER,
+                                     help="Penalties are minimised in the order selected; leave one out to not optimise it")
+        col1, col2 = st.columns(2)
+        stage_time = col1.number_input("Time Limit per Stage (seconds)", min_value=1, max_value=3600,
+                                       value=int(saved_stages[0]["time_limit"]) if saved_stages else 30)
+        stage_tolerance = col2.number_input("Tolerance per Stage", min_value=0, max_value=100,
+                                            value=int(saved_stages[0]["tolerance"]) if saved_stages else 0,
+                                            help="How far later stages may worsen an earlier stage's penalty")
+        stages = stage_plan(stage_order, stage_time, stage_tolerance)
+
+with st.expander("Warm Start"):
+    st.markdown("""Seed the solver with a previous timetable, including its rooms, so that re-solving after a small change finds a good timetable quickly.""")
+    hint_source = st.radio("Start From", ["None", "Last generated timetable", "Saved run", "Uploaded timetable"], horizontal=True)
+    hint_file = st.file_uploader("Upload Previous Timetable", type=['xlsx']) if hint_source == "Uploaded timetable" else None
+    hint_run = None
+    if hint_source == "Saved run":
+        hint_run = st.selectbox("Run", [meta["run_id"] for meta in list_runs()], index=None, placeholder="Choose a stored run")
+
+with st.expander("Alternative Timetables"):
+    st.markdown("""Find several good timetables instead of one. Each alternative must move at least the given number of exams compared with every timetable found before it.""")
+    if staged:
+        st.caption("Alternatives are only searched with the weighted sum objective, so the staged objective finds one timetable.")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        num_solutions = st.number_input("Timetables", min_value=1, max_value=10, value=int(run_config.get("num_solutions", 1)), disabled=staged)
+    with col2:
+        min_distance = st.number_input("Minimum Exams Moved", min_value=1, max_value=100, value=int(run_config.get("min_distance", 5)))
+    with col3:
+        alternative_time = st.number_input("Time Limit per Alternative (seconds)", min_value=1, max_value=3600, value=int(run_config.get("alternative_time", 30)))
+
+with st.expander("Weight Sweep"):
+    st.markdown("""Solve every combination of the values below instead of tuning the sliders by hand. Each combination is solved with the time limit above, several at once, and the settings whose penalties no other setting beats on every family are shown as the Pareto front.""")
+    # Label and current value of each setting that can be swept
+    sweep_fields = {
+        "spread_penalty": ("Spread Weights", spread_penalty),
+        "room_penalty": ("Room Weights", room_penalty),
+        "extra_time_penalty": ("Extra Time Weights", extra_time_penalty),
+        "soft_day_penalty": ("Soft Day Weights", soft_day_penalty),
+        "max_exams_2days": ("Max Exams in 2 Days", max_exams_2days),
+        "max_exams_5days": ("Max Exams in 5 Days", max_exams_5days),
+    }
+    sweep_text = {}
+    columns = st.columns(3)
+    for i, (name, (label, value)) in enumerate(sweep_fields.items()):
+        with columns[i % 3]:
+            sweep_text[name] = st.text_input(label, value=str(value), help="Comma-separated values, e.g. 1, 5, 10")
+    sweep_parallel = st.number_input("Solves at Once", min_value=1, max_value=32, value=2,
+                                     help="Solves run in parallel, sharing this job's share of the server's cores")
+    run_sweep_clicked = st.button("Run Sweep")
+
+solver_settings = {
+    "num_workers": num_workers,
+    "max_time_in_seconds": max_time_in_seconds,
+    "relative_gap_limit": relative_gap_limit,
+    "random_seed": random_seed,
+    "linearization_level": linearization_level,
+    "log_search_progress": log_search_progress,
+}
+weights = {
+    "spread_penalty": spread_penalty,
+    "room_penalty": room_penalty,
+    "extra_time_penalty": extra_time_penalty,
+    "soft_day_penalty": soft_day_penalty,
+}
+run_config = {
+    "max_exams_2days": max_exams_2days,
+    "max_exams_5days": max_exams_5days,
+    "spread_penalty": spread_penalty,
+    "room_penalty": room_penalty,
+    "extra_time_penalty": extra_time_penalty,
+    "soft_day_penalty": soft_day_penalty,
+    "room_mode": room_mode,
+    "formulation": formulation,
+    "num_solutions": num_solutions,
+    "min_distance": min_distance,
+    "alternative_time": alternative_time,
+    "stages": stages,
+    "diagnose_unknown": diagnose_unknown,
+    "solver": solver_settings,
+}
+
+def generate(job):
+    """Run the solver for a queued job, leaving the result on the job."""
+    config = job["run_config"]
+    inputs = job["inputs"]
+    try:
+        timetable, days, exam_counts, exam_types, penalties, stats = create_timetable(
+            inputs["students"], None, None, config["max_exams_2days"], config["max_exams_5days"], job["solver_settings"], job["hint"],
+            config["room_mode"], job["weights"], progress=job["progress"], stop_event=job["stop"],
+            num_solutions=config["num_solutions"], min_distance=config["min_distance"], alternative_time=config["alternative_time"],
+            calendar=(inputs["days"], inputs["bank_holiday_days"]), module_match=(inputs["leader_courses"], inputs["exam_types"]),
+            stages=config["stages"], formulation=config["formulation"], diagnose_unknown=config["diagnose_unknown"],
+            screen=False,  # process_files screened these inputs with the same limits before queueing the job
+        )
+    except TimetablingError as e:
+        #Keep the diagnosed rule conflicts to show as a table
+        job["conflicts"] = e.conflicts
+        raise
+    #Store the run for the checking page and later warm starts
+    stats["run_id"] = save_run(stats["run_data"])
+    #Export the timetable and its alternatives in memory, as (table to display, workbook bytes to download)
+    job["exports"] = [export_timetable(timetable, days, exam_counts, exam_types)]
+    job["exports"] += [export_timetable(alternative["timetable"], days, exam_counts, exam_types) for alternative in stats["alternatives"]]
+    job["result"] = (timetable, days, penalties, stats)
+
+def sweep(job):
+    """Run a weight sweep for a queued job, using the job's share of cores for all of its solves."""
+    inputs = job["inputs"]
+    job["result"] = run_sweep(
+        inputs["students"], (inputs["days"], inputs["bank_holiday_days"]), (inputs["leader_courses"], inputs["exam_types"]),
+        job["grid"], job["solver_settings"], job["num_workers"], job["max_parallel"], job["run_config"]["room_mode"],
+        progress=job["rows"].append, formulation=job["run_config"]["formulation"],
+    )
+
+def parse_sweep_values(text):
+    """Turn "1, 5, 10" into [1, 5, 10]."""
+    return [int(value) for value in text.replace(" ", "").split(",") if value]
+
+def drain_progress(job):
+    """Move incumbents from the solver's queue into the job's history."""
+    while not job["progress"].empty():
+        job["history"].append(job["progress"].get())
+
+def show_progress(job):
+    """Show the best timetable found so far and how the objective and bound have moved."""
+    if not job["history"]:
+        st.write("Searching for a first timetable...")
+        return
+    latest = job["history"][-1]
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Best Objective", f"{latest['objective']:.0f}")
+    col2.metric("Best Bound", f"{latest['best_bound']:.0f}")
+    col3.metric("Gap", f"{latest['gap']:.1%}")
+    col4.metric("Solutions", latest["solutions"], help=f"{latest['elapsed']:.1f}s into the search")
+    if latest.get("stage"):
+        st.caption(f"Staged solve: minimising {latest['stage']}")
+    st.line_chart(pd.DataFrame(
+        [(row["elapsed"], row["objective"], row["best_bound"]) for row in job["history"]],
+        columns=["Elapsed (s)", "Objective", "Best Bound"],
+    ).set_index("Elapsed (s)"))
+    st.dataframe(pd.DataFrame(
+        [(job["days"][d], ["Morning", "Afternoon"][s], exam) for d, s, exam in sorted((d, s, exam) for exam, (d, s) in latest["timetable"].items())],
+        columns=["Date", "Time", "Exam"],
+    ), hide_index=True)
 
 # Add a generate button
 if st.button("Generate Timetable"):
-    students_df, leaders_df, wb = process_files()
+    inputs = process_files(max_exams_2days, max_exams_5days)
     if not all([student_file, module_file, dates_file]):
         st.error("Please upload all required files first.")
-    else:
+    elif inputs is not None:
         try:
-            animation_placeholder = st.empty()
-            result_container = st.empty()
-            processing_done = False
-            error_msg = None
-
-            def generate():
-                global processing_done, error_msg, students_df, leaders_df, penalties
-                try:
-                    timetable, days, exam_counts, exam_types, penalties = create_timetable(
-                        students_df, leaders_df, wb, max_exams_2days, max_exams_5days,
-                    )
-                    generate_excel(timetable, days, exam_counts, exam_types)
-
-
-                except Exception as e:
-                    error_msg = str(e)
-                finally:
-                    processing_done = True
-            thread = threading.Thread(target=generate)
-            thread.start()
-
-            while not processing_done:
-                with animation_placeholder:
-                    components.html(animation_html(), height=350)
-                time.sleep(2.1)
-
-            animation_placeholder.empty()
-
-            if error_msg:
-                st.error(f"An error occurred: {error_msg}")
-                logger.error(f"Error generating timetable: {error_msg}", exc_info=True)
-            else:
-                st.success("✅ Timetable generated successfully!")
-                st.write(f"Total Penalty: {penalties}")
-                with open("exam_schedule_merged.xlsx", "rb") as file:
-                    st.download_button(
-                        label="Download Timetable",
-                        data=file,
-                        file_name="exam_schedule.xlsx",
-                        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
-                    )
-                st.header("Generated Timetable")
-                df = pd.read_excel("exam_schedule_merged.xlsx")
-                st.dataframe(df)
+            hint = load_hint(hint_source, hint_file, inputs["days"], hint_run)
+            if hint_source != "None" and not hint:
+                st.warning("No previous timetable found to warm start from, starting from scratch.")
+            # The job lives in the session so the progress and stop button survive reruns of this script,
+            # and its settings are copied so the queue can give it its share of the solver cores
+            job = {
+                "progress": queue.Queue(),
+                "stop": threading.Event(),
+                "history": [],
+                "days": inputs["days"],
+                "inputs": inputs,
+                "hint": hint,
+                "run_config": run_config,
+                "solver_settings": dict(solver_settings),
+                "weights": dict(weights),
+                "expected_duration": expected_duration(solver_settings, num_solutions, alternative_time),
+                "match_report": inputs["match_report"],
+                "result": None,
+                "error": None,
+                "conflicts": [],
+            }
+            st.session_state["job"] = get_job_queue().submit(job, generate)
+        except TimetablingError as e:
+            st.error(str(e))
         except Exception as e:
             st.error(f"Unexpected error: {str(e)}")
 
+job = st.session_state.get("job")
+if job is not None and job["state"] == QUEUED:
+    job_queue = get_job_queue()
+    if st.button("Cancel"):
+        job_queue.cancel(job)
+        st.rerun()
+    queue_placeholder = st.empty()
+    while job["state"] == QUEUED:
+        status = job_queue.status()
+        queue_placeholder.info(
+            f"⏳ Waiting for a free solver: position {job_queue.position(job)} in the queue, starting in about {job_queue.eta(job):.0f}s. "
+            f"{status['running']} of {status['max_running']} solves are running."
+        )
+        time.sleep(1)
+    st.rerun()
+
+if job is not None and job["state"] == RUNNING:
+    if st.button("Stop and keep best timetable", disabled=job["stop"].is_set()):
+        job["stop"].set()
+    st.caption(f"Solving with {job['num_workers']} workers, queued for {job['started'] - job['submitted']:.0f}s")
+    components.html(animation_html(), height=350)
+    elapsed_placeholder = st.empty()
+    progress_placeholder = st.empty()
+    # Redraw the progress only when a new incumbent arrives, but write the elapsed time every pass: Streamlit only
+    # notices a Stop click (and reruns to handle it) when the script calls st.*
+    shown = -1
+    while job["state"] == RUNNING:
+        elapsed_placeholder.caption(f"Searching for {time.time() - job['started']:.0f}s")
+        drain_progress(job)
+        if len(job["history"]) != shown:
+            shown = len(job["history"])
+            with progress_placeholder.container():
+                show_progress(job)
+        time.sleep(0.5)
+    st.rerun()
+
+if job is not None:
+    drain_progress(job)
+    if job["state"] == CANCELLED:
+        st.info("Generation was cancelled before it started.")
+    elif job["conflicts"]:
+        st.error("❌ Infeasible model. These rules cannot all be met at once:")
+        st.dataframe(conflict_table(job["conflicts"]), hide_index=True, width="stretch")
+    elif job["error"]:
+        st.error(f"An error occurred: {job['error']}")
+    elif job["result"]:
+        timetable, days, penalties, stats = job["result"]
+        st.session_state["last_timetable"] = timetable
+        st.session_state["last_run_id"] = stats["run_id"]
+        if stats["stopped_early"]:
+            st.success(f"✅ Search stopped early with the best timetable found so far ({len(job['history'])} solutions).")
+        else:
+            st.success("✅ Timetable generated successfully!")
+        st.write(f"Total Penalty: {penalties}")
+        st.write(f"{stats['students']} students compressed to {stats['profiles']} enrollment profiles")
+        schedule_df, schedule_xlsx = job["exports"][0]
+        st.download_button(
+            label="Download Timetable",
+            data=schedule_xlsx,
+            file_name="exam_schedule.xlsx",
+            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+        )
+        st.download_button(
+            label="Download Run Configuration",
+            data=json.dumps(job["run_config"], indent=2),
+            file_name="run_config.json",
+            mime="application/json"
+        )
+        st.header("Generated Timetable")
+        st.dataframe(schedule_df)
+
+        if job["history"]:
+            with st.expander(f"Search progress ({len(job['history'])} improving solutions)"):
+                st.line_chart(pd.DataFrame(
+                    [(row["elapsed"], row["objective"], row["best_bound"]) for row in job["history"]],
+                    columns=["Elapsed (s)", "Objective", "Best Bound"],
+                ).set_index("Elapsed (s)"))
+
+        if stats.get("stages"):
+            with st.expander(f"Staged solve ({len(stats['stages']) - 1} stages)"):
+                st.dataframe(pd.DataFrame(stats["stages"]).rename(columns={
+                    "family": "Stage", "status": "Status", "value": "Penalty", "bound": "Bound", "time": "Time (s)"}).round(2), hide_index=True)
+
+        if stats["alternatives"]:
+            with st.expander(f"Alternative timetables ({len(stats['alternatives'])} found)", expanded=True):
+                solutions = [{"timetable": timetable, "penalty": penalties, "penalty_breakdown": stats["penalty_breakdown"], "distance": None}]
+                solutions += stats["alternatives"]
+                st.dataframe(pd.DataFrame([
+                    {"Timetable": "Best" if i == 0 else f"Alternative {i}", "Total Penalty": solution["penalty"],
+                     "Exams Moved": solution["distance"],
+                     **{family.replace("_", " ").title(): value for family, value in solution["penalty_breakdown"].items()}}
+                    for i, solution in enumerate(solutions)
+                ]), hide_index=True)
+                columns = st.columns(len(stats["alternatives"]))
+                for i, column in enumerate(columns, start=1):
+                    with column:
+                        st.download_button(
+                            label=f"Download Alternative {i}",
+                            data=job["exports"][i][1],
+                            file_name=f"exam_schedule_alternative_{i}.xlsx",
+                            mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"
+                        )
+
+        report = job["match_report"]
+        with st.expander(f"Module matching ({len(report['matches'])} matched, {len(report['ambiguous'])} ambiguous, {len(report['unmatched'])} unmatched)"):
+            st.dataframe(pd.DataFrame(
+                [(match["module"], match["exam"], match["score"], match["source"]) for match in report["matches"]],
+                columns=["Module", "Exam", "Score", "Matched By"]), hide_index=True)
+            if report["new_aliases"] and st.button(f"Save {len(report['new_aliases'])} Fuzzy Matches",
+                                                   help=f"Remember the clear fuzzy matches in {ALIAS_FILE}, so later runs match these module codes directly"):
+                st.success(f"Saved {save_matches(report)} new module matches")
+            if report["ambiguous"]:
+                st.subheader("Ambiguous")
+                st.dataframe(pd.DataFrame(
+                    [(match["module"], match["exam"], match["score"], ", ".join(match["other_candidates"])) for match in report["ambiguous"]],
+                    columns=["Module", "Chosen Exam", "Score", "Other Close Exams"]), hide_index=True)
+            if report["unmatched"]:
+                st.subheader("Unmatched")
+                st.dataframe(pd.DataFrame(
+                    [(match["module"], match["closest_exam"], match["score"]) for match in report["unmatched"]],
+                    columns=["Module", "Closest Exam", "Score"]), hide_index=True)
+            if report["exams_without_module"]:
+                st.subheader("Exams with no module (timetabled as Standard with no leader)")
+                st.dataframe(pd.DataFrame(report["exams_without_module"], columns=["Exam"]), hide_index=True)
+
+        conflict_graph = stats["conflict_graph"]
+        with st.expander(f"Exam conflicts ({len(conflict_graph)} exam pairs share students)"):
+            st.subheader("Densest conflicts")
+            st.dataframe(pd.DataFrame(densest_conflicts(conflict_graph), columns=['Exam', 'Other Exam', 'Shared Students']))
+            st.subheader("Conflicts per exam")
+            degrees = conflict_degrees(conflict_graph)
+            st.dataframe(pd.DataFrame(sorted(degrees.items(), key=lambda item: item[1], reverse=True), columns=['Exam', 'Clashing Exams']))
+
+        with st.expander(f"Model size ({stats['num_variables']} variables, {stats['num_constraints']} constraints, {stats['proto_bytes'] / 1e6:.2f} MB)"):
+            st.subheader("By constraint family")
+            family_df = pd.DataFrame(stats["family_stats"]).rename(columns={
+                "family": "Constraint Family", "variables": "Variables", "constraints": "Constraints", "build_time": "Build Time (s)"})
+            st.dataframe(family_df.sort_values("Constraints", ascending=False).round(3), hide_index=True)
+            st.write(f"Model built in {stats['build_time']:.2f}s and solved in {stats['solve_time']:.2f}s ({stats['status']})")
+            st.subheader("Solver statistics")
+            st.dataframe(pd.DataFrame(stats["solver_stats"].items(), columns=["Statistic", "Value"]), hide_index=True)
+
+        if "room_allocations" in stats:
+            with st.expander(f"Room allocation ({len(stats['room_allocations'])} slots solved in parallel)"):
+                st.dataframe(pd.DataFrame([
+                    [days[d], ['Morning', 'Afternoon'][s], len(allocation["rooms"]), allocation["status"], allocation["optimal"],
+                     allocation["room_surplus"], allocation["non_pc_penalty"], round(allocation["solve_time"], 3)]
+                    for (d, s), allocation in stats["room_allocations"].items()
+                ], columns=['Date', 'Time', 'Exams', 'Status', 'Proven Optimal', 'Room Surplus Penalty', 'PC Room Penalty', 'Solve Time (s)']))
+
+# Weight sweep, run through the same job queue as single timetables
+if run_sweep_clicked:
+    try:
+        grid = sweep_grid({name: parse_sweep_values(text) for name, text in sweep_text.items()})
+        # Screen with the loosest limits swept, so only inputs that fail every setting are stopped here
+        inputs = process_files(max(setting["max_exams_2days"] for setting in grid), max(setting["max_exams_5days"] for setting in grid))
+    except ValueError:
+        st.error("Sweep values must be whole numbers separated by commas.")
+        inputs = None
+    if inputs is not None:
+        job_queue = get_job_queue()
+        parallel = min(len(grid), sweep_parallel, job_queue.workers_per_job)
+        st.session_state["sweep_job"] = job_queue.submit({
+            "stop": threading.Event(),
+            "inputs": inputs,
+            "grid": grid,
+            "max_parallel": sweep_parallel,
+            "rows": [],
+            "run_config": run_config,
+            "solver_settings": dict(solver_settings),
+            "expected_duration": max_time_in_seconds * -(-len(grid) // parallel),
+            "result": None,
+            "error": None,
+        }, sweep)
+
+sweep_job = st.session_state.get("sweep_job")
+if sweep_job is not None:
+    st.header("Weight Sweep")
+    if sweep_job["state"] == QUEUED:
+        job_queue = get_job_queue()
+        sweep_placeholder = st.empty()
+        while sweep_job["state"] == QUEUED:
+            sweep_placeholder.info(f"⏳ Sweep waiting for a free solver: position {job_queue.position(sweep_job)} in the queue, "
+                                   f"starting in about {job_queue.eta(sweep_job):.0f}s.")
+            time.sleep(1)
+        st.rerun()
+    if sweep_job["state"] == RUNNING:
+        sweep_placeholder = st.empty()
+        while sweep_job["state"] == RUNNING:
+            sweep_placeholder.progress(len(sweep_job["rows"]) / len(sweep_job["grid"]),
+                                       text=f"{len(sweep_job['rows'])} of {len(sweep_job['grid'])} settings solved "
+                                            f"using {sweep_job['num_workers']} cores")
+            time.sleep(1)
+        st.rerun()
+    if sweep_job["state"] == CANCELLED:
+        st.info("The sweep was cancelled before it started.")
+    elif sweep_job["error"]:
+        st.error(f"An error occurred during the sweep: {sweep_job['error']}")
+    elif sweep_job["result"] is not None:
+        sweep_df = sweep_job["result"]
+        front = sweep_df[sweep_df["pareto"]].drop(columns=["pareto"])
+        st.write(f"{(sweep_df['status'].isin(['OPTIMAL', 'FEASIBLE'])).sum()} of {len(sweep_df)} settings solved in "
+                 f"{sweep_job['finished'] - sweep_job['started']:.0f}s; {len(front)} are on the Pareto front.")
+        st.subheader("Pareto front")
+        st.dataframe(front, hide_index=True)
+        col1, col2 = st.columns(2)
+        x_family = col1.selectbox("Horizontal axis", PARETO_FAMILIES, index=0)
+        y_family = col2.selectbox("Vertical axis", PARETO_FAMILIES, index=2)
+        st.scatter_chart(sweep_df.dropna(subset=[x_family, y_family]), x=x_family, y=y_family, color="pareto")
+        with st.expander(f"All {len(sweep_df)} settings"):
+            st.dataframe(sweep_df, hide_index=True)
+        st.download_button(
+            label="Download Sweep Results",
+            data=sweep_df.to_csv(index=False),
+            file_name="weight_sweep.csv",
+            mime="text/csv"
+        )
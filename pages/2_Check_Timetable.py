@@ -2,294 +2,125 @@
 import streamlit as st
 import pandas as pd
 from openpyxl import load_workbook
-from collections import defaultdict
-import pickle
+import io
+from timetable_io import file_reading
+from timetable_model import TimetablingError
+from run_store import list_runs, load_check_inputs
+from timetable_checker import HARD, SOFT, WARNING, check_timetable, violation_report, summarise_violations
 
 #Main Streamlit UI for this page
 st.set_page_config(page_title="Check Timetable", layout="wide")
 st.title("Check Your Exam Timetable")
 st.markdown("""This page allows you to check your exam timetable for constraint violations as long as the timetable is formatted like the output of the generator.""")
 
-#Import data from the generate page in pickle file
-try:
-    with open("exam_data.pkl", "rb") as f:
-        data = pickle.load(f)
-
-    # Unpack all variables
-    days = data["days"]
-    slots = data["slots"]
-    exams = data["exams"]
-    AEA = data["AEA"]
-    leader_courses = data["leader_courses"]
-    extra_time_students_25 = data["extra_time_students_25"]
-    extra_time_students_50 = data["extra_time_students_50"]
-    student_exams = data["student_exams"]
-    exam_counts = data["exam_counts"]
-    Fixed_modules = data["Fixed_modules"]
-    Core_modules = data["Core_modules"]
-    rooms = data["rooms"]
-    exam_types = data["exam_types"]
-
-#Raise errors
-except FileNotFoundError:
-    st.warning("Timetable file not found. Please generate a timetable first.")
-except KeyError as e:
-    st.error(f"Missing key in saved data: {e}")
-except Exception as e:
-    st.error(f"Failed to load timetable data: {e}")
-
-def file_reading(filepath, days, slots):
-    #Read the uploaded file into a dataframe
-    df = pd.read_excel(filepath)
-    exams_timetabled = {}
-    #Build a dictionary of exams with their day, slot and room from excel timetable
-    for _, row in df.iterrows():
-        exam_name = row['Exam']
-
-
-        day_name = day_name if pd.isna(row['Date']) else row['Date']
-        slot_name = slot_name if pd.isna(row['Time']) else (0 if row['Time'] == "Morning" else 1)
-        if pd.isna(exam_name) or exam_name == '':
-            continue  # Skip empty rows
-        room = row['Room'].split(', ') if pd.notna(row['Room']) and row['Room'] else []
-
-        try:
-            d = days.index(day_name)
-            s = slots.index(slot_name)
-        except ValueError:
-            raise ValueError(f"Unrecognized day or slot in file: {day_name} / {slot_name}")
-
-        exams_timetabled[exam_name] = (d, s, room)
-
-    return exams_timetabled
-
-def file_checking(exams_timetabled, Fixed_modules, Core_modules, student_exams, leader_courses, extra_time_students_50, exams, AEA,exam_counts):
-    def get_full_schedule(exams_timetabled, Fixed_modules):
-        full_schedule = Fixed_modules.copy()
-        full_schedule.update(exams_timetabled)
-        return full_schedule
-    
-    def check_exam_constraints(student_exams, exams_timetabled, Fixed_modules, Core_modules, module_leaders, extra_time_students_50, exams,AEA,):
-        violations = []
-        schedule = get_full_schedule(exams_timetabled, Fixed_modules)
-        for exam in exams:
-            if exam not in schedule:
-                violations.append(f"❌ Exam '{exam}' is not scheduled in the timetable.")
-
-        # 0. Students can't have two exams at the same time
-        for student, exs in student_exams.items():
-            for i in range(len(exs)):
-                for j in range(i + 1, len(exs)):
-                    exam1 = exs[i]
-                    exam2 = exs[j]
-                    if exams_timetabled[exam1][0] == exams_timetabled[exam2][0] and exams_timetabled[exam1][1] == exams_timetabled[exam2][1]:
-                        violations.append(
-                            f"❌ Student {student} has two exams '{exam1}' and '{exam2}' at the same time "
-                        )
-
-        # 1. Core modules fixed: students cannot have more than one core exam on the same day            
-        for student, exs in student_exams.items():
-            core_mods = [exam for exam in exs if exam in Core_modules]
-            other_mods = [exam for exam in exs if exam not in Core_modules]
-            for core_exam in core_mods:
-                core_day = exams_timetabled[core_exam][0]
-                for other_exam in other_mods:
-                    other_day = exams_timetabled[other_exam][0]
-                    if core_day == other_day:
-                        violations.append(
-                            f"❌ Student {student} has core exam '{core_exam}' and non-core exam '{other_exam}' on the same day ({core_day})"
-                        )
-        
-        # 2. Other modules fixed in date/time (Fixed_modules) 
-        for exam, fixed_slot in Fixed_modules.items():
-            scheduled_slot = [exams_timetabled.get(exam)[0] , exams_timetabled.get(exam)[1]]
-            if scheduled_slot != fixed_slot:
-                violations.append(f"❌ Fixed module '{exam}' is not at the correct time (expected {fixed_slot}, got {scheduled_slot}).")
-
-        # 3. No more than 3 exams in any 2 consecutive days (per student)
-        for student, exs in student_exams.items():
-            day_count = defaultdict(int)
-
-            for exam in exs:
-                if exam in schedule:
-                    day = schedule[exam][0]
-                    day_count[day] += 1
-            days = sorted(day_count.keys())
-            for day in days:
-                next_day = day + 1
-                if next_day in day_count:
-                    total = day_count[day] + day_count[next_day]
-                    if total > 3:
-                        violations.append(
-                            f"❌ Student {student} has more than 3 exams across days {day} and {next_day}"
-                        )
-
-        # 4. No more than 4 exams in any 5 consecutive weekdays (Monday to Friday)
-        for student, exs in student_exams.items():
-            day_count = defaultdict(int)
-            for exam in exs:
-                if exam in schedule:
-                    day = schedule[exam][0]
-                    day_count[day] += 1
-        all_days = sorted(day_count.keys())
-        if all_days:
-            min_day, max_day = all_days[0], all_days[-1]
-            for start_day in range(min_day, max_day - 4 + 1):
-                total = sum(day_count.get(day, 0) for day in range(start_day, start_day + 5))
-                if total > 4:
-                    violations.append(
-                        f"❌ Student {student} has more than 4 exams from day {start_day} to {start_day + 4}"
-                    )
-
-
-        # 5. Module leaders cannot have more than one exam in the third week (days 15 to 20 inclusive)                
-        week3_days = set(range(15, 21))
-        for leader, mods in module_leaders.items():
-            exams_in_week3 = [exam for exam in mods if exam in schedule and schedule[exam][0] in week3_days]
-            if len(exams_in_week3) > 1:
-                violations.append(f"❌ Module leader {leader} has more than one exam in week 3: {exams_in_week3}")
-
-        # 6. Students with >50% extra time cannot have more than one exam on the same day        
-        for student in extra_time_students_50:
-            if student not in student_exams:
-                continue
-            day_count = defaultdict(int)
-            for exam in student_exams[student]:
-                if exam in schedule:
-                    day = schedule[exam][0]
-                    day_count[day] += 1
-            for day, count in day_count.items():
-                if count > 1:
-                    violations.append(f"❌ Student {student} with >50% extra time has {count} exams on day {day}")
-        
-        #7 soft Students with 25% extra time cannot have more than one exam on the same day
-        for student in AEA:
-            if student not in extra_time_students_50:
-                day_count = defaultdict(int)
-                for exam in student_exams[student]:
-                    if exam in schedule:
-                        day = schedule[exam][0]
-                        day_count[day] += 1
-                for day, count in day_count.items():
-                    if count > 1:
-                        violations.append(f"⚠️soft warning Student {student} with <=25% extra time has {count} exams on day {day}")
-        
-        
-        #Soft checking theres not more than two exams in any slot in the first week 
-        exam_in_slot = defaultdict(list)
-
-        for exam in exams:
-            day, slot,rooms = schedule[exam]
-
-            if day <= 15:  # First two weeks
-                exam_in_slot[(day, slot)].append(exam)
-
-        # Check for violations
-        for date_slot, scheduled_exams in exam_in_slot.items():
-            if len(scheduled_exams) >= 3:
-                violations.append(
-                    f"⚠️ Soft warning: day/slot {date_slot} has {len(scheduled_exams)} exams scheduled: {scheduled_exams}"
-                )
-
-        return violations
-    
+#Pick a stored run, defaulting to the one generated in this session
+runs = list_runs()
+run = None
+if not runs:
+    st.warning("No stored runs found. Please generate a timetable first.")
+else:
+    run_ids = [meta["run_id"] for meta in runs]
+    run_labels = {
+        meta["run_id"]: f"{meta['run_id']} ({meta['num_students']} students, {meta['num_exams']} exams, penalty {meta['penalty']})"
+        for meta in runs
+    }
+    last_run_id = st.session_state.get("last_run_id")
+    run_id = st.selectbox(
+        "Run to check against", run_ids, index=run_ids.index(last_run_id) if last_run_id in run_ids else 0,
+        format_func=run_labels.get,
+    )
+    try:
+        run = load_check_inputs(run_id)
+    except TimetablingError as e:
+        st.error(str(e))
+    except Exception as e:
+        st.error(f"Failed to load run {run_id}: {e}")
+
+def file_checking(exams_timetabled, run):
+    #make the table of exam and room violations, kept so the filters below can rerun the page without checking again
+    violations = check_timetable(
+        exams_timetabled, run["Fixed_modules"], run["Core_modules"], None, run["leader_courses"], run["extra_time_students_50"],
+        run["exams"], run["AEA"], run["exam_counts"], run["rooms"], run["exam_types"], len(run["days"]), run["enrollment"],
+    )
+    st.session_state["violation_report"] = violation_report(violations)
 
 
-    def check_room_constraints(
-        exams_timetabled,      # dict: exam -> (day, slot, [assigned_rooms])
-        exam_counts,           # dict: exam -> (AEA_students, SEQ_students)
-        room_dict,
-        exam_types,              # dict: room_name -> [list of types, capacity]
-    ):
-        violations = []
-        # 1. Check room capacity sufficiency per exam
-        for exam, (day, slot, rooms) in exams_timetabled.items():
-            if exam not in exam_counts:
-                violations.append(f"⚠️ No student count for exam '{exam}', skipping capacity check")
-                continue
-            AEA_students, SEQ_students = exam_counts[exam]
-            AEA_capacity = sum(room_dict[r][1] for r in rooms if "AEA" in room_dict[r][0])
-            SEQ_capacity = sum(room_dict[r][1] for r in rooms if "SEQ" in room_dict[r][0])
-            if AEA_capacity < AEA_students:
-                violations.append(
-                    f"❌ Exam '{exam}' has insufficient AEA capacity: needed {AEA_students}, assigned {AEA_capacity}"
-                )
-            if SEQ_capacity < SEQ_students:
-                violations.append(
-                    f"❌ Exam '{exam}' has insufficient SEQ capacity: needed {SEQ_students}, assigned {SEQ_capacity}"
-                )
-        # 2. No room double-booked at same day & slot
-        room_schedule = defaultdict(list)
-        for exam, (day, slot, rooms_) in exams_timetabled.items():
-            for room in rooms_:
-                room_schedule[(day, slot, room)].append(exam)
-        for (day, slot, room), exams_in_room in room_schedule.items():
-            if room != 'NON ME N/A': 
-                if len(exams_in_room) > 1:
-                    violations.append(
-                        f"❌ Room '{room}' double-booked on day {day}, slot {slot} for exams: {exams_in_room}"
-                    )
-                
-        # 3. Check computer-based exams are in computer rooms
-        for exam, (day, slot, rooms) in exams_timetabled.items():
-            if exam_types[exam] == "PC":
-                for room in rooms:
-                    if "Computer" not in room_dict[room][0]:
-                        violations.append(
-                            f"❌ Computer-based exam '{exam}' assigned to non-computer room '{room}'"
-                        )
+def report_excel(report, summary):
+    #Write the summary and every violation to an in-memory workbook
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        summary.to_excel(writer, sheet_name="Summary", index=False)
+        report.to_excel(writer, sheet_name="Violations", index=False)
+    return buffer.getvalue()
 
-        # 4 Check every exam assigned at least one room
-        for exam, (day, slot, rooms) in exams_timetabled.items():
-            if not rooms:
-                violations.append(f"❌ Exam '{exam}' has no assigned room!")
-        
-        # 5 Check non PC exams are not in PC rooms
-        for exam, (day, slot, rooms) in exams_timetabled.items():
-            if exam_types[exam] != "PC":  # Only check non computer-based exams
-                for room in rooms:
-                    if "Computer" in room_dict[room][0]:
-                        violations.append(
-                            f"⚠️ Soft warning: '{exam}' assigned to computer room '{room}' and is not a computer exam"
-                        )
 
-        return violations
-    #make list of exam violations
-    violations = check_exam_constraints(
-        student_exams=student_exams,
-        exams_timetabled=exams_timetabled,
-        Fixed_modules=Fixed_modules,
-        Core_modules=Core_modules,
-        module_leaders=leader_courses,
-        extra_time_students_50=extra_time_students_50,
-        exams = exams,
-        AEA = AEA
-    )
-    #add list of room violations
-    violations.extend(check_room_constraints(
-        exams_timetabled=exams_timetabled,
-        exam_counts=exam_counts,
-        room_dict=rooms,
-        exam_types=exam_types
-    ))
-    if violations:
-        #Write out the violations found
-        for v in violations:
-            st.write(v)
-    else:
+def show_report(report):
+    if report.empty:
         st.write("✅ All constraints satisfied! No violations found.")
-
-
+        return
+
+    #Summary of the violations for each rule
+    summary = summarise_violations(report)
+    hard = int((report["severity"] == HARD).sum())
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Hard violations", hard)
+    col2.metric("Soft warnings", int((report["severity"] == SOFT).sum()))
+    col3.metric("Other warnings", int((report["severity"] == WARNING).sum()))
+    st.subheader("Violations by rule")
+    st.dataframe(summary, hide_index=True, width="stretch")
+
+    #Filters for the full table
+    st.subheader("All violations")
+    col1, col2, col3 = st.columns(3)
+    rules = col1.multiselect("Rule", list(summary["rule"]), key="filter_rules")
+    severities = col2.multiselect("Severity", [HARD, SOFT, WARNING], key="filter_severity")
+    search = col3.text_input("Student, exam or room contains", key="filter_search")
+    filtered = report
+    if rules:
+        filtered = filtered[filtered["rule"].isin(rules)]
+    if severities:
+        filtered = filtered[filtered["severity"].isin(severities)]
+    if search:
+        text = filtered[["student", "leader", "exams", "room"]].fillna("").astype(str).agg(" ".join, axis=1)
+        filtered = filtered[text.str.contains(search, case=False, regex=False)]
+
+    #Show one page of the filtered table at a time
+    col1, col2 = st.columns(2)
+    page_size = col1.selectbox("Rows per page", [25, 50, 100, 500], key="page_size")
+    num_pages = max(1, -(-len(filtered) // page_size))
+    page = col2.number_input(f"Page (of {num_pages})", min_value=1, max_value=num_pages, value=1, step=1, key="page")
+    start = (min(page, num_pages) - 1) * page_size
+    st.caption(f"Showing {min(start + 1, len(filtered))}-{min(start + page_size, len(filtered))} of {len(filtered)} violations")
+    st.dataframe(filtered.iloc[start:start + page_size], hide_index=True, width="stretch")
+
+    #Downloads of the filtered table
+    col1, col2 = st.columns(2)
+    col1.download_button(
+        label="📥 Download violations (CSV)",
+        data=filtered.to_csv(index=False).encode("utf-8"),
+        file_name="timetable_violations.csv",
+        mime="text/csv",
+    )
+    col2.download_button(
+        label="📥 Download violations (Excel)",
+        data=report_excel(filtered, summarise_violations(filtered)),
+        file_name="timetable_violations.xlsx",
+        mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    )
 
 
 uploaded_file = st.file_uploader("Upload a file to check", type=["xlsx", "csv"])
 
 if st.button("🔍 Check Files"):
-    st.header("🔍 Check Your Files")
-    if uploaded_file is not None:
+    st.session_state.pop("violation_report", None)
+    if uploaded_file is not None and run is not None:
         try:
-            st.write("✅ File uploaded successfully!")
-            exams_timetabled = file_reading(uploaded_file, days, slots)
-            file_checking(exams_timetabled, Fixed_modules, Core_modules, student_exams, leader_courses, extra_time_students_50, exams, AEA,exam_counts)
+            exams_timetabled = file_reading(uploaded_file, run["days"], run["slots"])
+            file_checking(exams_timetabled, run)
         except Exception as e:
-            st.error(f"Error reading file: {e}") 
\ No newline at end of file
+            st.error(f"Error reading file: {e}")
+
+if "violation_report" in st.session_state:
+    st.header("🔍 Check Your Files")
+    st.write("✅ File uploaded successfully!")
+    show_report(st.session_state["violation_report"])
@@ -0,0 +1,147 @@
+# Room assignment rules shared by the full timetable model and the per-slot room allocation
+import os
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from ortools.sat.python import cp_model
+
+# Room used for business and non Mech Eng modules, which can hold any number of exams at once
+NON_ME_ROOM = 'NON ME N/A'
+
+
+def add_room_constraints(model, exams, exam_room, exam_counts, exam_types, rooms, non_me_exams, guards=None):
+    """Post the per-exam room rules on exam_room[(exam, room)] and return (room_surplus, non_pc_exam_penalty).
+
+    guards, exam -> literal, makes each exam's hard room rules conditional on its literal (for diagnosing infeasibility).
+    """
+    def guard(constraint, exam):
+        return constraint.OnlyEnforceIf(guards[exam]) if guards else constraint
+
+    # Ensure each non ME exam is assigned room N/A and ME is not assingned this
+    for exam in exams:
+        if exam in non_me_exams:
+            guard(model.Add(exam_room[(exam, NON_ME_ROOM)] == 1), exam)
+        else:
+            guard(model.Add(exam_room[(exam, NON_ME_ROOM)] == 0), exam)
+
+    #Must have sufficient room for each exam
+    for exam in exams:
+        AEA_capacity = sum(
+            rooms[room][1] * exam_room[(exam, room)]
+            for room in rooms if "AEA" in rooms[room][0]
+        )
+        SEQ_capacity = sum(
+            rooms[room][1] * exam_room[(exam, room)]
+            for room in rooms if "SEQ" in rooms[room][0]
+        )
+        AEA_students = exam_counts[exam][0]
+        SEQ_students = exam_counts[exam][1]
+        guard(model.Add(AEA_capacity >= AEA_students), exam)
+        guard(model.Add(SEQ_capacity >= SEQ_students), exam)
+
+    #Ensure non computer rooms not used for computer exams
+    for exam in exams:
+        if exam_types[exam] == "PC":
+            for room in rooms:
+                uses = rooms[room][0]
+                if "Computer" not in uses:
+                    guard(model.Add(exam_room[(exam, room)] == 0), exam)
+
+    # Minimize amount of rooms used
+    room_surplus = []
+    for exam in exams:
+        guard(model.Add(sum(exam_room[(exam, room)] for room in rooms) >= 1), exam)
+        rooms_len = model.NewIntVar(0, len(rooms), f'rooms for {exam}')
+
+        model.Add(rooms_len == sum(exam_room[(exam, room)]for room in rooms))
+        rooms_penalty = model.NewIntVar(0, 15, f'{exam}_room_surplus_penalty')
+
+        is_room_length_greater_6 = model.NewBoolVar(f'{exam}_has_six_or_more_rooms')
+        is_room_length_5 = model.NewBoolVar(f'{exam}_has_five_rooms')
+        is_room_length_4 = model.NewBoolVar(f'{exam}_has_four_rooms')
+        is_room_length_3 = model.NewBoolVar(f'{exam}_has_three_rooms')
+
+        model.Add(rooms_len >= 6).OnlyEnforceIf(is_room_length_greater_6)
+        model.Add(rooms_len <= 5).OnlyEnforceIf(is_room_length_greater_6.Not())
+        model.Add(rooms_len == 5).OnlyEnforceIf(is_room_length_5)
+        model.Add(rooms_len != 5).OnlyEnforceIf(is_room_length_5.Not())
+        model.Add(rooms_len == 4).OnlyEnforceIf(is_room_length_4)
+        model.Add(rooms_len != 4).OnlyEnforceIf(is_room_length_4.Not())
+        model.Add(rooms_len == 3).OnlyEnforceIf(is_room_length_3)
+        model.Add(rooms_len != 3).OnlyEnforceIf(is_room_length_3.Not())
+
+        model.add(rooms_penalty == 15).OnlyEnforceIf(is_room_length_greater_6)
+        model.Add(rooms_penalty == 9).OnlyEnforceIf(is_room_length_5)
+        model.Add(rooms_penalty == 6).OnlyEnforceIf(is_room_length_4)
+        model.Add(rooms_penalty == 4).OnlyEnforceIf(is_room_length_3)
+        model.Add(rooms_penalty == 0).OnlyEnforceIf(
+                    is_room_length_3.Not(), is_room_length_4.Not(), is_room_length_5.Not(), is_room_length_greater_6.Not(),
+                )
+        room_surplus.append(rooms_penalty)
+
+    #Penalise using pc rooms for non pc exams
+    non_pc_exam_penalty = []
+    computer_rooms = [room for room in rooms if "Computer" in rooms[room][0]]
+    for exam in exams:
+        if exam_types[exam] != "PC":
+            for room in computer_rooms:
+                non_pc_exam_penalty.append(5 * exam_room[(exam, room)])
+
+    return room_surplus, non_pc_exam_penalty
+
+
+def allocate_rooms(slot_exams, exam_counts, exam_types, rooms, non_me_exams, room_penalty, max_time_in_seconds=10):
+    """Assign rooms to the exams sitting in one (day, slot) with a small stand-alone model."""
+    start = time.time()
+    model = cp_model.CpModel()
+    exam_room = {}
+    for exam in slot_exams:
+        for room in rooms:
+            exam_room[(exam, room)] = model.NewBoolVar(f'{exam}_in_{room.replace(" ", "_")}')
+
+    room_surplus, non_pc_exam_penalty = add_room_constraints(
+        model, slot_exams, exam_room, exam_counts, exam_types, rooms, non_me_exams
+    )
+    # Every exam here is at the same time, so each room can only hold one of them
+    for room in rooms:
+        if room != NON_ME_ROOM:
+            model.AddAtMostOne(exam_room[(exam, room)] for exam in slot_exams)
+    model.Minimize(room_penalty * sum(room_surplus) + sum(non_pc_exam_penalty))
+
+    solver = cp_model.CpSolver()
+    solver.parameters.max_time_in_seconds = max_time_in_seconds
+    solver.parameters.num_workers = 1
+    status = solver.Solve(model)
+    allocation = {
+        "status": solver.StatusName(status),
+        "optimal": status == cp_model.OPTIMAL,
+        "rooms": None,
+        "room_surplus": None,
+        "non_pc_penalty": None,
+        "solve_time": time.time() - start,
+    }
+    if status in (cp_model.OPTIMAL, cp_model.FEASIBLE):
+        allocation["rooms"] = {
+            exam: [room for room in rooms if solver.Value(exam_room[(exam, room)])] for exam in slot_exams
+        }
+        allocation["room_surplus"] = sum(solver.Value(v) for v in room_surplus)
+        allocation["non_pc_penalty"] = sum(solver.Value(v) for v in non_pc_exam_penalty)
+    return allocation
+
+
+def allocate_rooms_parallel(slot_exams, exam_counts, exam_types, rooms, non_me_exams, room_penalty, max_time_in_seconds=10, max_workers=None):
+    """Allocate rooms for every occupied (day, slot) at once, farming each slot out to its own process."""
+    if max_workers is None:
+        max_workers = min(len(slot_exams), os.cpu_count() or 1)
+    if max_workers <= 1:
+        return {
+            time_slot: allocate_rooms(occupied, exam_counts, exam_types, rooms, non_me_exams, room_penalty, max_time_in_seconds)
+            for time_slot, occupied in slot_exams.items()
+        }
+    # Spawn rather than fork: the parent is usually a multi-threaded Streamlit server
+    with ProcessPoolExecutor(max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = {
+            time_slot: pool.submit(allocate_rooms, occupied, exam_counts, exam_types, rooms, non_me_exams, room_penalty, max_time_in_seconds)
+            for time_slot, occupied in slot_exams.items()
+        }
+        return {time_slot: future.result() for time_slot, future in futures.items()}
@@ -0,0 +1,167 @@
+# Store of generated runs, one directory per run under runs/<run_id>/, so that several users generating at once do not
+# overwrite each other and the checking page can reload any earlier run. Large data is kept as .npy arrays so the
+# enrollment matrix can be memory-mapped instead of read into memory:
+#
+#   meta.json           schema version, calendar, solver settings, fixed and core modules, module leaders
+#   timetable.json      exam -> [day, slot, rooms]
+#   enrollment.npy      students x exams, True where the student takes the exam
+#   students/<col>.npy  cid, aea, extra_time_25, extra_time_50
+#   exams/<col>.npy     name, exam_type, aea_count, seq_count
+#   rooms/<col>.npy     name, capacity, kinds ("|" separated room types)
+import os
+import json
+import time
+import uuid
+import shutil
+import logging
+import numpy as np
+from timetable_model import TimetablingError
+
+logger = logging.getLogger(__name__)
+
+# Bump when the layout above changes; runs written with another version are not loaded
+SCHEMA_VERSION = 1
+RUNS_DIR = "runs"
+
+
+def new_run_id():
+    """Return a run ID that sorts by creation time."""
+    return f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+
+def run_path(run_id, runs_dir=RUNS_DIR):
+    """Directory holding a run's files."""
+    return os.path.join(runs_dir, run_id)
+
+
+def save_columns(path, columns):
+    os.makedirs(path)
+    for name, values in columns.items():
+        np.save(os.path.join(path, f"{name}.npy"), values, allow_pickle=False)
+
+
+def save_run(run_data, runs_dir=RUNS_DIR, run_id=None):
+    """Write a run (the run_data from create_timetable) to its own directory and return its ID."""
+    run_id = run_id or new_run_id()
+    final_path = run_path(run_id, runs_dir)
+    # Write to a temporary directory and rename it, so a run is never seen half written
+    path = os.path.join(runs_dir, f".{run_id}.tmp")
+    os.makedirs(path)
+    try:
+        exams = run_data["exams"]
+        exam_counts = run_data["exam_counts"]
+        rooms = run_data["rooms"]
+        meta = {
+            "schema_version": SCHEMA_VERSION,
+            "run_id": run_id,
+            "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "days": run_data["days"],
+            "slots": run_data["slots"],
+            "num_students": int(run_data["enrolled"].shape[0]),
+            "num_exams": len(exams),
+            "penalty": run_data.get("penalty"),
+            "solver_settings": run_data["solver_settings"],
+            "Fixed_modules": run_data["Fixed_modules"],
+            "Core_modules": list(run_data["Core_modules"]),
+            "leader_courses": {leader: list(courses) for leader, courses in run_data["leader_courses"].items()},
+        }
+        with open(os.path.join(path, "meta.json"), "w") as f:
+            json.dump(meta, f, indent=2)
+        with open(os.path.join(path, "timetable.json"), "w") as f:
+            json.dump({exam: [int(d), int(s), list(room)] for exam, (d, s, room) in run_data["exams_timetabled"].items()}, f)
+        np.save(os.path.join(path, "enrollment.npy"), np.ascontiguousarray(run_data["enrolled"], dtype=bool), allow_pickle=False)
+        save_columns(os.path.join(path, "students"), {
+            "cid": np.asarray(run_data["cids"]).astype(str),
+            "aea": np.asarray(run_data["aea"], dtype=bool),
+            "extra_time_25": np.asarray(run_data["extra_time_25"], dtype=bool),
+            "extra_time_50": np.asarray(run_data["extra_time_50"], dtype=bool),
+        })
+        save_columns(os.path.join(path, "exams"), {
+            "name": np.array(exams, dtype=str),
+            "exam_type": np.array([run_data["exam_types"].get(exam, "") for exam in exams], dtype=str),
+            "aea_count": np.array([exam_counts[exam][0] for exam in exams], dtype=np.int32),
+            "seq_count": np.array([exam_counts[exam][1] for exam in exams], dtype=np.int32),
+        })
+        save_columns(os.path.join(path, "rooms"), {
+            "name": np.array(list(rooms), dtype=str),
+            "capacity": np.array([capacity for _, capacity in rooms.values()], dtype=np.int32),
+            "kinds": np.array(["|".join(kinds) for kinds, _ in rooms.values()], dtype=str),
+        })
+        os.replace(path, final_path)
+    except Exception:
+        shutil.rmtree(path, ignore_errors=True)
+        raise
+    logger.info(f"Saved run {run_id} to {final_path}")
+    return run_id
+
+
+def read_meta(run_id, runs_dir=RUNS_DIR):
+    """Return a run's metadata, raising TimetablingError if it is missing or from another schema version."""
+    try:
+        with open(os.path.join(run_path(run_id, runs_dir), "meta.json")) as f:
+            meta = json.load(f)
+    except (OSError, ValueError) as e:
+        raise TimetablingError(f"Run {run_id} could not be read: {e}")
+    if meta.get("schema_version") != SCHEMA_VERSION:
+        raise TimetablingError(f"Run {run_id} was saved with schema version {meta.get('schema_version')}, expected {SCHEMA_VERSION}")
+    return meta
+
+
+def list_runs(runs_dir=RUNS_DIR):
+    """Return the metadata of every readable run, newest first."""
+    if not os.path.isdir(runs_dir):
+        return []
+    runs = []
+    for run_id in sorted(os.listdir(runs_dir), reverse=True):
+        if run_id.startswith("."):
+            continue
+        try:
+            runs.append(read_meta(run_id, runs_dir))
+        except TimetablingError as e:
+            logger.warning(str(e))
+    return runs
+
+
+def load_column(run_id, table, column, runs_dir=RUNS_DIR):
+    """Return one column of a run's students, exams or rooms table."""
+    return np.load(os.path.join(run_path(run_id, runs_dir), table, f"{column}.npy"), allow_pickle=False)
+
+
+def load_enrollment(run_id, runs_dir=RUNS_DIR):
+    """Return the students x exams enrollment matrix, memory-mapped read only rather than read into memory."""
+    return np.load(os.path.join(run_path(run_id, runs_dir), "enrollment.npy"), mmap_mode="r", allow_pickle=False)
+
+
+def load_timetable(run_id, runs_dir=RUNS_DIR):
+    """Return a run's timetable, exam -> (day, slot, rooms)."""
+    with open(os.path.join(run_path(run_id, runs_dir), "timetable.json")) as f:
+        return {exam: (d, s, rooms) for exam, (d, s, rooms) in json.load(f).items()}
+
+
+def load_check_inputs(run_id, runs_dir=RUNS_DIR):
+    """Return everything the checking page needs from a run, with the enrollment matrix memory-mapped."""
+    meta = read_meta(run_id, runs_dir)
+    cids = load_column(run_id, "students", "cid", runs_dir).tolist()
+    aea = load_column(run_id, "students", "aea", runs_dir)
+    extra_time_50 = load_column(run_id, "students", "extra_time_50", runs_dir)
+    exams = load_column(run_id, "exams", "name", runs_dir).tolist()
+    aea_count = load_column(run_id, "exams", "aea_count", runs_dir)
+    seq_count = load_column(run_id, "exams", "seq_count", runs_dir)
+    room_names = load_column(run_id, "rooms", "name", runs_dir).tolist()
+    capacity = load_column(run_id, "rooms", "capacity", runs_dir)
+    kinds = load_column(run_id, "rooms", "kinds", runs_dir)
+    return {
+        "meta": meta,
+        "days": meta["days"],
+        "slots": meta["slots"],
+        "exams": exams,
+        "enrollment": (cids, load_enrollment(run_id, runs_dir)),
+        "AEA": [cid for cid, flag in zip(cids, aea) if flag],
+        "extra_time_students_50": [cid for cid, flag in zip(cids, extra_time_50) if flag],
+        "leader_courses": meta["leader_courses"],
+        "exam_counts": {exam: [int(aea_count[i]), int(seq_count[i])] for i, exam in enumerate(exams)},
+        "exam_types": dict(zip(exams, load_column(run_id, "exams", "exam_type", runs_dir).tolist())),
+        "Fixed_modules": meta["Fixed_modules"],
+        "Core_modules": meta["Core_modules"],
+        "rooms": {name: [str(kinds[i]).split("|") if kinds[i] else [], int(capacity[i])] for i, name in enumerate(room_names)},
+    }
@@ -0,0 +1,49 @@
+import json
+from types import SimpleNamespace
+
+import input_cache
+from input_cache import ParsedInputCache, parse_uploads
+from timetable_model import save_matches
+
+EXAMS = ["MECH1 Statics", "MECH2 Dynamics"]
+
+
+def fake_parsers(monkeypatch):
+    """Replace the workbook parsers with cheap ones, recording the aliases each module parse saw."""
+    module_parses = []
+
+    def parse_modules(module_bytes, exams, aliases=None):
+        module_parses.append(dict(aliases))
+        report = {"matches": [], "ambiguous": [], "unmatched": [], "exams_without_module": exams,
+                  "new_aliases": {"MECH1": "MECH1 Statics"}}
+        return [], {}, {exam: "Standard" for exam in exams}, report
+
+    monkeypatch.setattr(input_cache, "parse_students", lambda student_bytes: (SimpleNamespace(exams=EXAMS), []))
+    monkeypatch.setattr(input_cache, "parse_modules", parse_modules)
+    monkeypatch.setattr(input_cache, "parse_calendar", lambda dates_bytes: ([], ["Monday 1st June"], []))
+    return module_parses
+
+
+def test_identical_uploads_hit_the_cache(monkeypatch, tmp_path):
+    module_parses = fake_parsers(monkeypatch)
+    alias_path = str(tmp_path / "aliases.json")
+    cache = ParsedInputCache()
+    first = parse_uploads(cache, b"students", b"modules", b"dates", alias_path)
+    second = parse_uploads(cache, b"students", b"modules", b"dates", alias_path)
+    assert len(module_parses) == 1
+    assert second["match_report"] is first["match_report"]
+    assert cache.misses == 3 and cache.hits == 3
+
+
+def test_saved_matches_are_used_by_the_next_parse(monkeypatch, tmp_path):
+    module_parses = fake_parsers(monkeypatch)
+    alias_path = str(tmp_path / "aliases.json")
+    cache = ParsedInputCache()
+    inputs = parse_uploads(cache, b"students", b"modules", b"dates", alias_path)
+    assert save_matches(inputs["match_report"], alias_path) == 1
+    parse_uploads(cache, b"students", b"modules", b"dates", alias_path)
+    parse_uploads(cache, b"students", b"modules", b"dates", alias_path)
+    assert module_parses == [{}, {"MECH1": "MECH1 Statics"}]
+    with open(alias_path) as f:
+        assert json.load(f) == {"MECH1": "MECH1 Statics"}
+    assert save_matches(inputs["match_report"], alias_path) == 0
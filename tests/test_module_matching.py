@@ -0,0 +1,37 @@
+import pandas as pd
+
+from timetable_model import load_aliases, match_module_list, modules_from_matches, save_aliases, save_matches
+
+EXAMS = ["ME Thermodynamics", "ME Fluid Mechanics", "MECH1 Statics"]
+
+
+def module_list(rows):
+    return pd.DataFrame([
+        {"Banner Code (New CR)": code, "Module Name": name, "Module Leader (lecturer 1)": leader,
+         "(UGO Internal) 2nd Exam Marker": None, "(UGO Internal) Exam Style": "Standard"}
+        for code, name, leader in rows
+    ])
+
+
+def matched_exams(report):
+    return {match["module"]: (match["exam"], match["source"]) for match in report["matches"]}
+
+
+def test_rows_sharing_a_code_keep_their_own_match_after_saving(tmp_path):
+    path = str(tmp_path / "aliases.json")
+    # An alias saved by code alone would send both ME rows to one exam
+    save_aliases({"ME": "ME Thermodynamics"}, path)
+    leaders_df = module_list([("ME", "Thermodynamics", "Dr A"), ("ME", "Fluid Mechanics", "Dr B"), ("MECH1", "Statics", "Dr C")])
+
+    first = match_module_list(leaders_df, EXAMS, load_aliases(path))
+    assert set(first["new_aliases"]) == {"ME Thermodynamics", "ME Fluid Mechanics", "MECH1"}
+    save_matches(first, path)
+
+    second = match_module_list(leaders_df, EXAMS, load_aliases(path))
+    assert matched_exams(second) == {
+        "ME Thermodynamics": ("ME Thermodynamics", "alias"),
+        "ME Fluid Mechanics": ("ME Fluid Mechanics", "alias"),
+        "MECH1 Statics": ("MECH1 Statics", "alias"),
+    }
+    leader_courses, _ = modules_from_matches(second, EXAMS)
+    assert leader_courses == {"Dr A": ["ME Thermodynamics"], "Dr B": ["ME Fluid Mechanics"], "Dr C": ["MECH1 Statics"]}
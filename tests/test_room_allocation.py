@@ -0,0 +1,67 @@
+from concurrent.futures import Future
+
+import room_allocation
+import timetable_model
+from room_allocation import NON_ME_ROOM, allocate_rooms_parallel
+
+ROOMS = {
+    "Room A": [["SEQ", "AEA"], 40],
+    "Room B": [["Computer", "SEQ", "AEA"], 30],
+    NON_ME_ROOM: [["SEQ", "AEA"], 1000],
+}
+EXAM_COUNTS = {f"Exam {i}": (1, 20) for i in range(8)}
+EXAM_TYPES = {exam: "Standard" for exam in EXAM_COUNTS}
+# Four occupied slots with two exams each
+SLOT_EXAMS = {(d, 0): [f"Exam {2 * d}", f"Exam {2 * d + 1}"] for d in range(4)}
+
+
+class RecordingPool:
+    """Stands in for ProcessPoolExecutor, running each task in-process and recording the pool size asked for."""
+    created = []
+
+    def __init__(self, max_workers, mp_context=None):
+        RecordingPool.created.append(max_workers)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+def test_pool_size_is_capped_at_max_workers(monkeypatch):
+    RecordingPool.created = []
+    monkeypatch.setattr(room_allocation, "ProcessPoolExecutor", RecordingPool)
+    monkeypatch.setattr(room_allocation.os, "cpu_count", lambda: 64)
+    allocations = allocate_rooms_parallel(SLOT_EXAMS, EXAM_COUNTS, EXAM_TYPES, ROOMS, set(), 1, max_workers=2)
+    assert RecordingPool.created == [2]
+    assert all(allocation["rooms"] is not None for allocation in allocations.values())
+
+
+def test_one_worker_allocates_in_process(monkeypatch):
+    RecordingPool.created = []
+    monkeypatch.setattr(room_allocation, "ProcessPoolExecutor", RecordingPool)
+    allocations = allocate_rooms_parallel(SLOT_EXAMS, EXAM_COUNTS, EXAM_TYPES, ROOMS, set(), 1, max_workers=1)
+    assert RecordingPool.created == []
+    assert set(allocations) == set(SLOT_EXAMS)
+
+
+def test_timetable_rooms_pass_on_the_worker_cap(monkeypatch):
+    calls = []
+
+    def fake_parallel(slot_exams, *args, max_workers=None, **kwargs):
+        calls.append(max_workers)
+        return {time_slot: {"rooms": {exam: ["Room A"] for exam in exams}} for time_slot, exams in slot_exams.items()}
+
+    monkeypatch.setattr(timetable_model, "allocate_rooms_parallel", fake_parallel)
+    tm = {"exam_counts": EXAM_COUNTS, "exam_types": EXAM_TYPES, "rooms": ROOMS, "non_me_exams": set(),
+          "weights": {"room_penalty": 1}}
+    timetable = {exam: (d, s, []) for (d, s), exams in SLOT_EXAMS.items() for exam in exams}
+    roomed, _ = timetable_model.allocate_timetable_rooms(tm, timetable, max_workers=3)
+    assert calls == [3]
+    assert roomed["Exam 0"] == (0, 0, ["Room A"])
@@ -0,0 +1,276 @@
+# Timetable checking engine: every per-student rule is evaluated on students x days and students x timeslots
+# load matrices built once from the enrollment matrix, rather than by looping over each student's exams.
+import itertools
+from collections import defaultdict
+import numpy as np
+import pandas as pd
+
+# Limits checked, matching the defaults on the Generate page
+MAX_EXAMS_2DAYS = 3
+MAX_EXAMS_5DAYS = 4
+# Module leaders can have at most one exam in week 3 (days 15 to 20 inclusive)
+WEEK3_DAYS = range(15, 21)
+# Soft limit of two exams per slot applies up to and including this day
+BUSY_SLOT_LAST_DAY = 15
+
+
+# Severity of each violation record
+HARD = "Hard"
+SOFT = "Soft"
+WARNING = "Warning"
+
+# Columns of the violation report, in order
+REPORT_COLUMNS = ["rule", "severity", "student", "leader", "exams", "day", "slot", "room", "message"]
+
+
+def violation(rule, severity, message, student=None, leader=None, exams=(), day=None, slot=None, room=()):
+    """One violation record for the report."""
+    return {
+        "rule": rule,
+        "severity": severity,
+        "student": None if student is None else str(student),
+        "leader": leader,
+        "exams": ", ".join(exams),
+        "day": None if day is None else int(day),
+        "slot": None if slot is None else int(slot),
+        "room": ", ".join(room),
+        "message": message,
+    }
+
+
+def violation_report(violations):
+    """Collect violation records into a DataFrame with the report columns."""
+    return pd.DataFrame(violations, columns=REPORT_COLUMNS).astype({"day": "Int64", "slot": "Int64"})
+
+
+def summarise_violations(report):
+    """Count the violations for each rule, hard rules first."""
+    if report.empty:
+        return pd.DataFrame(columns=["rule", "severity", "count"])
+    summary = report.groupby(["rule", "severity"], sort=False).size().reset_index(name="count")
+    order = {HARD: 0, SOFT: 1, WARNING: 2}
+    return summary.sort_values(["severity", "count"], key=lambda col: col.map(order) if col.name == "severity" else -col).reset_index(drop=True)
+
+
+def enrollment_matrix(student_exams, exams):
+    """Return (students, enrolled) with enrolled[i, j] True when students[i] takes exams[j]."""
+    exam_index = {exam: j for j, exam in enumerate(exams)}
+    students = list(student_exams)
+    enrolled = np.zeros((len(students), len(exams)), dtype=bool)
+    for i, student in enumerate(students):
+        enrolled[i, [exam_index[exam] for exam in student_exams[student] if exam in exam_index]] = True
+    return students, enrolled
+
+
+def schedule_vectors(schedule, exams):
+    """Return (exam_day, exam_slot) arrays over exams, -1 where an exam is not scheduled."""
+    exam_day = np.array([schedule[exam][0] if exam in schedule else -1 for exam in exams], dtype=int)
+    exam_slot = np.array([schedule[exam][1] if exam in schedule else -1 for exam in exams], dtype=int)
+    return exam_day, exam_slot
+
+
+def load_matrices(enrolled, exam_day, exam_slot, num_days):
+    """Return students x days and students x (day, slot) exam counts."""
+    scheduled = exam_day >= 0
+    by_day = np.zeros((len(exam_day), num_days), dtype=np.int32)
+    by_day[np.flatnonzero(scheduled), exam_day[scheduled]] = 1
+    by_time = np.zeros((len(exam_day), num_days * 2), dtype=np.int32)
+    by_time[np.flatnonzero(scheduled), exam_day[scheduled] * 2 + exam_slot[scheduled]] = 1
+    counts = enrolled.astype(np.int32)
+    return counts @ by_day, counts @ by_time
+
+
+def check_exam_constraints(exams_timetabled, Fixed_modules, Core_modules, student_exams, module_leaders,
+                           extra_time_students_50, exams, AEA, num_days=21, enrollment=None):
+    """Return the student, fixed module, leader and slot violations as records.
+
+    enrollment, (students, enrolled) over exams such as a stored run's memory-mapped matrix, is used instead of
+    building the matrix from student_exams.
+    """
+    violations = []
+    schedule = dict(Fixed_modules)
+    schedule.update(exams_timetabled)
+    for exam in exams:
+        if exam not in schedule:
+            violations.append(violation("Not scheduled", HARD, f"❌ Exam '{exam}' is not scheduled in the timetable.", exams=[exam]))
+
+    exams = list(exams)
+    students, enrolled = enrollment if enrollment is not None else enrollment_matrix(student_exams, exams)
+    exam_day, exam_slot = schedule_vectors(schedule, exams)
+    num_days = max(num_days, int(exam_day.max()) + 1 if len(exams) else 0)
+    day_load, time_load = load_matrices(enrolled, exam_day, exam_slot, num_days)
+
+    # 0. Students can't have two exams at the same time
+    for i, t in zip(*np.nonzero(time_load > 1)):
+        clashing = [exams[j] for j in np.flatnonzero(enrolled[i] & (exam_day * 2 + exam_slot == t))]
+        for exam1, exam2 in itertools.combinations(clashing, 2):
+            violations.append(violation(
+                "Student clash", HARD, f"❌ Student {students[i]} has two exams '{exam1}' and '{exam2}' at the same time ",
+                student=students[i], exams=[exam1, exam2], day=t // 2, slot=t % 2,
+            ))
+
+    # 1. Core modules fixed: students cannot have more than one core exam on the same day
+    is_core = np.array([exam in Core_modules for exam in exams], dtype=bool)
+    core_load = load_matrices(enrolled & is_core, exam_day, exam_slot, num_days)[0]
+    other_load = day_load - core_load
+    for i, d in zip(*np.nonzero((core_load > 0) & (other_load > 0))):
+        on_day = enrolled[i] & (exam_day == d)
+        for core_exam in (exams[j] for j in np.flatnonzero(on_day & is_core)):
+            for other_exam in (exams[j] for j in np.flatnonzero(on_day & ~is_core)):
+                violations.append(violation(
+                    "Core module day", HARD,
+                    f"❌ Student {students[i]} has core exam '{core_exam}' and non-core exam '{other_exam}' on the same day ({d})",
+                    student=students[i], exams=[core_exam, other_exam], day=d,
+                ))
+
+    # 2. Other modules fixed in date/time (Fixed_modules)
+    for exam, fixed_slot in Fixed_modules.items():
+        if exam not in exams_timetabled:
+            continue
+        scheduled_slot = [exams_timetabled[exam][0], exams_timetabled[exam][1]]
+        if scheduled_slot != list(fixed_slot):
+            violations.append(violation(
+                "Fixed module time", HARD, f"❌ Fixed module '{exam}' is not at the correct time (expected {fixed_slot}, got {scheduled_slot}).",
+                exams=[exam], day=scheduled_slot[0], slot=scheduled_slot[1],
+            ))
+
+    # 3. No more than 3 exams in any 2 consecutive days (per student), where both days have exams
+    pair_load = day_load[:, :-1] + day_load[:, 1:]
+    both_days = (day_load[:, :-1] > 0) & (day_load[:, 1:] > 0)
+    for i, d in zip(*np.nonzero(both_days & (pair_load > MAX_EXAMS_2DAYS))):
+        violations.append(violation(
+            "Two-day window", HARD, f"❌ Student {students[i]} has more than 3 exams across days {d} and {d + 1}",
+            student=students[i], exams=[exams[j] for j in np.flatnonzero(enrolled[i] & ((exam_day == d) | (exam_day == d + 1)))], day=d,
+        ))
+
+    # 4. No more than 4 exams in any 5 consecutive days, for windows between each student's first and last exam day
+    if num_days >= 5:
+        cumulative = np.concatenate([np.zeros((len(students), 1), dtype=np.int32), day_load.cumsum(axis=1)], axis=1)
+        window_load = cumulative[:, 5:] - cumulative[:, :-5]
+        has_exams = day_load > 0
+        first_day = np.where(has_exams.any(axis=1), has_exams.argmax(axis=1), num_days)
+        last_day = np.where(has_exams.any(axis=1), num_days - 1 - has_exams[:, ::-1].argmax(axis=1), -1)
+        starts = np.arange(window_load.shape[1])
+        in_range = (starts >= first_day[:, None]) & (starts <= last_day[:, None] - 4)
+        for i, d in zip(*np.nonzero(in_range & (window_load > MAX_EXAMS_5DAYS))):
+            violations.append(violation(
+                "Five-day window", HARD, f"❌ Student {students[i]} has more than 4 exams from day {d} to {d + 4}",
+                student=students[i], exams=[exams[j] for j in np.flatnonzero(enrolled[i] & (exam_day >= d) & (exam_day <= d + 4))], day=d,
+            ))
+
+    # 5. Module leaders cannot have more than one exam in the third week (days 15 to 20 inclusive)
+    for leader, mods in module_leaders.items():
+        exams_in_week3 = [exam for exam in mods if exam in schedule and schedule[exam][0] in WEEK3_DAYS]
+        if len(exams_in_week3) > 1:
+            violations.append(violation(
+                "Leader week 3", HARD, f"❌ Module leader {leader} has more than one exam in week 3: {exams_in_week3}",
+                leader=leader, exams=exams_in_week3,
+            ))
+
+    # 6. Students with >50% extra time cannot have more than one exam on the same day
+    student_rows = {student: i for i, student in enumerate(students)}
+    extra_time_50 = [student_rows[student] for student in extra_time_students_50 if student in student_rows]
+    for i, d in zip(*np.nonzero(day_load[extra_time_50] > 1)):
+        row = extra_time_50[i]
+        violations.append(violation(
+            "50% extra time", HARD, f"❌ Student {students[row]} with >50% extra time has {day_load[row, d]} exams on day {d}",
+            student=students[row], exams=[exams[j] for j in np.flatnonzero(enrolled[row] & (exam_day == d))], day=d,
+        ))
+
+    # 7. Soft: students with 25% extra time cannot have more than one exam on the same day
+    extra_time_50 = set(extra_time_students_50)
+    extra_time_25 = [student_rows[student] for student in AEA if student not in extra_time_50 and student in student_rows]
+    for i, d in zip(*np.nonzero(day_load[extra_time_25] > 1)):
+        row = extra_time_25[i]
+        violations.append(violation(
+            "25% extra time", SOFT, f"⚠️soft warning Student {students[row]} with <=25% extra time has {day_load[row, d]} exams on day {d}",
+            student=students[row], exams=[exams[j] for j in np.flatnonzero(enrolled[row] & (exam_day == d))], day=d,
+        ))
+
+    # Soft: not more than two exams in any slot in the first weeks
+    exam_in_slot = defaultdict(list)
+    for j in np.flatnonzero((exam_day >= 0) & (exam_day <= BUSY_SLOT_LAST_DAY)):
+        exam_in_slot[(int(exam_day[j]), int(exam_slot[j]))].append(exams[j])
+    for date_slot, scheduled_exams in exam_in_slot.items():
+        if len(scheduled_exams) >= 3:
+            violations.append(violation(
+                "Busy slot", SOFT, f"⚠️ Soft warning: day/slot {date_slot} has {len(scheduled_exams)} exams scheduled: {scheduled_exams}",
+                exams=scheduled_exams, day=date_slot[0], slot=date_slot[1],
+            ))
+
+    return violations
+
+
+def check_room_constraints(exams_timetabled, exam_counts, room_dict, exam_types):
+    """Return the room capacity, double booking and computer room violations as records."""
+    violations = []
+    # 1. Check room capacity sufficiency per exam
+    for exam, (day, slot, rooms) in exams_timetabled.items():
+        if exam not in exam_counts:
+            violations.append(violation(
+                "Missing student count", WARNING, f"⚠️ No student count for exam '{exam}', skipping capacity check", exams=[exam], day=day, slot=slot,
+            ))
+            continue
+        AEA_students, SEQ_students = exam_counts[exam]
+        AEA_capacity = sum(room_dict[r][1] for r in rooms if "AEA" in room_dict[r][0])
+        SEQ_capacity = sum(room_dict[r][1] for r in rooms if "SEQ" in room_dict[r][0])
+        if AEA_capacity < AEA_students:
+            violations.append(violation(
+                "AEA capacity", HARD, f"❌ Exam '{exam}' has insufficient AEA capacity: needed {AEA_students}, assigned {AEA_capacity}",
+                exams=[exam], day=day, slot=slot, room=rooms,
+            ))
+        if SEQ_capacity < SEQ_students:
+            violations.append(violation(
+                "SEQ capacity", HARD, f"❌ Exam '{exam}' has insufficient SEQ capacity: needed {SEQ_students}, assigned {SEQ_capacity}",
+                exams=[exam], day=day, slot=slot, room=rooms,
+            ))
+    # 2. No room double-booked at same day & slot
+    room_schedule = defaultdict(list)
+    for exam, (day, slot, rooms_) in exams_timetabled.items():
+        for room in rooms_:
+            room_schedule[(day, slot, room)].append(exam)
+    for (day, slot, room), exams_in_room in room_schedule.items():
+        if room != 'NON ME N/A':
+            if len(exams_in_room) > 1:
+                violations.append(violation(
+                    "Room double booked", HARD, f"❌ Room '{room}' double-booked on day {day}, slot {slot} for exams: {exams_in_room}",
+                    exams=exams_in_room, day=day, slot=slot, room=[room],
+                ))
+
+    # 3. Check computer-based exams are in computer rooms
+    for exam, (day, slot, rooms) in exams_timetabled.items():
+        if exam_types[exam] == "PC":
+            for room in rooms:
+                if "Computer" not in room_dict[room][0]:
+                    violations.append(violation(
+                        "PC exam room", HARD, f"❌ Computer-based exam '{exam}' assigned to non-computer room '{room}'",
+                        exams=[exam], day=day, slot=slot, room=[room],
+                    ))
+
+    # 4 Check every exam assigned at least one room
+    for exam, (day, slot, rooms) in exams_timetabled.items():
+        if not rooms:
+            violations.append(violation("No room", HARD, f"❌ Exam '{exam}' has no assigned room!", exams=[exam], day=day, slot=slot))
+
+    # 5 Check non PC exams are not in PC rooms
+    for exam, (day, slot, rooms) in exams_timetabled.items():
+        if exam_types[exam] != "PC":  # Only check non computer-based exams
+            for room in rooms:
+                if "Computer" in room_dict[room][0]:
+                    violations.append(violation(
+                        "Non-PC exam in PC room", SOFT, f"⚠️ Soft warning: '{exam}' assigned to computer room '{room}' and is not a computer exam",
+                        exams=[exam], day=day, slot=slot, room=[room],
+                    ))
+
+    return violations
+
+
+def check_timetable(exams_timetabled, Fixed_modules, Core_modules, student_exams, leader_courses, extra_time_students_50,
+                    exams, AEA, exam_counts, rooms, exam_types, num_days=21, enrollment=None):
+    """Run every exam and room check on a timetable, exam -> (day, slot, rooms), and return the violation records."""
+    violations = check_exam_constraints(
+        exams_timetabled, Fixed_modules, Core_modules, student_exams, leader_courses, extra_time_students_50, exams, AEA, num_days,
+        enrollment,
+    )
+    violations.extend(check_room_constraints(exams_timetabled, exam_counts, rooms, exam_types))
+    return violations
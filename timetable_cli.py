@@ -0,0 +1,209 @@
+# Headless entry point: validate the three input workbooks, build and solve the model and write the timetable to Excel
+# without Streamlit, printing timings and penalties as JSON for batch scripts.
+#
+#   python timetable_cli.py students.xlsx modules.xlsx useful_dates.xlsx --params run_config.json --output timetable.xlsx
+#
+#   python timetable_cli.py students.xlsx modules.xlsx useful_dates.xlsx --sweep ranges.json --cores 8 --output sweep.csv
+#
+# The parameter file has the format of the Run Configuration downloaded from the Generate page; missing keys take the
+# page's defaults. An instance file (--instance) replaces the fixed modules, core modules and rooms of timetable_model.py,
+# in the format of the instance.json written by benchmarks/generate_instances.py.
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+from input_cache import ParsedInputCache, parse_uploads
+from timetable_io import generate_excel
+from run_store import save_run
+from weight_sweep import run_sweep, sweep_grid
+import timetable_model
+from timetable_model import DEFAULT_WEIGHTS, TimetablingError, default_solver_settings, create_timetable, save_matches
+
+logger = logging.getLogger(__name__)
+
+# Defaults of the Generate page widgets
+DEFAULT_RUN_CONFIG = {
+    "max_exams_2days": 3,
+    "max_exams_5days": 4,
+    **DEFAULT_WEIGHTS,
+    "room_mode": "monolithic",
+    "formulation": "one-hot",
+    "num_solutions": 1,
+    "min_distance": 5,
+    "alternative_time": 30,
+    "stages": None,
+    "diagnose_unknown": False,
+}
+
+# Instance data an instance file can replace
+INSTANCE_KEYS = ["Fixed_modules", "Core_modules", "rooms"]
+
+
+def load_run_config(path=None):
+    """Read a run configuration file, filling in the defaults for anything it leaves out."""
+    run_config = dict(DEFAULT_RUN_CONFIG)
+    run_config["solver"] = default_solver_settings()
+    if path:
+        with open(path) as f:
+            saved = json.load(f)
+        run_config["solver"].update(saved.pop("solver", {}))
+        run_config.update(saved)
+    return run_config
+
+
+def load_instance(path=None):
+    """Read the fixed modules, core modules and rooms from an instance file, taking timetable_model's for any it leaves out."""
+    instance = {key: getattr(timetable_model, key) for key in INSTANCE_KEYS}
+    if path:
+        with open(path) as f:
+            saved = json.load(f)
+        instance.update({key: saved[key] for key in INSTANCE_KEYS if key in saved})
+    return instance
+
+
+def read_inputs(student_path, module_path, dates_path, save_new_matches=False):
+    """Read and validate the three workbooks, returning (inputs, errors by workbook).
+
+    With save_new_matches, clear fuzzy module matches are added to the alias table for later runs.
+    """
+    contents = []
+    for path in (student_path, module_path, dates_path):
+        with open(path, "rb") as f:
+            contents.append(f.read())
+    inputs = parse_uploads(ParsedInputCache(), *contents)
+    if save_new_matches and inputs["match_report"] is not None:
+        logger.info(f"Saved {save_matches(inputs['match_report'])} new module matches")
+    return inputs, {name: errors for name, errors in inputs["errors"].items() if errors}
+
+
+def run(student_path, module_path, dates_path, output, run_config, store_run=False, save_new_matches=False, instance=None):
+    """Generate a timetable from the three workbooks and return a JSON-serialisable summary of the run.
+
+    instance holds the Fixed_modules, Core_modules and rooms to use (see load_instance), by default timetable_model's.
+    """
+    instance = instance or load_instance()
+    start = time.time()
+    inputs, errors = read_inputs(student_path, module_path, dates_path, save_new_matches)
+    if errors:
+        return {"status": "INVALID_INPUT", "errors": errors}
+    parse_time = time.time() - start
+
+    weights = {name: run_config[name] for name in DEFAULT_WEIGHTS}
+    timetable, days, exam_counts, exam_types, penalty, stats = create_timetable(
+        inputs["students"], None, None, run_config["max_exams_2days"], run_config["max_exams_5days"], run_config["solver"],
+        room_mode=run_config["room_mode"], weights=weights,
+        num_solutions=run_config["num_solutions"], min_distance=run_config["min_distance"],
+        alternative_time=run_config["alternative_time"],
+        calendar=(inputs["days"], inputs["bank_holiday_days"]), module_match=(inputs["leader_courses"], inputs["exam_types"]),
+        stages=run_config["stages"], formulation=run_config["formulation"], diagnose_unknown=run_config["diagnose_unknown"],
+        **instance,
+    )
+
+    export_start = time.time()
+    outputs = [output]
+    generate_excel(timetable, days, exam_counts, exam_types, output, instance["Fixed_modules"], instance["Core_modules"])
+    base, ext = os.path.splitext(output)
+    for i, alternative in enumerate(stats["alternatives"], start=1):
+        outputs.append(f"{base}_alternative_{i}{ext}")
+        generate_excel(alternative["timetable"], days, exam_counts, exam_types, outputs[-1], instance["Fixed_modules"],
+                       instance["Core_modules"])
+    export_time = time.time() - export_start
+
+    summary = {
+        "status": stats["status"],
+        "stopped_early": stats["stopped_early"],
+        "penalty": penalty,
+        "penalty_breakdown": stats["penalty_breakdown"],
+        "objective": stats["objective"],
+        "best_bound": stats["best_bound"],
+        "timings": {
+            "parse": parse_time,
+            "build": stats["build_time"],
+            "solve": stats["solve_time"],
+            "export": export_time,
+            "total": time.time() - start,
+        },
+        "model": {
+            "students": stats["students"],
+            "profiles": stats["profiles"],
+            "formulation": stats["formulation"],
+            "variables": stats["num_variables"],
+            "constraints": stats["num_constraints"],
+            "proto_bytes": stats["proto_bytes"],
+        },
+        "solver_stats": stats["solver_stats"],
+        "stages": stats.get("stages"),
+        "alternatives": [
+            {"penalty": alternative["penalty"], "penalty_breakdown": alternative["penalty_breakdown"], "distance": alternative["distance"]}
+            for alternative in stats["alternatives"]
+        ],
+        "outputs": outputs,
+    }
+    if store_run:
+        summary["run_id"] = save_run(stats["run_data"])
+    return summary
+
+
+def sweep(student_path, module_path, dates_path, output, run_config, ranges, cores=None, save_new_matches=False, instance=None):
+    """Solve every combination of the weight and load limit ranges, writing the results to a CSV file."""
+    start = time.time()
+    inputs, errors = read_inputs(student_path, module_path, dates_path, save_new_matches)
+    if errors:
+        return {"status": "INVALID_INPUT", "errors": errors}
+    grid = sweep_grid(ranges)
+    df = run_sweep(
+        inputs["students"], (inputs["days"], inputs["bank_holiday_days"]), (inputs["leader_courses"], inputs["exam_types"]),
+        grid, run_config["solver"], cores, room_mode=run_config["room_mode"], formulation=run_config["formulation"],
+        instance=instance,
+    )
+    df.to_csv(output, index=False)
+    solved = df["status"].isin(["OPTIMAL", "FEASIBLE"])
+    return {
+        "status": "OPTIMAL" if (df["status"] == "OPTIMAL").all() else "FEASIBLE" if solved.any() else "NO SOLUTION",
+        "settings": len(grid),
+        "solved": int(solved.sum()),
+        "total_time": time.time() - start,
+        "pareto": df[df["pareto"]].drop(columns=["pareto", "error"]).to_dict(orient="records"),
+        "outputs": [output],
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate an exam timetable without the web interface.")
+    parser.add_argument("students", help="student list workbook")
+    parser.add_argument("modules", help="module list workbook")
+    parser.add_argument("dates", help="useful dates workbook")
+    parser.add_argument("--params", help="run configuration JSON, as downloaded from the Generate page")
+    parser.add_argument("--instance", help="JSON with Fixed_modules, Core_modules and rooms, as written by "
+                                           "benchmarks/generate_instances.py (default: those in timetable_model.py)")
+    parser.add_argument("--output", default="exam_schedule.xlsx", help="timetable workbook to write")
+    parser.add_argument("--store-run", action="store_true", help="also save the run under runs/ for the Check Timetable page")
+    parser.add_argument("--save-matches", action="store_true", help="add clear fuzzy module matches to the alias table for later runs")
+    parser.add_argument("--sweep", help="JSON of setting -> list of values to sweep (weights, max_exams_2days, max_exams_5days); "
+                                            "writes a CSV of every solve to --output instead of a timetable")
+    parser.add_argument("--cores", type=int, help="total cores shared by the solves of a sweep (default: the solver's num_workers)")
+    parser.add_argument("--verbose", action="store_true", help="log model building and solving to stderr")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING, stream=sys.stderr)
+
+    instance = load_instance(args.instance)
+    try:
+        if args.sweep:
+            with open(args.sweep) as f:
+                ranges = json.load(f)
+            output = args.output if args.output.endswith(".csv") else os.path.splitext(args.output)[0] + "_sweep.csv"
+            summary = sweep(args.students, args.modules, args.dates, output, load_run_config(args.params), ranges, args.cores,
+                            args.save_matches, instance)
+        else:
+            summary = run(args.students, args.modules, args.dates, args.output, load_run_config(args.params), args.store_run,
+                          args.save_matches, instance)
+    except TimetablingError as e:
+        summary = {"status": "FAILED", "error": str(e), "conflicts": e.conflicts}
+    print(json.dumps(summary, indent=2, default=str))
+    return 0 if summary["status"] in ("OPTIMAL", "FEASIBLE") else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
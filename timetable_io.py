@@ -0,0 +1,149 @@
+# Reading and writing timetables in the generator's Excel format, shared by the pages and the command line
+import io
+import logging
+import pandas as pd
+from openpyxl import Workbook
+from openpyxl.styles import PatternFill, Alignment, Border, Font, Side
+from openpyxl.utils import get_column_letter
+from timetable_model import Fixed_modules, Core_modules
+
+logger = logging.getLogger(__name__)
+
+
+def file_reading(filepath, days, slots):
+    #Read the uploaded file into a dataframe
+    df = pd.read_excel(filepath)
+    exams_timetabled = {}
+    #Build a dictionary of exams with their day, slot and room from excel timetable
+    for _, row in df.iterrows():
+        exam_name = row['Exam']
+
+
+        day_name = day_name if pd.isna(row['Date']) else row['Date']
+        slot_name = slot_name if pd.isna(row['Time']) else (0 if row['Time'] == "Morning" else 1)
+        if pd.isna(exam_name) or exam_name == '':
+            continue  # Skip empty rows
+        room = row['Room'].split(', ') if pd.notna(row['Room']) and row['Room'] else []
+
+        try:
+            d = days.index(day_name)
+            s = slots.index(slot_name)
+        except ValueError:
+            raise ValueError(f"Unrecognized day or slot in file: {day_name} / {slot_name}")
+
+        exams_timetabled[exam_name] = (d, s, room)
+
+    return exams_timetabled
+
+
+# Columns of the exported timetable
+SCHEDULE_COLUMNS = ['Date', 'Time', 'Exam', 'Total No of Students', 'Room', 'Type']
+# Day colours alternate, fixed and core modules are highlighted over the exam columns
+DAY_FILLS = (PatternFill('solid', fgColor='E0EAF6'), PatternFill('solid', fgColor='CBE9B8'))  # light blue, light green
+FIXED_FILL = PatternFill('solid', fgColor='FFFF54')  # bright yellow
+CORE_FILL = PatternFill('solid', fgColor='EA3323')   # red-orange
+HEADER_FONT = Font(bold=True)
+HEADER_BORDER = Border(*(Side(style='thin'),) * 4)
+HEADER_ALIGNMENT = Alignment(horizontal='center', vertical='top')
+CENTRE = Alignment(vertical='center')
+
+
+def schedule_rows(exams_timetabled, days, exam_counts, exam_types):
+    """Return the rows of the exported timetable and, for each row, its (day index, slot index).
+
+    Every slot has its exams followed by one blank row, or just a blank row if it has none.
+    """
+    # data[day][slot] = list of (exam_name, rooms)
+    data = {}
+    for exam, (d, s, room) in exams_timetabled.items():
+        data.setdefault(d, {}).setdefault(s, []).append((exam, room))
+
+    rows = []
+    row_meta = []
+    for d_idx, day_name in enumerate(days):
+        for s_idx, slot_name in enumerate(['Morning', 'Afternoon']):
+            for exam_name, room in data.get(d_idx, {}).get(s_idx, []):
+                total_students = f'AEA {exam_counts[exam_name][0]}, Non-AEA {exam_counts[exam_name][1]}'
+                type_str = {"PC": " (Computer)", "Standard": " (Standard)"}.get(exam_types[exam_name], "")
+                rows.append([day_name, slot_name, exam_name, total_students, ', '.join(room), type_str])
+                row_meta.append((d_idx, s_idx))
+            rows.append([day_name, slot_name, '', '', '', ''])
+            row_meta.append((d_idx, s_idx))
+    return rows, row_meta
+
+
+def schedule_frame(rows):
+    """The exported timetable as a DataFrame, for display."""
+    return pd.DataFrame(rows, columns=SCHEDULE_COLUMNS)
+
+
+def runs_of(keys):
+    """Yield (first, last) positions of each run of equal consecutive keys."""
+    start = 0
+    for i in range(1, len(keys) + 1):
+        if i == len(keys) or keys[i] != keys[start]:
+            yield start, i - 1
+            start = i
+
+
+def schedule_workbook(rows, row_meta, Fixed_modules=Fixed_modules, Core_modules=Core_modules):
+    """Build the formatted timetable workbook in one pass over the rows and return it as bytes.
+
+    Merges and column widths come from the row model rather than rereading the sheet.
+    """
+    fixed_prefixes = tuple(Fixed_modules)
+    core_prefixes = tuple(Core_modules)
+    wb = Workbook()
+    ws = wb.active
+    ws.append(SCHEDULE_COLUMNS)
+    for cell in ws[1]:
+        cell.font = HEADER_FONT
+        cell.border = HEADER_BORDER
+        cell.alignment = HEADER_ALIGNMENT
+
+    widths = [len(column) for column in SCHEDULE_COLUMNS]
+    for excel_row, (row, (d_idx, _)) in enumerate(zip(rows, row_meta), start=2):
+        ws.append(row)
+        exam_name = row[2]
+        exam_fill = None
+        if exam_name:
+            # Core colouring wins over fixed, as the core fill is applied last
+            if exam_name.startswith(core_prefixes):
+                exam_fill = CORE_FILL
+            elif exam_name.startswith(fixed_prefixes):
+                exam_fill = FIXED_FILL
+        for col, value in enumerate(row, start=1):
+            cell = ws.cell(row=excel_row, column=col)
+            cell.fill = exam_fill if exam_fill is not None and col >= 3 else DAY_FILLS[d_idx % 2]
+            if col <= 2:
+                cell.alignment = CENTRE
+            widths[col - 1] = max(widths[col - 1], len(str(value)))
+
+    # Merge each (date, time) block in the Time column and each date in the Date column
+    for first, last in runs_of(row_meta):
+        if last > first:
+            ws.merge_cells(start_row=first + 2, start_column=2, end_row=last + 2, end_column=2)
+    for first, last in runs_of([d_idx for d_idx, _ in row_meta]):
+        if last > first:
+            ws.merge_cells(start_row=first + 2, start_column=1, end_row=last + 2, end_column=1)
+
+    for col, width in enumerate(widths, start=1):
+        ws.column_dimensions[get_column_letter(col)].width = width + 2
+    buffer = io.BytesIO()
+    wb.save(buffer)
+    return buffer.getvalue()
+
+
+def export_timetable(exams_timetabled, days, exam_counts, exam_types, Fixed_modules=Fixed_modules, Core_modules=Core_modules):
+    """Return the timetable as (DataFrame for display, formatted workbook bytes), both from the same rows."""
+    rows, row_meta = schedule_rows(exams_timetabled, days, exam_counts, exam_types)
+    return schedule_frame(rows), schedule_workbook(rows, row_meta, Fixed_modules, Core_modules)
+
+
+def generate_excel(exams_timetabled, days, exam_counts, exam_types, filename='exam_schedule_merged.xlsx',
+                   Fixed_modules=Fixed_modules, Core_modules=Core_modules):
+    """Write a timetable, exam -> (day, slot, rooms), to a formatted workbook with merged and coloured cells."""
+    rows, row_meta = schedule_rows(exams_timetabled, days, exam_counts, exam_types)
+    with open(filename, "wb") as f:
+        f.write(schedule_workbook(rows, row_meta, Fixed_modules, Core_modules))
+    logger.info(f"Excel file '{filename}' created with merged cells, colors, and full schedule.")
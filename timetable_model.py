@@ -0,0 +1,1297 @@
+# Timetable model: reading the input workbooks and building and solving the CP-SAT model.
+# Nothing in here touches Streamlit, so the pages, benchmarks and scripts all share it.
+import re
+import os
+import json
+import time
+import tempfile
+import threading
+import logging
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+from dateutil.parser import parse
+from ortools.sat.python import cp_model
+from rapidfuzz import process, fuzz
+from room_allocation import NON_ME_ROOM, add_room_constraints, allocate_rooms_parallel
+from feasibility_screen import screen_feasibility, screen_message
+
+logger = logging.getLogger(__name__)
+
+# Core modules list
+Core_modules = ["MECH70001 Nuclear Thermal Hydraulics",
+                "MECH60004/MECH70042 Introduction to Nuclear Energy A/B",
+                "MECH70002 Nuclear Reactor Physics",
+                "MECH70008 Mechanical Transmissions Technology",
+                "MECH70006 Metal Processing Technology",
+                "MECH70021Aircraft Engine Technology",
+                "MECH70003 Future Clean Transport Technology",
+                "MECH60015/70030 PEN3/AME"]
+
+# Fixed modules dictionary , name and date
+Fixed_modules = {"BUSI60039 Business Strategy" :[1,1],
+                 "BUSI60046 Project Management":[2,1],
+                 "ME-ELEC70098 Optimisation":[3,0],
+                 "MECH70001 Nuclear Thermal Hydraulics":[3,0],
+                 "BUSI60040/BUSI60043 Corporate Finance Online/Finance & Financial Management":[3,1],
+                 "MECH60004/MECH70042 Introduction to Nuclear Energy A/B":[4,0],
+                 "ME-ELEC70022 Modelling and Control of Multi-body Mechanical Systems":[4,0],
+                 "MATE97022 Nuclear Materials 1":[4,0],
+                 "ME-MATE70029 Nuclear Fusion":[9,0],
+                 "MECH70002 Nuclear Reactor Physics":[10,0],
+                 "ME-ELEC70076 Sustainable Electrical Systems":[10,0],
+                 "ME ELEC70066 Applied Advanced Optimisation":[10,0],
+                 "MECH70020 Combustion, Safety and Fire Dynamics":[11,0],
+                 "BIOE70016 Human Neuromechanical Control and Learning":[11,0],
+                 "CENG60013 Nuclear Chemical Engineering":[11,0],
+                 "MECH70008 Mechanical Transmissions Technology":[17,1],
+                 "MECH70006 Metal Processing Technology":[17,1],
+                 "MECH70021Aircraft Engine Technology":[17,1],
+                 "MECH70003 Future Clean Transport Technology":[17,1],
+                 "MECH60015/70030 PEN3/AME":[18,1]}
+
+# Room dictionary with capacities and functions
+rooms = {
+    'CAGB 203': [["Computer", "SEQ"], 65],
+    'CAGB 309': [["SEQ"], 54],
+    'CAGB 649-652': [["SEQ"], 75],
+    'CAGB 747-748': [["SEQ","AEA"], 36],
+    'CAGB 749-752': [["SEQ"], 75],
+    'CAGB 761': [["Computer", "SEQ","AEA"], 25],
+    'CAGB 762': [["Computer", "SEQ","AEA"], 25],
+    'CAGB 765': [["AEA","Computer"], 10],
+    'CAGB 527': [["AEA"], 2],
+    'NON ME N/A':[["SEQ","AEA"],1000], #For business and non Mech Eng modules
+}
+
+# No exam dates (weekends and last Friday morning)
+no_exam_dates = [
+    [5,0], [5,1], [6,0], [6,1],  # First weekend
+    [12,0], [12,1], [13,0], [13,1],  # Second weekend
+    [18,0], [19,0], [19,1], [20,0], [20,1]  # Last Friday morning and weekend
+]
+
+#Days it is preferable to not have an exam on but can if needed
+no_exam_dates_soft = [
+    [15,0],# Week 3 tuesday morning
+    [16,0], #Week 3 Wednesday morning
+]
+
+# Default soft constraint weights, matching the sliders on the Generate page
+DEFAULT_WEIGHTS = {
+    "spread_penalty": 5,
+    "room_penalty": 5,
+    "extra_time_penalty": 5,
+    "soft_day_penalty": 5,
+}
+
+# Default priority order of a staged solve: student welfare first, then module leaders, avoided days and rooms
+STAGE_ORDER = ["extra_time_25", "spread", "soft_day", "soft_slot", "room_surplus", "non_pc_room"]
+
+# Ways of modelling when each exam sits: one-hot literals only, or also one timeslot variable per exam with the student
+# clash rule posted as an AllDifferent over each exam set
+FORMULATIONS = ["one-hot", "timeslot"]
+
+# Seconds allowed for finding and shrinking the set of conflicting rules when the model is infeasible
+DIAGNOSIS_TIME = 30
+
+# Fuzzy score (0-100) a module list row needs to be matched to an exam, and how close a runner up must be to count as ambiguous
+MATCH_THRESHOLD = 70
+AMBIGUITY_MARGIN = 5
+
+# Module code -> exam name matches accepted in earlier runs, kept beside the code unless the environment says otherwise
+ALIAS_FILE = os.environ.get("TIMETABLE_ALIAS_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "module_aliases.json"))
+
+class TimetablingError(Exception):
+    """Raised when the inputs cannot be turned into a timetable.
+
+    conflicts lists the groups of hard rules found to clash when the model is infeasible, as described by build_model.
+    """
+
+    def __init__(self, message, conflicts=None):
+        super().__init__(message)
+        self.conflicts = conflicts or []
+
+def ordinal(n):
+    # Returns ordinal string for an integer n, e.g. 1 -> 1st, 2 -> 2nd
+    if 11 <= (n % 100) <= 13:
+        return f"{n}th"
+    else:
+        return f"{n}{['th','st','nd','rd','th','th','th','th','th','th'][n % 10]}"
+
+@dataclass
+class StudentList:
+    """Parsed student list: one row per student, one column per exam (columns J onward)."""
+    cids: np.ndarray           # column A
+    exams: list                # exam names from the header row
+    codes: np.ndarray          # students x exams indicator codes, '' where blank
+    enrolled: np.ndarray       # students x exams, True where the code is x, a or b
+    aea: np.ndarray            # students with any additional exam arrangement
+    extra_time_25: np.ndarray  # students with 25% extra time
+    extra_time_50: np.ndarray  # students with 50% extra time
+
+    @property
+    def AEA(self):
+        return self.cids[self.aea].tolist()
+
+    @property
+    def extra_time_students_25(self):
+        return self.cids[self.extra_time_25].tolist()
+
+    @property
+    def extra_time_students_50(self):
+        return self.cids[self.extra_time_50].tolist()
+
+    def student_exams(self):
+        """Return a dictionary of each student's exams."""
+        exams = np.array(self.exams, dtype=object)
+        return {cid: exams[row].tolist() for cid, row in zip(self.cids, self.enrolled)}
+
+    def exam_counts(self):
+        """Return exam -> [AEA students, non-AEA students]."""
+        aea_counts = self.enrolled[self.aea].sum(axis=0)
+        seq_counts = self.enrolled[~self.aea].sum(axis=0)
+        return {exam: [int(aea_counts[i]), int(seq_counts[i])] for i, exam in enumerate(self.exams)}
+
+def parse_student_list(df):
+    """Convert the student list into a StudentList using vectorised string operations."""
+    exams = df.iloc[0, 9:].dropna().tolist()
+    student_rows = df.iloc[2:, :]
+    codes = np.char.lower(np.char.strip(student_rows.iloc[:, 9:9 + len(exams)].to_numpy(dtype=str)))
+    codes[codes == 'nan'] = ''
+    arrangements = student_rows.iloc[:, 3]
+    arrangement_text = arrangements.astype(str)
+    return StudentList(
+        cids=student_rows.iloc[:, 0].to_numpy(),
+        exams=exams,
+        codes=codes,
+        enrolled=np.isin(codes, ['x', 'a', 'b']),
+        aea=(arrangements.notna() & (arrangement_text.str.strip() != "#N/A")).to_numpy(),
+        extra_time_25=arrangement_text.str.startswith(("15min/hour", "25% extra time")).to_numpy(),
+        extra_time_50=arrangement_text.str.startswith(("30min/hour", "50% extra time")).to_numpy(),
+    )
+
+def validate_student_list(df):
+    """Validate the student list Excel file format and content, returning the parsed list and any errors."""
+    errors = []
+    
+    if len(df) < 3:
+        errors.append("Student list must have at least 3 rows (header + students)")
+        return None, errors
+    
+    if df.iloc[0, 0] != "CID" or df.iloc[0, 3] != "Additional Exam Arrangements AEA":
+        errors.append(f"Student list must have 'CID' instead of {df.iloc[0, 0]} in column A and 'AEA' instead of {df.iloc[0, 3]}")
+        return None, errors
+    
+    exam_columns = df.iloc[0, 9:].dropna()
+    if len(exam_columns) == 0:
+        errors.append("No exam columns found starting from column J")
+        return None, errors
+    
+    students = parse_student_list(df)
+    # Check every cell at once and report all bad ones (Excel rows start at 3 for students)
+    missing_cid = pd.isna(students.cids)
+    for row in np.flatnonzero(missing_cid):
+        errors.append(f"Missing CID in row {row + 3}")
+    invalid = ~np.isin(students.codes, ['', 'x', 'a', 'b'])
+    invalid[missing_cid] = False
+    for row, col in zip(*np.nonzero(invalid)):
+        errors.append(f"Invalid exam indicator '{students.codes[row, col]}' for student {students.cids[row]} in exam {students.exams[col]}")
+
+    return students, errors
+
+def validate_module_list(df):
+    """Validate the module list Excel file format and content."""
+    errors = []
+
+    if len(df) < 2:
+        errors.append("Module list must have at least 2 rows")
+        return errors
+    
+    required_cols = ['Banner Code (New CR)', 'Module Name', 'Module Leader (lecturer 1)']
+    for col in required_cols:
+        if col not in df.columns:
+            errors.append(f"Missing required column: {col}")
+
+    return errors
+
+def validate_useful_dates(wb):
+    """Validate the useful dates Excel file format and content."""
+    errors = []
+    if not wb:
+        errors.append("Could not open useful dates file")
+        return errors
+    ws = wb.active
+    found_bank_holidays = False
+    row = 5
+    while True:
+        name = ws[f"F{row}"].value
+        if name is None or "Term Dates" in str(name):
+            break
+        if "Bank Holiday" in str(name):
+            found_bank_holidays = True
+            break
+        row += 1
+    if not found_bank_holidays:
+        errors.append("Could not find bank holidays section in useful dates file")
+    found_summer_term = False
+    row = 5
+    while row < ws.max_row:
+        cell_value = ws[f"F{row}"].value
+        if cell_value and "Summer Term" in str(cell_value):
+            found_summer_term = True
+            break
+        row += 1
+    if not found_summer_term:
+        errors.append("Could not find Summer Term section in useful dates file")
+    return errors
+
+def build_conflict_graph(students):
+    """Build the weighted exam conflict graph: (exam1, exam2) -> number of students taking both."""
+    enrolled = students.enrolled.astype(np.int32)
+    shared = enrolled.T @ enrolled
+    rows, cols = np.nonzero(np.triu(shared, k=1))
+    return {(students.exams[i], students.exams[j]): int(shared[i, j]) for i, j in zip(rows, cols)}
+
+def densest_conflicts(conflict_graph, top=10):
+    """Return the exam pairs shared by the most students as (exam1, exam2, students) rows."""
+    ranked = sorted(conflict_graph.items(), key=lambda item: item[1], reverse=True)[:top]
+    return [(exam1, exam2, weight) for (exam1, exam2), weight in ranked]
+
+def conflict_degrees(conflict_graph):
+    """Return the number of other exams each exam clashes with."""
+    degrees = defaultdict(int)
+    for exam1, exam2 in conflict_graph:
+        degrees[exam1] += 1
+        degrees[exam2] += 1
+    return dict(degrees)
+
+def build_profiles(students):
+    """Group students with the same exam set and arrangements into profiles weighted by student count."""
+    flags = np.column_stack([students.enrolled, students.aea, students.extra_time_25, students.extra_time_50])
+    unique_rows, weights = np.unique(flags, axis=0, return_counts=True)
+    exams = np.array(students.exams, dtype=object)
+    n = len(students.exams)
+    profiles = {}
+    for row, weight in zip(unique_rows, weights):
+        key = (frozenset(exams[row[:n]]), bool(row[n]), bool(row[n + 1]), bool(row[n + 2]))
+        profiles[key] = int(weight)
+    return profiles
+
+def read_exam_calendar(wb):
+    """Read the exam period from the useful dates workbook: the day names and the bank holiday day numbers."""
+    # Process bank holidays
+    ws = wb.active
+    bank_holidays = []
+    row = 5
+
+    while True:
+        name = ws[f"F{row}"].value
+        date_cell = ws[f"G{row}"].value
+        if name is None or "Term Dates" in str(name):
+            break
+        if isinstance(date_cell, datetime):
+            bank_holidays.append((str(name).strip(), date_cell.date()))
+        row += 1
+
+    # Find Summer Term start date
+    summer_start = None
+    while row < ws.max_row:
+        cell_value = ws[f"F{row}"].value
+        if cell_value and "Summer Term" in str(cell_value):
+            term_range = ws[f"F{row + 1}"].value
+            if term_range:
+                try:
+                    start_part = term_range.split("to")[0].strip()
+                    start_str = re.sub(r"^\w+\s+", "", start_part)
+                    year_match = re.search(r"\b\d{4}\b", term_range)
+                    if year_match:
+                        start_str += f" {year_match.group(0)}"
+                    else:
+                        raise TimetablingError("Year not found in date range.")
+                    summer_start = parse(start_str, dayfirst=True).date()
+                except Exception as e:
+                    raise TimetablingError(f"Could not parse Summer Term start: {term_range}")
+            break
+        row += 1
+    if not summer_start:
+        raise TimetablingError("Summer Term start date not found")
+    
+    # Find first Monday
+    first_monday = summer_start
+    while first_monday.weekday() != 0:
+        first_monday += timedelta(days=1)
+    bank_holiday_days = []
+    for name, bh_date in bank_holidays:
+        delta = (bh_date - first_monday).days
+        if 0 <= delta <= 20:
+            bank_holiday_days.append(delta)
+
+    #Get the list of days from useful dates
+    days = []
+    for i in range(21):
+        date = first_monday + timedelta(days=i)
+        day_str = date.strftime("%A ") + ordinal(date.day) + date.strftime(" %B")
+        days.append(day_str)
+    return days, bank_holiday_days
+
+
+def default_solver_settings():
+    """Default CP-SAT search settings, using every core on the machine."""
+    return {
+        "num_workers": os.cpu_count() or 8,
+        "max_time_in_seconds": 120,
+        "relative_gap_limit": 0.0,  # stop early once the incumbent is within this fraction of the bound
+        "random_seed": 0,
+        "linearization_level": 1,
+        "log_search_progress": False,
+    }
+
+def apply_solver_settings(solver, solver_settings):
+    """Copy a solver settings dictionary onto a CpSolver and return the full settings used."""
+    settings = default_solver_settings()
+    settings.update(solver_settings or {})
+    solver.parameters.num_workers = int(settings["num_workers"])
+    solver.parameters.max_time_in_seconds = float(settings["max_time_in_seconds"])
+    solver.parameters.relative_gap_limit = float(settings["relative_gap_limit"])
+    solver.parameters.random_seed = int(settings["random_seed"])
+    solver.parameters.linearization_level = int(settings["linearization_level"])
+    solver.parameters.log_search_progress = bool(settings["log_search_progress"])
+    if settings["log_search_progress"]:
+        # Send the search log to our logger rather than straight to stdout
+        solver.parameters.log_to_stdout = False
+        solver.log_callback = logger.info
+    return settings
+
+
+@contextmanager
+def constraint_family(model, family_stats, name):
+    """Record how many variables and constraints a block of model building adds, and how long it takes."""
+    proto = model.Proto()
+    num_variables, num_constraints = len(proto.variables), len(proto.constraints)
+    start = time.time()
+    yield
+    family_stats.append({
+        "family": name,
+        "variables": len(proto.variables) - num_variables,
+        "constraints": len(proto.constraints) - num_constraints,
+        "build_time": time.time() - start,
+    })
+
+def log_family_stats(family_stats):
+    """Write the per family model sizes to the log, largest first."""
+    for row in sorted(family_stats, key=lambda row: row["constraints"], reverse=True):
+        logger.info(f"{row['family']}: {row['variables']} variables, {row['constraints']} constraints, {row['build_time']:.3f}s")
+
+def model_proto_size(model):
+    """Return the serialised size of the model in bytes."""
+    # The proto wrapper has no ByteSize, so measure the binary file CP-SAT itself would write
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "model.pb")
+        model.ExportToFile(path)
+        return os.path.getsize(path)
+
+
+def load_aliases(path=ALIAS_FILE):
+    """Load the module code -> exam name alias table, or an empty one if there is none yet."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+def save_aliases(aliases, path=ALIAS_FILE):
+    """Write the alias table through a temporary file, so readers never see it half written."""
+    directory = os.path.dirname(os.path.abspath(path))
+    with tempfile.NamedTemporaryFile("w", dir=directory, suffix=".tmp", delete=False) as f:
+        json.dump(aliases, f, indent=2, sort_keys=True)
+    try:
+        os.replace(f.name, path)
+    except OSError:
+        os.remove(f.name)
+        raise
+
+def save_matches(report, path=ALIAS_FILE):
+    """Add the clear fuzzy matches in a match report to the alias table, returning how many were new."""
+    aliases = load_aliases(path)
+    new = {key: exam for key, exam in report["new_aliases"].items() if aliases.get(key) != exam}
+    if new:
+        aliases.update(new)
+        save_aliases(aliases, path)
+    return len(new)
+
+def match_module_list(leaders_df, exams, aliases=None):
+    """Match every module list row to an exam name, by alias where one is known and otherwise by fuzzy score.
+
+    Aliases are keyed by module code, or by code and name ("CODE Name") for a code shared by several rows, since one
+    exam per code would merge those modules. aliases is only read. Returns a report with the matches, the ambiguous and
+    unmatched modules, the exams no module matched, and the clear fuzzy matches as new_aliases for save_matches.
+    """
+    aliases = {} if aliases is None else aliases
+    new_aliases = {}
+    rows = []
+    for _, row in leaders_df.iterrows():
+        leaders = []
+        if pd.notna(row['Module Leader (lecturer 1)']):
+            leaders.append(row['Module Leader (lecturer 1)'])
+        if pd.notna(row['(UGO Internal) 2nd Exam Marker']):
+            leaders.append(row['(UGO Internal) 2nd Exam Marker'])
+        name = row['Module Name']
+        code = row['Banner Code (New CR)']
+        if pd.isna(code) or pd.isna(name) :
+            continue
+        if len(leaders) == 0 :
+            continue
+        exam_style = row['(UGO Internal) Exam Style'] if pd.notna(row['(UGO Internal) Exam Style']) else None
+        rows.append({"row": len(rows), "code": str(code), "module": f"{code} {name}", "leaders": leaders, "exam_style": exam_style})
+    code_rows = Counter(row["code"] for row in rows)
+    for row in rows:
+        row["alias_key"] = row["code"] if code_rows[row["code"]] == 1 else row["module"]
+
+    exam_set = set(exams)
+    matches, ambiguous, unmatched = [], [], []
+    to_score = []
+    for row in rows:
+        if aliases.get(row["alias_key"]) in exam_set:
+            matches.append({**row, "exam": aliases[row["alias_key"]], "score": 100.0, "source": "alias"})
+        else:
+            to_score.append(row)
+
+    if to_score and exams:
+        # Score every remaining module against every exam at once
+        scores = process.cdist([row["module"] for row in to_score], exams, scorer=fuzz.token_sort_ratio, workers=-1)
+        best = scores.argmax(axis=1)
+        for row, row_scores, i in zip(to_score, scores, best):
+            score = float(row_scores[i])
+            if score < MATCH_THRESHOLD:
+                unmatched.append({**row, "closest_exam": exams[i], "score": score})
+                continue
+            matches.append({**row, "exam": exams[i], "score": score, "source": "fuzzy"})
+            close = [exams[j] for j in np.flatnonzero(row_scores >= max(MATCH_THRESHOLD, score - AMBIGUITY_MARGIN)) if j != i]
+            if close:
+                # Not remembered, so it is reported again until someone adds the right alias by hand
+                ambiguous.append({**row, "exam": exams[i], "score": score, "other_candidates": close})
+            else:
+                new_aliases[row["alias_key"]] = exams[i]
+    else:
+        unmatched.extend({**row, "closest_exam": None, "score": 0.0} for row in to_score)
+
+    matched_exams = {match["exam"] for match in matches}
+    return {
+        "matches": sorted(matches, key=lambda match: match["row"]),
+        "ambiguous": ambiguous,
+        "unmatched": unmatched,
+        "exams_without_module": [exam for exam in exams if exam not in matched_exams],
+        "new_aliases": new_aliases,
+    }
+
+def modules_from_matches(report, exams):
+    """Turn a match report into (leader_courses, exam_types), with unmatched exams treated as Standard."""
+    leader_courses = defaultdict(list)
+    exam_types = dict()
+    for match in report["matches"]:
+        exam_types[match["exam"]] = match["exam_style"]
+        for leader in match["leaders"]:
+            if match["exam"] not in leader_courses[leader]:
+                leader_courses[leader].append(match["exam"])
+    leader_courses = dict(leader_courses)
+
+    for exam in exams:
+        if exam not in exam_types:
+            exam_types[exam] = "Standard"
+    return leader_courses, exam_types
+
+def match_modules(leaders_df, exams, aliases=None):
+    """Fuzzy match the module list to the exam names, returning (leader_courses, exam_types)."""
+    return modules_from_matches(match_module_list(leaders_df, exams, aliases), exams)
+
+
+def build_model(students, leader_courses, exam_types, days, no_exam_dates, max_exams_2days, max_exams_5days,
+                weights=None, room_mode="monolithic", Fixed_modules=Fixed_modules, Core_modules=Core_modules, rooms=rooms,
+                diagnose=False, formulation="one-hot"):
+    """Build the CP-SAT timetable model and return it with its variables and penalty families.
+
+    With the "timeslot" formulation each exam also has a timeslot variable over the usable (day, slot) pairs, its day and
+    slot are read off by element constraints, and students' clashes are one AllDifferent per exam set rather than pairs.
+
+    With diagnose, each group of hard rules (per exam pair, core module, fixed module, student profile, leader, slot, room
+    or exam's rooms) is only enforced when its own literal is true, and tm["assumptions"] lists (literal, description)
+    so an infeasible model can name the groups that conflict.
+    """
+    weights = {**DEFAULT_WEIGHTS, **(weights or {})}
+    exams = students.exams
+    exam_counts = students.exam_counts()
+    model = cp_model.CpModel()
+    family_stats = []
+    assumptions = []
+    slot_names = ["Morning", "Afternoon"]
+
+    def group(rule, message, **details):
+        # A new assumption literal for one group of hard rules, or None when not diagnosing
+        if not diagnose:
+            return None
+        literal = model.NewBoolVar(f'assume_{len(assumptions)}')
+        assumptions.append((literal, {"rule": rule, "message": message, **details}))
+        return literal
+
+    def guard(constraint, literal):
+        return constraint.OnlyEnforceIf(literal) if literal is not None else constraint
+    slots = [0, 1]
+    num_slots = len(slots)
+    num_days = len(days)
+    exam_day = {}
+    exam_slot = {}
+    exam_time = {}
+    with constraint_family(model, family_stats, "Decision variables"):
+        # One-hot literal tensor x[exam, day, slot] (and on_day[exam, day] derived from it),
+        # built once and reused by every constraint family instead of re-reifying exam_day == d
+        x = {}
+        on_day = {}
+        exam_times = [(d, s) for d in range(num_days) for s in slots]
+        usable_times = [t for t, (d, s) in enumerate(exam_times) if [d, s] not in no_exam_dates]
+        for exam in exams:
+            exam_day[exam] = model.NewIntVar(0, num_days - 1, f'{exam}_day')
+            exam_slot[exam] = model.NewIntVar(0, num_slots - 1, f'{exam}_slot')
+            for d in range(num_days):
+                for s in slots:
+                    x[(exam, d, s)] = model.NewBoolVar(f'{exam}_at_{d}_{s}')
+                on_day[(exam, d)] = model.NewBoolVar(f'{exam}_on_day_{d}')
+                model.Add(on_day[(exam, d)] == sum(x[(exam, d, s)] for s in slots))
+            model.AddExactlyOne(x[(exam, d, s)] for d, s in exam_times)
+            if formulation == "timeslot":
+                # Channel the literals to one timeslot variable, which can only take usable times
+                exam_time[exam] = model.NewIntVarFromDomain(cp_model.Domain.FromValues(usable_times), f'{exam}_time')
+                model.Add(exam_time[exam] == sum(t * x[(exam, d, s)] for t, (d, s) in enumerate(exam_times)))
+                model.AddElement(exam_time[exam], [d for d, _ in exam_times], exam_day[exam])
+                model.AddElement(exam_time[exam], [s for _, s in exam_times], exam_slot[exam])
+            else:
+                # Channel the literals to the integer day and slot variables
+                model.Add(exam_day[exam] == sum(d * x[(exam, d, s)] for d, s in exam_times))
+                model.Add(exam_slot[exam] == sum(s * x[(exam, d, s)] for d, s in exam_times))
+        exam_room = {}
+        if room_mode == "monolithic":
+            for exam in exams:
+                for room in rooms:
+                    exam_room[(exam, room)] = model.NewBoolVar(f'{exam}_in_{room.replace(" ", "_")}')
+
+#####----Adding constraints ------####
+    # Per-student rules below are posted once per enrollment profile rather than once per student
+    profiles = build_profiles(students)
+    exam_sets = {exs for exs, _, _, _ in profiles}
+    logger.info(f"{len(students.cids)} students compressed to {len(profiles)} enrollment profiles")
+
+    with constraint_family(model, family_stats, "0. Student clashes"):
+        # 0. Students can't have exams at the same time
+        conflict_graph = build_conflict_graph(students)
+        open_times = [(d, s) for d, s in exam_times if [d, s] not in no_exam_dates]
+        if formulation == "timeslot" and not diagnose:
+            # One AllDifferent per exam set, skipping sets that lie inside another student's exams
+            kept = []
+            for exs in sorted(exam_sets, key=lambda exs: (-len(exs), sorted(exs))):
+                if len(exs) > 1 and not any(exs <= other for other in kept):
+                    kept.append(exs)
+                    model.AddAllDifferent([exam_time[exam] for exam in sorted(exs)])
+        else:
+            # Posted once per pair of exams sharing a student (also when diagnosing, as AllDifferent cannot be guarded)
+            for (exam1, exam2), shared in conflict_graph.items():
+                literal = group("Student clash", f"{exam1} and {exam2} share {shared} students, so cannot be at the same time",
+                                exams=[exam1, exam2])
+                for d, s in open_times:
+                    guard(model.AddBoolOr([x[(exam1, d, s)].Not(), x[(exam2, d, s)].Not()]), literal)
+
+    if diagnose:
+        # Students behind each exam set, to name them in the diagnosis
+        exam_array = np.array(exams, dtype=object)
+        set_students = defaultdict(list)
+        for cid, row in zip(students.cids, students.enrolled):
+            set_students[frozenset(exam_array[row])].append(str(cid))
+
+    def describe_students(exs, arrangements=None):
+        cids = [cid for cid in set_students[exs] if arrangements is None or cid in arrangements]
+        shown = ", ".join(cids[:5]) + (f" and {len(cids) - 5} more" if len(cids) > 5 else "")
+        return cids, f"Student{'s' if len(cids) > 1 else ''} {shown} taking {len(exs)} exams"
+
+    with constraint_family(model, family_stats, "1. Core modules"):
+        # 1. Core modules can not have multiple exams on that day
+        core_pairs = set()
+        for exs in exam_sets:
+            core_mods = [exam for exam in exs if exam in Core_modules]
+            other_mods = [exam for exam in exs if exam not in Core_modules]
+            for exam in core_mods:
+                for other in other_mods:
+                    core_pairs.add((exam, other))
+        core_literals = {
+            exam: group("Core module day", f"Core module {exam} cannot share a day with any other exam of its students", exams=[exam])
+            for exam in {exam for exam, _ in core_pairs}
+        }
+        for exam, other in core_pairs:
+            guard(model.Add(exam_day[exam] != exam_day[other]), core_literals[exam])
+
+    with constraint_family(model, family_stats, "2. Fixed modules"):
+        # 2. Fixed modules day and slot assignment
+        for exam, (day_fixed, slot_fixed) in Fixed_modules.items():
+            literal = group("Fixed module", f"Fixed module {exam} is fixed to {days[day_fixed]} {slot_names[slot_fixed]}",
+                            exams=[exam], day=day_fixed, slot=slot_fixed)
+            guard(model.Add(x[(exam, day_fixed, slot_fixed)] == 1), literal)
+
+    with constraint_family(model, family_stats, "3. Forbidden dates"):
+        # 3. Forbidden exam day-slot assignments
+        for exam in exams:
+            for day, slot in no_exam_dates:
+                model.Add(x[(exam, day, slot)] == 0)
+    with constraint_family(model, family_stats, "4. Two-day window"):
+        # 4. Max 3 exams in any 2-day window per student (only binding if the student has more exams than that)
+        for exs in exam_sets:
+            if len(exs) <= max_exams_2days:
+                continue
+            literal = None
+            if diagnose:
+                cids, who = describe_students(exs)
+                literal = group("Two-day window", f"{who} can have at most {max_exams_2days} exams in any 2 consecutive days",
+                                students=cids, exams=sorted(exs))
+            for d in range(num_days - 1):
+                guard(model.Add(sum(on_day[(exam, d)] + on_day[(exam, d + 1)] for exam in exs) <= max_exams_2days), literal)
+
+    with constraint_family(model, family_stats, "5. Five-day window"):
+        # 5. Max 4 exams in any 5-day sliding window per student
+        for exs in exam_sets:
+            if len(exs) <= max_exams_5days:
+                continue
+            literal = None
+            if diagnose:
+                cids, who = describe_students(exs)
+                literal = group("Five-day window", f"{who} can have at most {max_exams_5days} exams in any 5 consecutive days",
+                                students=cids, exams=sorted(exs))
+            for start_day in range(num_days - 4):
+                guard(model.Add(sum(on_day[(exam, d)] for exam in exs for d in range(start_day, start_day + 5)) <= max_exams_5days), literal)
+
+    with constraint_family(model, family_stats, "6. Leader week 3"):
+        # 6. At most 1 exam in week 3 (days 13 to 20) per module leader
+        for leader, leader_exams in leader_courses.items():
+            literal = group("Leader week 3", f"Module leader {leader} can have at most one exam in week 3", leader=leader, exams=list(leader_exams))
+            guard(model.Add(sum(on_day[(exam, d)] for exam in leader_exams for d in range(13, 21)) <= 1), literal)
+
+    with constraint_family(model, family_stats, "7. Extra time 50%"):
+        # 7. Extra time 50% students: max 1 exam per day
+        extra_time_50 = set(map(str, students.extra_time_students_50)) if diagnose else None
+        for exs in {exs for exs, _, _, is_50 in profiles if is_50}:
+            if len(exs) < 2:
+                continue
+            literal = None
+            if diagnose:
+                cids, who = describe_students(exs, extra_time_50)
+                literal = group("50% extra time", f"{who} with 50% extra time can have at most one exam a day", students=cids, exams=sorted(exs))
+            for day in range(num_days):
+                guard(model.Add(sum(on_day[(exam, day)] for exam in exs) <= 1), literal)
+
+    with constraint_family(model, family_stats, "Soft: extra time 25%"):
+        #Soft constraint that extra time students with<= 25% should only have one a day, weighted by profile size
+        extra_time_25_penalties= []
+        for p, ((exs, _, is_25, _), weight) in enumerate(profiles.items()):
+            if not is_25 or len(exs) < 2:
+                continue
+            for day in range(num_days):
+                num_exams = sum(on_day[(exam, day)] for exam in exs)
+                has_multiple_exams = model.NewBoolVar(f'profile_{p}_more_than_one_exam_day_{day}')
+                model.Add(num_exams >= 2).OnlyEnforceIf(has_multiple_exams)
+                model.Add(num_exams < 2).OnlyEnforceIf(has_multiple_exams.Not())
+                extra_time_25_penalties.append(weight * has_multiple_exams)
+
+    with constraint_family(model, family_stats, "Soft: leader spread"):
+        #Soft constraint that course leaders modules should be spread out
+        spread_penalties =[]
+        for leader in leader_courses:
+            mods = leader_courses[leader]
+            for i in range(len(mods)):
+                for j in range(i+1, len(mods)):
+                    m1 = mods[i]
+                    m2 = mods[j]
+                    diff = model.NewIntVar(-21, 21, f'{m1}_{m2}_diff')
+                    abs_diff = model.NewIntVar(0, 21, f'{m1}_{m2}_abs_diff')
+                    model.Add(diff == exam_day[m1] - exam_day[m2])
+                    model.AddAbsEquality(abs_diff, diff)
+                    close_penalty = model.NewIntVar(0, 5, f'{m1}_{m2}_penalty')
+                    is_gap_3 = model.NewBoolVar(f'{m1}_{m2}_gap3')
+                    is_gap_2 = model.NewBoolVar(f'{m1}_{m2}_gap2')
+                    is_gap_1 = model.NewBoolVar(f'{m1}_{m2}_gap1')
+                    is_gap_0 = model.NewBoolVar(f'{m1}_{m2}_gap0')
+                    model.Add(abs_diff == 3).OnlyEnforceIf(is_gap_3)
+                    model.Add(abs_diff != 3).OnlyEnforceIf(is_gap_3.Not())
+                    model.Add(abs_diff == 2).OnlyEnforceIf(is_gap_2)
+                    model.Add(abs_diff != 2).OnlyEnforceIf(is_gap_2.Not())
+                    model.Add(abs_diff == 1).OnlyEnforceIf(is_gap_1)
+                    model.Add(abs_diff != 1).OnlyEnforceIf(is_gap_1.Not())
+                    model.Add(abs_diff == 0).OnlyEnforceIf(is_gap_0)
+                    model.Add(abs_diff != 0).OnlyEnforceIf(is_gap_0.Not())
+                    model.Add(close_penalty == 1).OnlyEnforceIf(is_gap_3)
+                    model.Add(close_penalty == 3).OnlyEnforceIf(is_gap_2)
+                    model.Add(close_penalty == 4).OnlyEnforceIf(is_gap_1)
+                    model.Add(close_penalty == 5).OnlyEnforceIf(is_gap_0)
+                    model.Add(close_penalty == 0).OnlyEnforceIf(
+                        is_gap_3.Not(), is_gap_2.Not(), is_gap_1.Not(), is_gap_0.Not()
+                    )
+                    spread_penalties.append(close_penalty)
+
+    with constraint_family(model, family_stats, "Soft: avoided days"):
+        #Soft constraint to ensure no exams on some days
+        soft_day_penalties = []
+        for exam in exams:
+            for day, slot in no_exam_dates_soft:
+                soft_day_penalties.append(10 * x[(exam, day, slot)])
+
+    with constraint_family(model, family_stats, "Soft: exams per slot"):
+        #Minimize the amount of exams per slot 
+        soft_slot_penalties = []
+
+        for day in range(15):  #1 First two weeks only
+            for slot in slots:  
+                # 2 Make a list of all exams in a slot
+                exams_in_slot = [x[(exam, day, slot)] for exam in exams]
+
+                # 3 Count number of exams scheduled in this (day, slot)
+                num_exams_here = model.NewIntVar(0, len(exams), f'count_day{day}_slot{slot}')
+                model.Add(num_exams_here == sum(exams_in_slot))
+
+                # 4 Calculate penalties
+                is_three = model.NewBoolVar(f'is_three_day{day}_slot{slot}')
+                is_four_or_more = model.NewBoolVar(f'is_four_plus_day{day}_slot{slot}')
+
+                model.Add(num_exams_here == 3).OnlyEnforceIf(is_three)
+                model.Add(num_exams_here != 3).OnlyEnforceIf(is_three.Not())
+
+                model.Add(num_exams_here >= 4).OnlyEnforceIf(is_four_or_more)
+                model.Add(num_exams_here < 4).OnlyEnforceIf(is_four_or_more.Not())
+
+                #5 Apply penalties
+                penalty_three = model.NewIntVar(0, 5, f'penalty_three_day{day}_slot{slot}')
+                penalty_four = model.NewIntVar(0, 100, f'penalty_four_day{day}_slot{slot}')
+
+                model.Add(penalty_three == 5).OnlyEnforceIf(is_three)
+                model.Add(penalty_three == 0).OnlyEnforceIf(is_three.Not())
+
+                model.Add(penalty_four == 100).OnlyEnforceIf(is_four_or_more)
+                model.Add(penalty_four == 0).OnlyEnforceIf(is_four_or_more.Not())
+
+                soft_slot_penalties.append(penalty_three)
+                soft_slot_penalties.append(penalty_four)
+
+   ####- room constraints - ####
+    non_me_exams = [exam for exam in exams if exam in Fixed_modules and exam not in Core_modules]
+    me_rooms = [room for room in rooms if room != NON_ME_ROOM]
+    room_surplus = []
+    non_pc_exam_penalty = []
+    if room_mode == "monolithic":
+        with constraint_family(model, family_stats, "Rooms: capacity, PC rooms and surplus"):
+            room_literals = {
+                exam: group("Room capacity", f"{exam} needs rooms for {exam_counts[exam][0]} AEA and {exam_counts[exam][1]} other students"
+                            + (" in computer rooms" if exam_types[exam] == "PC" else ""), exams=[exam])
+                for exam in exams
+            } if diagnose else None
+            room_surplus, non_pc_exam_penalty = add_room_constraints(
+                model, exams, exam_room, exam_counts, exam_types, rooms, non_me_exams, room_literals
+            )
+
+        with constraint_family(model, family_stats, "Rooms: double booking"):
+            #Ensure each room holds at most one exam per day and slot: every exam placed in the room occupies its
+            #timeslot there, present only when exam_room is true, and the room's occupied timeslots may not overlap
+            times = dict(exam_time)
+            for exam in exams:
+                if exam not in times:
+                    # The one-hot formulation has no timeslot variable, so channel one from the literals
+                    times[exam] = model.NewIntVar(0, len(exam_times) - 1, f'{exam}_time')
+                    model.Add(times[exam] == sum(t * x[(exam, d, s)] for t, (d, s) in enumerate(exam_times)))
+            for room in me_rooms:
+                literal = group("Room double booking", f"{room} holds one exam at a time", exams=[], room=room)
+                occupied = [
+                    model.NewOptionalFixedSizeIntervalVar(times[exam], 1, exam_room[(exam, room)], f'{exam}_in_{room.replace(" ", "_")}_time')
+                    for exam in exams
+                ]
+                guard(model.AddNoOverlap(occupied), literal)
+    else:
+        with constraint_family(model, family_stats, "Rooms: seats per slot"):
+            # Phase one of the decomposed mode: only check total seats per slot, rooms are assigned per slot afterwards
+            me_exams = [exam for exam in exams if exam not in non_me_exams]
+            pc_exams = [exam for exam in me_exams if exam_types[exam] == "PC"]
+            computer_rooms = [room for room in me_rooms if "Computer" in rooms[room][0]]
+            def seats(room_list, use):
+                return sum(rooms[room][1] for room in room_list if use in rooms[room][0])
+            for d, s in open_times:
+                literal = group("Seats per slot", f"Exams on {days[d]} {slot_names[s]} must fit in the rooms' seats", exams=[], day=d, slot=s)
+                guard(model.Add(sum(exam_counts[exam][0] * x[(exam, d, s)] for exam in me_exams) <= seats(me_rooms, "AEA")), literal)
+                guard(model.Add(sum(exam_counts[exam][1] * x[(exam, d, s)] for exam in me_exams) <= seats(me_rooms, "SEQ")), literal)
+                guard(model.Add(sum(exam_counts[exam][0] * x[(exam, d, s)] for exam in pc_exams) <= seats(computer_rooms, "AEA")), literal)
+                guard(model.Add(sum(exam_counts[exam][1] * x[(exam, d, s)] for exam in pc_exams) <= seats(computer_rooms, "SEQ")), literal)
+                # Every exam needs at least one room of its own
+                guard(model.Add(sum(x[(exam, d, s)] for exam in me_exams) <= len(me_rooms)), literal)
+
+    penalties = {
+        "spread": spread_penalties,
+        "soft_day": soft_day_penalties,
+        "extra_time_25": extra_time_25_penalties,
+        "room_surplus": room_surplus,
+        "soft_slot": soft_slot_penalties,
+        "non_pc_room": non_pc_exam_penalty,
+    }
+    with constraint_family(model, family_stats, "Objective"):
+        model.Minimize(
+            weights["spread_penalty"] * sum(spread_penalties)
+            + weights["soft_day_penalty"] * sum(soft_day_penalties)
+            + weights["extra_time_penalty"] * sum(extra_time_25_penalties)
+            + weights["room_penalty"] * sum(room_surplus)
+            + sum(soft_slot_penalties)
+            + sum(non_pc_exam_penalty)
+        )
+    return {
+        "model": model,
+        "exams": exams,
+        "days": days,
+        "slots": slots,
+        "exam_times": exam_times,
+        "open_times": open_times,
+        "exam_day": exam_day,
+        "exam_slot": exam_slot,
+        "exam_time": exam_time,
+        "x": x,
+        "on_day": on_day,
+        "exam_room": exam_room,
+        "rooms": rooms,
+        "room_mode": room_mode,
+        "formulation": formulation,
+        "non_me_exams": non_me_exams,
+        "exam_counts": exam_counts,
+        "exam_types": exam_types,
+        "weights": weights,
+        "conflict_graph": conflict_graph,
+        "profiles": profiles,
+        "penalties": penalties,
+        "family_stats": family_stats,
+        "assumptions": assumptions,
+    }
+
+
+def add_hint(tm, hint):
+    """Warm start the model from a previous timetable, exam -> (day, slot, rooms)."""
+    model = tm["model"]
+    for exam, (d, s, hinted_rooms) in hint.items():
+        if exam not in tm["exam_day"] or (d, s) not in tm["exam_times"]:
+            continue
+        model.AddHint(tm["exam_day"][exam], d)
+        model.AddHint(tm["exam_slot"][exam], s)
+        if exam in tm["exam_time"]:
+            model.AddHint(tm["exam_time"][exam], tm["exam_times"].index((d, s)))
+        for day, slot in tm["exam_times"]:
+            model.AddHint(tm["x"][(exam, day, slot)], int((day, slot) == (d, s)))
+        for day in range(len(tm["days"])):
+            model.AddHint(tm["on_day"][(exam, day)], int(day == d))
+        for room in tm["rooms"]:
+            if (exam, room) in tm["exam_room"]:
+                model.AddHint(tm["exam_room"][(exam, room)], int(room in hinted_rooms))
+    logger.info(f"Warm starting from a timetable with {len(hint)} exams")
+
+
+def extract_timetable(tm, solver):
+    """Read exam -> (day, slot, rooms) from a solved model."""
+    exams_timetabled = {}
+    for exam in tm["exams"]:
+        d = solver.Value(tm["exam_day"][exam])
+        s = solver.Value(tm["exam_slot"][exam])
+        assigned_rooms = [room for room in tm["rooms"] if (exam, room) in tm["exam_room"] and solver.Value(tm["exam_room"][(exam, room)]) == 1]
+        exams_timetabled[exam] = (d, s, assigned_rooms)
+    return exams_timetabled
+
+
+class ProgressCallback(cp_model.CpSolverSolutionCallback):
+    """Push every improving timetable found during the search onto a queue."""
+
+    def __init__(self, tm, progress):
+        cp_model.CpSolverSolutionCallback.__init__(self)
+        self.tm = tm
+        self.progress = progress
+        self.solutions = 0
+        # Set by a staged solve so progress reads as one search across the stages
+        self.stage = None
+        self.elapsed_offset = 0.0
+
+    def on_solution_callback(self):
+        self.solutions += 1
+        objective = self.ObjectiveValue()
+        bound = self.BestObjectiveBound()
+        self.progress.put({
+            "solutions": self.solutions,
+            "objective": objective,
+            "best_bound": bound,
+            "gap": abs(objective - bound) / max(1, abs(objective)),
+            "elapsed": self.elapsed_offset + self.WallTime(),
+            "stage": self.stage,
+            "timetable": {exam: (self.Value(self.tm["exam_day"][exam]), self.Value(self.tm["exam_slot"][exam])) for exam in self.tm["exams"]},
+        })
+
+
+def stop_on_event(solver, stop_event, solve_done):
+    """Stop the search from a side thread as soon as stop_event is set, keeping the best timetable so far."""
+    while not solve_done.is_set():
+        if stop_event.wait(0.2):
+            solver.StopSearch()
+            return
+
+
+def solve(solver, model, callback=None, stop_event=None):
+    """Solve the model, stopping early if stop_event is set from another thread."""
+    solve_done = threading.Event()
+    if stop_event is not None:
+        threading.Thread(target=stop_on_event, args=(solver, stop_event, solve_done), daemon=True).start()
+    try:
+        return solver.Solve(model, callback)
+    finally:
+        solve_done.set()
+
+
+def hint_solution(model, solver):
+    """Replace the model's hints with every variable's value in the solver's current solution."""
+    model.ClearHints()
+    for index in range(len(model.Proto().variables)):
+        var = model.get_int_var_from_proto_index(index)
+        model.AddHint(var, solver.Value(var))
+
+
+def stage_plan(order=STAGE_ORDER, time_limit=30, tolerance=0):
+    """Stages minimising each penalty family in order, each with the same time budget and tolerance."""
+    return [{"family": family, "time_limit": time_limit, "tolerance": tolerance} for family in order]
+
+
+def solve_staged(tm, solver, stages, callback=None, stop_event=None):
+    """Lexicographic solve: find any timetable, then minimise each stage's penalty family in turn.
+
+    Each stage starts from the previous stage's solution and, once solved, caps its family at the value found plus
+    the stage's tolerance. Returns (status, stage results); the status is OPTIMAL only if every stage was proven optimal.
+    """
+    model = tm["model"]
+    time_limit = solver.parameters.max_time_in_seconds
+    model.ClearObjective()
+    solver.parameters.stop_after_first_solution = True
+    status = solve(solver, model, callback, stop_event)
+    solver.parameters.stop_after_first_solution = False
+    elapsed = solver.WallTime()
+    stage_results = [{"family": "feasibility", "status": solver.StatusName(status), "value": None, "bound": None, "time": elapsed}]
+    if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+        return status, stage_results
+
+    all_optimal = True
+    for stage in stages:
+        if stop_event is not None and stop_event.is_set():
+            all_optimal = False
+            break
+        terms = tm["penalties"][stage["family"]]
+        if not terms:
+            continue
+        hint_solution(model, solver)
+        model.Minimize(sum(terms))
+        solver.parameters.max_time_in_seconds = float(stage.get("time_limit") or time_limit)
+        if callback is not None:
+            callback.stage = stage["family"]
+            callback.elapsed_offset = elapsed
+        stage_status = solve(solver, model, callback, stop_event)
+        elapsed += solver.WallTime()
+        result = {"family": stage["family"], "status": solver.StatusName(stage_status), "value": None, "bound": None, "time": solver.WallTime()}
+        stage_results.append(result)
+        if stage_status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+            # Nothing found within the budget, so go back to the previous stage's solution, which the hints describe exactly
+            logger.warning(f"Stage {stage['family']} found no solution in {result['time']:.1f}s, keeping the previous stage's timetable")
+            model.ClearObjective()
+            solver.parameters.max_time_in_seconds = time_limit
+            solver.parameters.fix_variables_to_their_hinted_value = True
+            status = solve(solver, model)
+            solver.parameters.fix_variables_to_their_hinted_value = False
+            if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+                return status, stage_results
+            all_optimal = False
+            break
+        result["value"] = int(solver.ObjectiveValue())
+        result["bound"] = solver.BestObjectiveBound()
+        all_optimal = all_optimal and stage_status == cp_model.OPTIMAL
+        model.Add(sum(terms) <= result["value"] + int(stage.get("tolerance", 0)))
+        logger.info(f"Stage {stage['family']}: {result['value']} ({result['status']}) in {result['time']:.1f}s")
+    solver.parameters.max_time_in_seconds = time_limit
+    return (cp_model.OPTIMAL if all_optimal else cp_model.FEASIBLE), stage_results
+
+
+def diagnose_infeasibility(students, leader_courses, exam_types, days, no_exam_dates, max_exams_2days, max_exams_5days,
+                           room_mode="monolithic", Fixed_modules=Fixed_modules, Core_modules=Core_modules, rooms=rooms,
+                           solver_settings=None, time_limit=DIAGNOSIS_TIME, formulation="one-hot"):
+    """Return descriptions of a small set of hard rule groups that cannot all hold, or [] if none is found in time.
+
+    The model is rebuilt in the given formulation, with student clashes as guarded pairs even for "timeslot".
+
+    Every group is guarded by an assumption literal and one solve returns the groups sufficient for infeasibility.
+    That set is then shrunk by dropping one group at a time and keeping it out whenever the rest are still infeasible.
+    """
+    start = time.time()
+    tm = build_model(students, leader_courses, exam_types, days, no_exam_dates, max_exams_2days, max_exams_5days,
+                     None, room_mode, Fixed_modules, Core_modules, rooms, diagnose=True, formulation=formulation)
+    model = tm["model"]
+    model.ClearObjective()
+    literals = {literal.Index(): literal for literal, _ in tm["assumptions"]}
+    descriptions = {literal.Index(): description for literal, description in tm["assumptions"]}
+    solver = cp_model.CpSolver()
+    apply_solver_settings(solver, solver_settings)
+    solver.parameters.max_time_in_seconds = time_limit
+    model.AddAssumptions(list(literals.values()))
+    if solver.Solve(model) != cp_model.INFEASIBLE:
+        logger.info("Diagnosis could not prove the guarded rules infeasible")
+        return []
+    core = list(solver.SufficientAssumptionsForInfeasibility())
+    logger.info(f"{len(core)} of {len(descriptions)} rule groups are sufficient for infeasibility, shrinking")
+
+    model.ClearAssumptions()
+    i = 0
+    while i < len(core) and time.time() - start < time_limit:
+        trial = core[:i] + core[i + 1:]
+        # Fixing the literals rather than assuming them lets presolve drop the groups left out
+        check = model.Clone()
+        kept = set(trial)
+        for index in literals:
+            check.Add(check.get_bool_var_from_proto_index(index) == int(index in kept))
+        solver.parameters.max_time_in_seconds = max(1.0, time_limit - (time.time() - start))
+        if trial and solver.Solve(check) == cp_model.INFEASIBLE:
+            core = trial
+        else:
+            i += 1
+    logger.info(f"Diagnosed {len(core)} conflicting rule groups in {time.time() - start:.1f}s")
+    return [descriptions[index] for index in core if index in descriptions]
+
+
+def weighted_objective(breakdown, weights):
+    """The weighted-sum objective of a penalty breakdown, so staged and weighted solves can be compared."""
+    return (weights["spread_penalty"] * breakdown["spread"] + weights["soft_day_penalty"] * breakdown["soft_day"]
+            + weights["extra_time_penalty"] * breakdown["extra_time_25"] + weights["room_penalty"] * breakdown["room_surplus"]
+            + breakdown["soft_slot"] + breakdown["non_pc_room"])
+
+
+def penalty_breakdown(tm, solver):
+    """Return each penalty family's unweighted total in the solver's current solution."""
+    return {family: int(sum(solver.Value(term) for term in terms)) for family, terms in tm["penalties"].items()}
+
+
+def allocate_timetable_rooms(tm, exams_timetabled, max_workers=None):
+    """Phase two of the decomposed mode: allocate rooms slot by slot, in at most max_workers processes.
+
+    Returns the timetable with rooms filled in and the per-slot allocations, or None if any slot cannot be roomed.
+    """
+    # Rooms only interact within a slot, so allocate each occupied (day, slot) on its own
+    slot_exams = defaultdict(list)
+    for exam, (d, s, _) in exams_timetabled.items():
+        slot_exams[(d, s)].append(exam)
+    phase_two_start = time.time()
+    room_allocations = allocate_rooms_parallel(dict(sorted(slot_exams.items())), tm["exam_counts"], tm["exam_types"], tm["rooms"],
+                                               tm["non_me_exams"], tm["weights"]["room_penalty"], max_workers=max_workers)
+    logger.info(f"Rooms allocated for {len(room_allocations)} slots in {time.time() - phase_two_start:.2f}s")
+    failed = [time_slot for time_slot, allocation in room_allocations.items() if allocation["rooms"] is None]
+    if failed:
+        logger.warning(f"Room allocation failed for slots {failed}")
+        return None
+    roomed = dict(exams_timetabled)
+    for allocation in room_allocations.values():
+        for exam, assigned_rooms in allocation["rooms"].items():
+            d, s, _ = roomed[exam]
+            roomed[exam] = (d, s, assigned_rooms)
+    return roomed, room_allocations
+
+
+def add_distance_cut(tm, exams_timetabled, min_distance):
+    """Forbid any timetable that keeps more than all but min_distance exams at their time in exams_timetabled."""
+    tm["model"].Add(
+        sum(tm["x"][(exam, d, s)] for exam, (d, s, _) in exams_timetabled.items()) <= len(exams_timetabled) - min_distance
+    )
+
+
+def timetable_distance(timetable1, timetable2):
+    """Number of exams at a different day or slot in the two timetables."""
+    return sum(timetable1[exam][:2] != timetable2[exam][:2] for exam in timetable1)
+
+
+def total_penalty(breakdown):
+    """The penalty reported to the user: spread, avoided days, 25% extra time and room surplus."""
+    return breakdown["spread"] + breakdown["soft_day"] + breakdown["extra_time_25"] + breakdown["room_surplus"]
+
+
+def create_timetable(students, leaders_df, wb, max_exams_2days, max_exams_5days, solver_settings=None, hint=None, room_mode="monolithic",
+                     weights=None, Fixed_modules=Fixed_modules, Core_modules=Core_modules, rooms=rooms, progress=None, stop_event=None,
+                     num_solutions=1, min_distance=5, alternative_time=None, calendar=None, module_match=None, stages=None,
+                     formulation="one-hot", diagnose_unknown=False, screen=True):
+    """Build and solve the timetable, returning (exams_timetabled, days, exam_counts, exam_types, total_penalty, stats).
+
+    An already parsed calendar (days, bank_holiday_days) or module match (leader_courses, exam_types)
+    can be passed in place of reading wb or leaders_df again.
+    Improving solutions are put on the progress queue if given, and setting stop_event ends the search early.
+    With num_solutions above 1, stats["alternatives"] holds up to num_solutions - 1 further timetables,
+    each at least min_distance exam moves away from every timetable before it.
+    With stages (see stage_plan) the penalty families are minimised one at a time in that order instead of as a weighted sum,
+    and no alternatives are searched: the model then only holds the last stage's objective under the earlier stages' caps.
+    formulation is one of FORMULATIONS, see build_model.
+    An infeasible model is diagnosed for the rules in conflict; with diagnose_unknown, so is one that ran out of time
+    before finding any timetable (which takes up to DIAGNOSIS_TIME longer and may find nothing).
+    screen=False skips the feasibility screen, for callers that have already screened these inputs and limits.
+    """
+    build_start = time.time()
+    exams = students.exams
+
+    # Process bank holidays into this run's own copy of no_exam_dates, so concurrent runs do not see each other's calendar
+    days, bank_holiday_days = calendar or read_exam_calendar(wb)
+    run_no_exam_dates = no_exam_dates + [[delta, slot] for delta in bank_holiday_days for slot in (0, 1)]
+
+    leader_courses, exam_types = module_match or match_modules(leaders_df, exams)
+    exam_counts = students.exam_counts()
+
+    # Rule out inputs that can never be timetabled before spending any time on the model
+    if screen:
+        failures = screen_feasibility(students, leader_courses, exam_types, days, run_no_exam_dates, max_exams_2days, max_exams_5days,
+                                      Fixed_modules, Core_modules, rooms)
+        if failures:
+            raise TimetablingError(screen_message(failures), failures)
+
+    tm = build_model(students, leader_courses, exam_types, days, run_no_exam_dates, max_exams_2days, max_exams_5days,
+                     weights, room_mode, Fixed_modules, Core_modules, rooms, formulation=formulation)
+    if hint:
+        add_hint(tm, hint)
+    build_time = time.time() - build_start
+
+    #### ----- Solve the model ----- ###
+    solver = cp_model.CpSolver()
+    solver_settings = apply_solver_settings(solver, solver_settings)
+    callback = ProgressCallback(tm, progress) if progress is not None else None
+    if stages:
+        status, stage_results = solve_staged(tm, solver, stages, callback, stop_event)
+    else:
+        status = solve(solver, tm["model"], callback, stop_event)
+    stopped = stop_event is not None and stop_event.is_set()
+    if status == cp_model.INFEASIBLE or (status == cp_model.UNKNOWN and diagnose_unknown and not stopped):
+        # Name the rules in conflict, and when asked also when the time ran out before any timetable was found
+        conflicts = diagnose_infeasibility(students, leader_courses, exam_types, days, run_no_exam_dates, max_exams_2days,
+                                           max_exams_5days, room_mode, Fixed_modules, Core_modules, rooms, solver_settings,
+                                           formulation=formulation)
+        if conflicts:
+            raise TimetablingError("Infeasible model. These rules cannot all be met:\n"
+                                   + "\n".join(f"- {conflict['message']}" for conflict in conflicts), conflicts)
+    if status == cp_model.INFEASIBLE:
+        raise TimetablingError("Infeasible model. Exam schedule could not be created.")
+    if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+        raise TimetablingError("No solution found.")
+
+    exams_timetabled = extract_timetable(tm, solver)
+    breakdown = penalty_breakdown(tm, solver)
+    proto = tm["model"].Proto()
+    response = solver.ResponseProto()
+    stats = {
+        "conflict_graph": tm["conflict_graph"],
+        "students": len(students.cids),
+        "profiles": len(tm["profiles"]),
+        "formulation": formulation,
+        "num_variables": len(proto.variables),
+        "num_constraints": len(proto.constraints),
+        "proto_bytes": model_proto_size(tm["model"]),
+        "family_stats": tm["family_stats"],
+        "build_time": build_time,
+        "solve_time": solver.WallTime(),
+        "status": solver.StatusName(status),
+        "stopped_early": stopped,
+        "objective": solver.ObjectiveValue(),
+        "best_bound": solver.BestObjectiveBound(),
+        "solver_stats": {
+            "wall_time": response.wall_time,
+            "user_time": response.user_time,
+            "deterministic_time": response.deterministic_time,
+            "conflicts": response.num_conflicts,
+            "branches": response.num_branches,
+            "binary_propagations": response.num_binary_propagations,
+            "integer_propagations": response.num_integer_propagations,
+            "lp_iterations": response.num_lp_iterations,
+            "restarts": response.num_restarts,
+            "presolved_booleans": response.num_booleans,
+            "presolved_integers": response.num_integers,
+            "gap_integral": response.gap_integral,
+        },
+        "response_stats": solver.ResponseStats(),
+    }
+    log_family_stats(tm["family_stats"])
+    logger.info(f"Model proto is {stats['proto_bytes'] / 1e6:.2f} MB\n{stats['response_stats']}")
+
+    if room_mode != "monolithic":
+        # Room allocation gets the same cores as the solve, so queued jobs do not oversubscribe the machine
+        roomed = allocate_timetable_rooms(tm, exams_timetabled, solver_settings["num_workers"])
+        if roomed is None:
+            logger.warning("Falling back to the single model")
+            return create_timetable(students, leaders_df, wb, max_exams_2days, max_exams_5days, solver_settings, exams_timetabled,
+                                    "monolithic", weights, Fixed_modules, Core_modules, rooms, progress, stop_event,
+                                    num_solutions, min_distance, alternative_time, (days, bank_holiday_days), (leader_courses, exam_types),
+                                    stages, formulation, diagnose_unknown, screen=False)
+        exams_timetabled, room_allocations = roomed
+        breakdown["room_surplus"] = sum(allocation["room_surplus"] for allocation in room_allocations.values())
+        breakdown["non_pc_room"] = sum(allocation["non_pc_penalty"] for allocation in room_allocations.values())
+        stats["room_allocations"] = room_allocations
+    stats["penalty_breakdown"] = breakdown
+    if stages:
+        # The solver only knows the last stage, so report the whole staged search
+        stats["stages"] = stage_results
+        stats["solve_time"] = sum(stage["time"] for stage in stage_results)
+        stats["objective"] = weighted_objective(breakdown, tm["weights"])
+        stats["best_bound"] = None
+
+    # Alternatives come from re-solving with a cut against every timetable found so far
+    stats["alternatives"] = []
+    if stages and num_solutions > 1:
+        logger.info("Alternative timetables are not searched in staged mode")
+        num_solutions = 1
+    if alternative_time:
+        solver.parameters.max_time_in_seconds = float(alternative_time)
+    found = [exams_timetabled]
+    while len(found) < num_solutions and not (stop_event is not None and stop_event.is_set()):
+        add_distance_cut(tm, found[-1], min_distance)
+        status = solve(solver, tm["model"], stop_event=stop_event)
+        if status not in (cp_model.FEASIBLE, cp_model.OPTIMAL):
+            logger.info(f"No further timetable {min_distance} exams away from the {len(found)} found ({solver.StatusName(status)})")
+            break
+        alternative = extract_timetable(tm, solver)
+        found.append(alternative)
+        alternative_breakdown = penalty_breakdown(tm, solver)
+        if room_mode != "monolithic":
+            roomed = allocate_timetable_rooms(tm, alternative, solver_settings["num_workers"])
+            if roomed is None:
+                logger.warning(f"Skipping alternative {len(found) - 1}, its rooms could not be allocated")
+                continue
+            alternative, room_allocations = roomed
+            alternative_breakdown["room_surplus"] = sum(allocation["room_surplus"] for allocation in room_allocations.values())
+            alternative_breakdown["non_pc_room"] = sum(allocation["non_pc_penalty"] for allocation in room_allocations.values())
+        stats["alternatives"].append({
+            "timetable": alternative,
+            "objective": solver.ObjectiveValue(),
+            "status": solver.StatusName(status),
+            "penalty": total_penalty(alternative_breakdown),
+            "penalty_breakdown": alternative_breakdown,
+            "distance": min(timetable_distance(alternative, other) for other in found[:-1]),
+        })
+
+    # Everything the run store saves so the checking page can re-check this timetable
+    stats["run_data"] = {
+        "days": days,
+        "slots": [0, 1],
+        "exams": exams,
+        "cids": students.cids,
+        "enrolled": students.enrolled,
+        "aea": students.aea,
+        "extra_time_25": students.extra_time_25,
+        "extra_time_50": students.extra_time_50,
+        "leader_courses": leader_courses,
+        "exam_counts": exam_counts,
+        "Fixed_modules": Fixed_modules,
+        "Core_modules": Core_modules,
+        "rooms": rooms,
+        "exam_types": exam_types,
+        "solver_settings": solver_settings,
+        "exams_timetabled": exams_timetabled,
+        "penalty": total_penalty(breakdown),
+    }
+
+    return exams_timetabled, days, exam_counts, exam_types, total_penalty(breakdown), stats
@@ -0,0 +1,89 @@
+# Sweep of penalty weights and student load limits: every combination is solved in a pool of processes sharing a fixed
+# number of cores, and the raw value of each penalty family is recorded so the non-dominated (Pareto) settings can be
+# compared without the weights that produced them.
+import itertools
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import pandas as pd
+from timetable_model import DEFAULT_WEIGHTS, TimetablingError, create_timetable, default_solver_settings
+
+logger = logging.getLogger(__name__)
+
+# Settings a sweep can vary, with the values used when a sweep leaves one out
+SWEEP_DEFAULTS = {**DEFAULT_WEIGHTS, "max_exams_2days": 3, "max_exams_5days": 4}
+# Penalty families each weight prices, compared raw for the Pareto front
+PARETO_FAMILIES = ["spread", "room_surplus", "extra_time_25", "soft_day"]
+
+
+def sweep_grid(ranges):
+    """Return one setting dictionary per combination of the values in ranges, name -> list of values."""
+    names = list(SWEEP_DEFAULTS)
+    values = [list(ranges.get(name) or [SWEEP_DEFAULTS[name]]) for name in names]
+    return [dict(zip(names, combination)) for combination in itertools.product(*values)]
+
+
+def pareto_front(df, families=PARETO_FAMILIES):
+    """Return a boolean Series marking the rows no other solved row matches or beats on every family."""
+    solved = df.dropna(subset=families)
+    values = solved[families].to_numpy()
+    front = pd.Series(False, index=df.index)
+    for i, row in zip(solved.index, values):
+        dominated = ((values <= row).all(axis=1) & (values < row).any(axis=1)).any()
+        front[i] = not dominated
+    return front
+
+
+def solve_setting(students, calendar, module_match, setting, solver_settings, room_mode, formulation="one-hot", instance=None):
+    """Solve one setting of the sweep in a worker process and return its row of results.
+
+    instance optionally overrides Fixed_modules, Core_modules and rooms.
+    """
+    weights = {name: setting[name] for name in DEFAULT_WEIGHTS}
+    row = dict(setting)
+    try:
+        _, _, _, _, penalty, stats = create_timetable(
+            students, None, None, setting["max_exams_2days"], setting["max_exams_5days"], solver_settings,
+            room_mode=room_mode, weights=weights, calendar=calendar, module_match=module_match, formulation=formulation,
+            **(instance or {}),
+        )
+    except TimetablingError as e:
+        row.update({"status": "NO SOLUTION", "error": str(e)})
+        return row
+    row.update(stats["penalty_breakdown"])
+    row.update({"status": stats["status"], "penalty": penalty, "objective": stats["objective"], "solve_time": stats["solve_time"]})
+    return row
+
+
+def run_sweep(students, calendar, module_match, grid, solver_settings=None, cores=None, max_parallel=None,
+              room_mode="monolithic", progress=None, formulation="one-hot", instance=None):
+    """Solve every setting in grid and return a DataFrame of results with a "pareto" column.
+
+    cores is the total number of CPU cores the sweep may use. They are split evenly between at most max_parallel
+    solves running at once, each solve getting cores // parallel CP-SAT workers.
+    progress(row) is called in this process as each solve finishes.
+    instance optionally overrides Fixed_modules, Core_modules and rooms, as a dictionary of those keys.
+    """
+    solver_settings = dict(solver_settings or default_solver_settings())
+    cores = max(1, cores or solver_settings["num_workers"])
+    parallel = max(1, min(len(grid), max_parallel or cores, cores))
+    solver_settings["num_workers"] = max(1, cores // parallel)
+    logger.info(f"Sweeping {len(grid)} settings, {parallel} at a time with {solver_settings['num_workers']} workers each")
+
+    rows = []
+    # Spawned workers do not inherit the server's threads or open solver state
+    with ProcessPoolExecutor(max_workers=parallel, mp_context=multiprocessing.get_context("spawn")) as pool:
+        futures = [
+            pool.submit(solve_setting, students, calendar, module_match, setting, solver_settings, room_mode, formulation, instance)
+            for setting in grid
+        ]
+        for future in as_completed(futures):
+            rows.append(future.result())
+            if progress is not None:
+                progress(rows[-1])
+
+    df = pd.DataFrame(rows, columns=list(SWEEP_DEFAULTS) + ["status", "penalty", "objective"] + PARETO_FAMILIES
+                      + ["soft_slot", "non_pc_room", "solve_time", "error"])
+    df = df.sort_values(list(SWEEP_DEFAULTS)).reset_index(drop=True)
+    df["pareto"] = pareto_front(df)
+    return df